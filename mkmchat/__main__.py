@@ -4,21 +4,78 @@ import sys
 import asyncio
 
 
+def build_index(argv):
+    """Build the RAG index artifact offline: build-index [--data-dir DIR] [--out DIR]"""
+    import argparse
+    import json
+    import logging
+
+    parser = argparse.ArgumentParser(
+        prog="python -m mkmchat build-index",
+        description="Embed the game data and write the RAG index artifact.",
+    )
+    parser.add_argument("--data-dir", help="directory with the *.tsv / *.txt data files")
+    parser.add_argument("--out", help="artifact directory (default: MKM_RAG_CACHE_DIR or <data-dir>/.rag_cache)")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="sentence-transformers model name")
+    parser.add_argument("--force", action="store_true", help="rebuild even if a valid artifact exists")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    from mkmchat.data.rag import RAGSystem
+
+    rag = RAGSystem(data_dir=args.data_dir, model_name=args.model, cache_dir=args.out)
+    if not rag.enabled:
+        print("sentence-transformers is not installed; cannot build the index", file=sys.stderr)
+        return 1
+
+    rag.index_data(force_rebuild=args.force, blocking=True)
+    manifest = rag.manifest
+    if not rag.documents or not manifest:
+        print(f"No index artifact written (no documents found in {rag.data_dir})", file=sys.stderr)
+        return 1
+
+    print(json.dumps({"cache_dir": str(rag.cache_dir), **manifest}, indent=2))
+    return 0
+
+
 def main():
     """Main entry point with mode selection"""
-    if len(sys.argv) > 1 and sys.argv[1] == "http":
-        # Run HTTP server
+    if len(sys.argv) > 1 and sys.argv[1] == "build-index":
+        sys.exit(build_index(sys.argv[2:]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "http":
+        # Run HTTP server: http [port] [--server threaded|async]
+        import os
         from mkmchat.http_server import run_server, DEFAULT_PORT
         
+        args = sys.argv[2:]
+        server_kind = os.getenv("MKM_HTTP_SERVER", "threaded").strip().lower()
+        if "--server" in args:
+            index = args.index("--server")
+            if index + 1 >= len(args):
+                print("--server requires a value: threaded or async")
+                sys.exit(1)
+            server_kind = args[index + 1].strip().lower()
+            del args[index:index + 2]
+        elif "--async" in args:
+            server_kind = "async"
+            args.remove("--async")
+        if server_kind not in {"threaded", "async"}:
+            print(f"Invalid server mode: {server_kind} (expected threaded or async)")
+            sys.exit(1)
+        
         port = DEFAULT_PORT
-        if len(sys.argv) > 2:
+        if args:
             try:
-                port = int(sys.argv[2])
+                port = int(args[0])
             except ValueError:
-                print(f"Invalid port: {sys.argv[2]}")
+                print(f"Invalid port: {args[0]}")
                 sys.exit(1)
         
-        run_server(port)
+        if server_kind == "async":
+            from mkmchat.async_http_server import run_async_server
+            run_async_server(port)
+        else:
+            run_server(port)
     else:
         # Run MCP server (default)
         from mkmchat.server import main as mcp_main
@@ -0,0 +1,351 @@
+"""asyncio HTTP/1.1 front end for the MK Mobile Assistant API
+
+Serves the same routes, auth, rate limits and JSON contracts as the threaded
+server in ``mkmchat.http_server``, but every connection is a coroutine on one
+event loop: slow LLM calls cost a pending task, not a parked OS thread.
+Connections are kept alive between requests (HTTP/1.1 default, or
+``Connection: keep-alive`` on HTTP/1.0) until the idle timeout.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from http import HTTPStatus
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar, Union
+from urllib.parse import urlparse
+
+from mkmchat import http_server
+from mkmchat.deadline import DEADLINE_HEADER
+from mkmchat.http_server import (
+    DISCONNECT_POLL_SECONDS,
+    POST_ROUTES,
+    STREAM_MEDIA_TYPES,
+    ClientDisconnected,
+    RequestError,
+    StreamResponse,
+    _api_info,
+    _check_api_key,
+    _check_content_length,
+    _check_rate_limit,
+    _cors_headers,
+    _get_int_env,
+    _health_payload,
+    _parse_json_body,
+    _rate_limit_key,
+    _reindex_payload,
+    _result_status,
+    _status_headers,
+    encode_stream_frame,
+    next_frame,
+    open_stream,
+    run_with_deadline,
+)
+from mkmchat.llm.http_client import aclose_clients
+from mkmchat.llm.scheduler import current_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MAX_REQUEST_LINE = 8192
+MAX_HEADERS = 100
+
+
+class _Request:
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], peer: str):
+        self.method = method
+        self.target = target
+        self.path = urlparse(target).path
+        self.version = version
+        self.headers = headers
+        self.peer = peer
+
+    def header(self, name: str, default: str = "") -> str:
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.header("connection").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+def _keepalive_seconds() -> int:
+    return _get_int_env("MKM_HTTP_KEEPALIVE_SECONDS", 15)
+
+
+async def _read_request(reader: asyncio.StreamReader, peer: str) -> Optional[_Request]:
+    """Parse a request line + headers; None on a clean close between requests."""
+    try:
+        line = await reader.readline()
+    except ValueError:  # longer than the stream limit
+        raise RequestError(414, {"error": "Request line too long"})
+    if not line:
+        return None
+    if len(line) > MAX_REQUEST_LINE:
+        raise RequestError(414, {"error": "Request line too long"})
+    try:
+        method, target, version = line.decode("latin-1").strip().split(" ", 2)
+    except ValueError:
+        raise RequestError(400, {"error": "Malformed request line"})
+
+    headers: Dict[str, str] = {}
+    while True:
+        try:
+            raw = await reader.readline()
+        except ValueError:
+            raise RequestError(431, {"error": "Request headers too large"})
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS or len(raw) > MAX_REQUEST_LINE:
+            raise RequestError(431, {"error": "Request headers too large"})
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return _Request(method.upper(), target, version, headers, peer)
+
+
+class _Connection:
+    """One client connection; handles requests sequentially until close or idle timeout."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        peer = writer.get_extra_info("peername")
+        self.peer = peer[0] if isinstance(peer, tuple) else "unknown"
+
+    async def serve(self) -> None:
+        current_client.set(self.peer)  # each connection runs in its own task/context
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        _read_request(self.reader, self.peer), timeout=_keepalive_seconds()
+                    )
+                except asyncio.TimeoutError:
+                    return
+                except RequestError as e:
+                    await self._send(None, e.status, e.payload, keep_alive=False)
+                    return
+                if request is None:
+                    return
+
+                keep_alive = request.keep_alive
+                if request.header("transfer-encoding"):
+                    # Chunked request bodies are not supported; the body cannot be skipped safely
+                    await self._send(request, 411, {"error": "Content-Length required"}, keep_alive=False)
+                    return
+                try:
+                    content_length = int(request.header("content-length", "0") or 0)
+                except ValueError:
+                    await self._send(request, 400, {"error": "Invalid Content-Length"}, keep_alive=False)
+                    return
+
+                status, payload, indent, consumed = await self._dispatch(request, content_length)
+                if not consumed and content_length:
+                    # Body was never read (e.g. rejected before parsing); drop the connection
+                    keep_alive = False
+                if isinstance(payload, StreamResponse):
+                    keep_alive = await self._send_stream(request, payload, keep_alive=keep_alive)
+                else:
+                    await self._send(request, status, payload, keep_alive=keep_alive, indent=indent)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.warning("Client %s disconnected", self.peer)
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(
+        self, request: _Request, content_length: int
+    ) -> Tuple[int, Union[Dict, StreamResponse, None], Optional[int], bool]:
+        """Route a request: returns (status, payload or stream, json indent, body consumed)."""
+        loop = asyncio.get_running_loop()
+        api_key_header = os.getenv("MKM_API_KEY_HEADER", "X-API-Key")
+        consumed = False
+        try:
+            if request.method == "OPTIONS":
+                return 200, None, None, consumed
+
+            if request.method == "GET":
+                if request.path == "/":
+                    return 200, _api_info(), 2, consumed
+                if request.path == "/health":
+                    _check_api_key(request.header(api_key_header), self.peer)
+                    try:
+                        return 200, await loop.run_in_executor(None, _health_payload), 2, consumed
+                    except Exception as e:
+                        logger.error(f"Error handling /health: {e}")
+                        return 500, {"status": "error", "detail": str(e)}, None, consumed
+                if request.path == "/admin/reindex":
+                    _check_api_key(request.header(api_key_header), self.peer)
+                    status, payload = await loop.run_in_executor(None, _reindex_payload, False)
+                    return status, payload, None, consumed
+                return 404, {"error": "Not found"}, None, consumed
+
+            if request.method == "POST":
+                _check_rate_limit(_rate_limit_key(self.peer, request.header))
+                _check_api_key(request.header(api_key_header), self.peer)
+
+                if request.path == "/admin/reindex":
+                    status, payload = await loop.run_in_executor(None, _reindex_payload, True)
+                    return status, payload, None, consumed
+                if request.path not in POST_ROUTES:
+                    return 404, {"error": "Not found"}, None, consumed
+
+                route, expected_payload = POST_ROUTES[request.path]
+                _check_content_length(content_length, expected_payload)
+                body = await self.reader.readexactly(content_length)
+                consumed = True
+                data = _parse_json_body(body)
+                timeout_header = request.header(DEADLINE_HEADER.lower())
+                stream = await self._until_disconnect(
+                    run_with_deadline(timeout_header, open_stream(request.path, data, request.header("accept")))
+                )
+                if stream is not None:
+                    return 200, stream, None, consumed
+                result = await self._until_disconnect(run_with_deadline(timeout_header, route(data)))
+                return _result_status(result), result, 2, consumed
+
+            return 501, {"error": "Not implemented"}, None, consumed
+        except RequestError as e:
+            return e.status, e.payload, None, consumed
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            logger.error(f"Error handling {request.path}: {e}")
+            return 500, {"error": str(e)}, None, consumed
+
+    def _peer_closed(self) -> bool:
+        return self.reader.at_eof() or self.writer.is_closing()
+
+    async def _until_disconnect(self, awaitable: Awaitable[T]) -> T:
+        """Await ``awaitable``, cancelling it (and its Ollama request) as soon as the client hangs up."""
+        task = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+                if done:
+                    return task.result()
+                if self._peer_closed():
+                    raise ClientDisconnected("Client disconnected")
+        finally:
+            task.cancel()
+
+    async def _send(
+        self,
+        request: Optional[_Request],
+        status: int,
+        payload: Optional[Dict],
+        *,
+        keep_alive: bool,
+        indent: Optional[int] = None,
+    ) -> None:
+        body = json.dumps(payload, indent=indent).encode() if payload is not None else b""
+        head = self._head(
+            request,
+            status,
+            [("Content-Type", "application/json"), ("Content-Length", str(len(body))), *_status_headers(payload)],
+            keep_alive,
+        )
+        self.writer.write(head + body)
+        await self.writer.drain()
+        self._log(request, status)
+
+    async def _send_stream(self, request: _Request, stream: StreamResponse, *, keep_alive: bool) -> bool:
+        """Write frames as they arrive; returns whether the connection can be reused.
+
+        HTTP/1.1 clients get chunked transfer encoding and keep their
+        connection; HTTP/1.0 clients read until the connection closes.
+        """
+        chunked = request.version != "HTTP/1.0"
+        keep_alive = keep_alive and chunked
+        headers = [
+            ("Content-Type", STREAM_MEDIA_TYPES[stream.format]),
+            ("Cache-Control", "no-cache"),
+            ("X-Accel-Buffering", "no"),
+        ]
+        if chunked:
+            headers.append(("Transfer-Encoding", "chunked"))
+        try:
+            self.writer.write(self._head(request, 200, headers, keep_alive))
+            frame = stream.first
+            while frame is not None:
+                data = encode_stream_frame(frame, stream.format)
+                self.writer.write(b"%x\r\n%s\r\n" % (len(data), data) if chunked else data)
+                await self.writer.drain()
+                if frame.get("type") == "error":
+                    break  # an error frame always ends the stream
+                frame = await self._until_disconnect(next_frame(stream.frames, stream.deadline))
+            if chunked:
+                self.writer.write(b"0\r\n\r\n")
+                await self.writer.drain()
+        finally:
+            # Stops the upstream Ollama request early if the client went away
+            await stream.frames.aclose()
+        self._log(request, 200)
+        return keep_alive
+
+    def _head(
+        self, request: Optional[_Request], status: int, headers: List[Tuple[str, str]], keep_alive: bool
+    ) -> bytes:
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        origin = request.header("origin") if request else ""
+        headers = [
+            *headers,
+            *_cors_headers(origin),
+            ("Connection", "keep-alive" if keep_alive else "close"),
+        ]
+        if keep_alive:
+            headers.append(("Keep-Alive", f"timeout={_keepalive_seconds()}"))
+        head = f"HTTP/1.1 {status} {reason}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers
+        ) + "\r\n"
+        return head.encode("latin-1")
+
+    def _log(self, request: Optional[_Request], status: int) -> None:
+        if request is not None:
+            logger.info(f'{self.peer} - "{request.method} {request.target} {request.version}" {status}')
+
+
+async def start_server(host: str, port: int) -> asyncio.AbstractServer:
+    """Bind and start accepting connections on the running loop."""
+
+    async def _on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await _Connection(reader, writer).serve()
+
+    return await asyncio.start_server(
+        _on_connect, host, port, limit=MAX_REQUEST_LINE * 2, backlog=_get_int_env("MKM_HTTP_BACKLOG", 512)
+    )
+
+
+async def serve(host: str, port: int) -> None:
+    """Run the asyncio server until cancelled."""
+    # Load the model and the (prebuilt) index before accepting requests
+    await asyncio.get_running_loop().run_in_executor(None, http_server.get_rag_system)
+
+    server = await start_server(host, port)
+    logger.info(f"Starting MK Mobile asyncio HTTP API server on {host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await aclose_clients()
+
+
+def run_async_server(port: int) -> None:
+    """Run the asyncio HTTP server (same checks as the threaded server)."""
+    host = os.getenv("MKM_HTTP_HOST", "127.0.0.1")
+    http_server.require_api_key()
+    try:
+        asyncio.run(serve(host, port))
+    except KeyboardInterrupt:
+        logger.info("Shutting down server...")
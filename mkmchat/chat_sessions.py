@@ -0,0 +1,141 @@
+"""Server-held /chat conversation state (in-memory LRU over optional SQLite)"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    session_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    state TEXT NOT NULL
+)
+"""
+
+
+class ChatSessionStore:
+    """Thread-safe store of chat sessions keyed by client-chosen ``session_id``.
+
+    A session is a JSON-serializable dict: the messages not yet folded into
+    the summary, the summary itself, and the previous turn's retrieval
+    context. Values are stored as JSON text, so every ``get`` returns a fresh
+    dict the caller may change before ``put``-ting it back. Sessions expire
+    ``ttl`` seconds after their last turn. The memory tier holds at most
+    ``max_sessions``; with a ``path``, every session is also written to
+    SQLite, so sessions evicted from memory (or from before a restart) are
+    read back from disk. A failing disk tier is logged and switched off,
+    leaving the memory tier in place.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_sessions: int = 1024, ttl: float = 86400.0):
+        self.max_sessions = max(0, max_sessions)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.path = Path(path) if path is not None else None
+        self._db: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(_SCHEMA)
+                self._db.execute("DELETE FROM chat_sessions WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Chat session disk tier disabled ({self.path}): {e}")
+                self._db = None
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[0] <= now:
+                del self._entries[session_id]
+                self.expired += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                self.memory_hits += 1
+                return json.loads(entry[1])
+
+            row = self._disk(
+                "SELECT expires_at, state FROM chat_sessions WHERE session_id = ? AND expires_at > ?",
+                (session_id, now),
+            )
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(session_id, row[0], row[1])
+            return json.loads(row[1])
+
+    def put(self, session_id: str, state: Dict) -> None:
+        if self.ttl <= 0:
+            return
+        payload = json.dumps(state)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(session_id, expires_at, payload)
+            self._disk(
+                "INSERT OR REPLACE INTO chat_sessions (session_id, expires_at, state) VALUES (?, ?, ?)",
+                (session_id, expires_at, payload),
+                commit=True,
+            )
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+            self._disk("DELETE FROM chat_sessions WHERE session_id = ?", (session_id,), commit=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            disk = self._disk("SELECT COUNT(*) FROM chat_sessions WHERE expires_at > ?", (time.time(),))
+            return {
+                "sessions": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "disk": {"path": str(self.path), "sessions": disk[0]} if disk is not None else None,
+            }
+
+    # Helpers below expect self._lock to be held
+
+    def _remember(self, session_id: str, expires_at: float, payload: str) -> None:
+        if self.max_sessions == 0:
+            return
+        self._entries[session_id] = (expires_at, payload)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk(self, sql: str, params: Tuple = (), commit: bool = False) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(sql, params).fetchone()
+            if commit:
+                self._db.commit()
+            return row
+        except sqlite3.Error as e:
+            logger.warning(f"Chat session disk tier disabled ({self.path}): {e}")
+            self._db = None
+            return None
@@ -0,0 +1,269 @@
+"""Versioned on-disk format for the RAG index (no pickle).
+
+Layout inside the cache dir::
+
+    manifest.json            -> points at the current generation directory
+    gen-<id>/embeddings.npy  -> float32 matrix, loaded with np.load(mmap_mode="r")
+    gen-<id>/documents.bin   -> UTF-8 string table for every document column
+    gen-<id>/documents.npy   -> int64 offsets, shape (len(COLUMNS), n + 1)
+    gen-<id>/content_keys.npy -> sha256(model name + content) per row, hex, dtype S64
+
+Each generation is written completely before ``manifest.json`` is atomically
+replaced, so readers (including other worker processes) only ever see a
+finished artifact. Generation names are derived from the model, data hash and
+document contents, so building the same data twice yields the same artifact.
+Loading maps the matrix read-only, so processes share one
+page-cached copy, and documents are decoded from plain strings and JSON.
+
+The content keys make the latest generation double as a content-addressed
+embedding store: a rebuild only encodes documents whose key is not in it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".build.lock"
+COLUMNS = ("content", "doc_type", "metadata")
+
+# (content, metadata, doc_type) — the fields of a Document
+DocumentRow = Tuple[str, Dict, str]
+
+_LEGACY_FILES = ("embeddings.pkl", "data_hash.txt")
+_STAGING_MAX_AGE_SECONDS = 3600
+
+
+def content_key(model_name: str, content: str) -> str:
+    """Content address of one document embedding: hex sha256 of model name and content."""
+    return hashlib.sha256(f"{model_name}\0{content}".encode("utf-8")).hexdigest()
+
+
+def read_manifest(cache_dir: Path) -> Optional[Dict]:
+    """Return the current manifest, or None when missing / unreadable / wrong version."""
+    path = Path(cache_dir) / MANIFEST_NAME
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable index manifest {path}: {e}")
+        return None
+    if not isinstance(manifest, dict) or manifest.get("format_version") != FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def _encode_columns(rows: Sequence[DocumentRow]) -> Tuple[bytes, np.ndarray]:
+    offsets = np.zeros((len(COLUMNS), len(rows) + 1), dtype=np.int64)
+    chunks: List[bytes] = []
+    position = 0
+    for column, getter in enumerate((
+        lambda row: row[0],
+        lambda row: row[2],
+        lambda row: json.dumps(row[1], ensure_ascii=False, separators=(",", ":")),
+    )):
+        offsets[column, 0] = position
+        for i, row in enumerate(rows):
+            data = str(getter(row)).encode("utf-8")
+            chunks.append(data)
+            position += len(data)
+            offsets[column, i + 1] = position
+    return b"".join(chunks), offsets
+
+
+def _decode_columns(blob: bytes, offsets: np.ndarray) -> List[DocumentRow]:
+    def column(name: str) -> List[str]:
+        bounds = offsets[COLUMNS.index(name)].tolist()
+        return [blob[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+    contents = column("content")
+    doc_types = column("doc_type")
+    metadata = [json.loads(text) for text in column("metadata")]
+    return list(zip(contents, metadata, doc_types))
+
+
+def save_index(
+    cache_dir: Path,
+    rows: Sequence[DocumentRow],
+    embeddings: np.ndarray,
+    *,
+    model_name: str,
+    data_hash: str,
+) -> Dict:
+    """Write a new generation and atomically point the manifest at it.
+
+    Returns:
+        The manifest that was written
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2 or matrix.shape[0] != len(rows):
+        raise ValueError(
+            f"embeddings shape {matrix.shape} does not match {len(rows)} documents"
+        )
+
+    blob, offsets = _encode_columns(rows)
+    keys = np.array([content_key(model_name, row[0]) for row in rows], dtype="S64")
+    digest = hashlib.sha256(f"{FORMAT_VERSION}\0{model_name}\0{data_hash}\0".encode("utf-8"))
+    digest.update(blob)
+    digest.update(matrix.tobytes())
+    generation = f"gen-{digest.hexdigest()[:16]}"
+
+    if not (cache_dir / generation).is_dir():
+        staging = cache_dir / f".{generation}.{uuid.uuid4().hex[:8]}.tmp"
+        staging.mkdir()
+        try:
+            np.save(staging / "embeddings.npy", matrix, allow_pickle=False)
+            (staging / "documents.bin").write_bytes(blob)
+            np.save(staging / "documents.npy", offsets, allow_pickle=False)
+            np.save(staging / "content_keys.npy", keys, allow_pickle=False)
+            os.replace(staging, cache_dir / generation)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "generation": generation,
+        "model_name": model_name,
+        "dimension": int(matrix.shape[1]),
+        "document_count": len(rows),
+        "dtype": "float32",
+        "data_hash": data_hash,
+    }
+    manifest_tmp = cache_dir / f".{MANIFEST_NAME}.{uuid.uuid4().hex[:8]}.tmp"
+    manifest_tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(manifest_tmp, cache_dir / MANIFEST_NAME)
+
+    _prune(cache_dir, keep=generation)
+    return manifest
+
+
+def load_index(
+    cache_dir: Path,
+    *,
+    model_name: str,
+    data_hash: Optional[str] = None,
+) -> Optional[Tuple[List[DocumentRow], np.ndarray, Dict]]:
+    """Load the current generation if it matches the model (and data hash, when given).
+
+    Embeddings come back as a read-only memory map; nothing is unpickled.
+
+    Returns:
+        (rows, embeddings, manifest), or None when there is no usable artifact
+    """
+    cache_dir = Path(cache_dir)
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        return None
+    if manifest.get("model_name") != model_name:
+        logger.info(
+            f"Index cache built with {manifest.get('model_name')!r}, expected {model_name!r}"
+        )
+        return None
+    if data_hash is not None and manifest.get("data_hash") != data_hash:
+        logger.info("Data files changed, rebuilding embeddings")
+        return None
+
+    generation_dir = cache_dir / str(manifest.get("generation", ""))
+    try:
+        embeddings = np.load(generation_dir / "embeddings.npy", mmap_mode="r", allow_pickle=False)
+        offsets = np.load(generation_dir / "documents.npy", allow_pickle=False)
+        blob = (generation_dir / "documents.bin").read_bytes()
+        rows = _decode_columns(blob, offsets)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to load index cache: {e}")
+        return None
+
+    expected = (manifest.get("document_count"), manifest.get("dimension"))
+    if embeddings.shape != expected or len(rows) != expected[0]:
+        logger.warning(f"Index cache shape {embeddings.shape} does not match manifest {expected}")
+        return None
+    return rows, embeddings, manifest
+
+
+@contextmanager
+def build_lock(cache_dir: Path) -> Iterator[None]:
+    """Hold an exclusive lock on the cache dir while building an index.
+
+    Serializes builds across threads and processes (e.g. several replicas
+    sharing one volume), so callers should re-check for a fresh artifact
+    once they hold it.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(cache_dir / LOCK_NAME, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def load_embedding_store(
+    cache_dir: Path, *, model_name: str
+) -> Optional[Tuple[Dict[str, int], np.ndarray]]:
+    """Map content key -> row of the latest generation's (memory-mapped) embeddings.
+
+    Unlike load_index this ignores the data hash: it is meant for reusing
+    unchanged embeddings while rebuilding after a data edit.
+
+    Returns:
+        (key -> row, embeddings), or None when no generation for this model exists
+    """
+    cache_dir = Path(cache_dir)
+    manifest = read_manifest(cache_dir)
+    if manifest is None or manifest.get("model_name") != model_name:
+        return None
+
+    generation_dir = cache_dir / str(manifest.get("generation", ""))
+    try:
+        keys = np.load(generation_dir / "content_keys.npy", allow_pickle=False)
+        embeddings = np.load(generation_dir / "embeddings.npy", mmap_mode="r", allow_pickle=False)
+    except (OSError, ValueError) as e:
+        logger.info(f"No reusable embeddings in index cache: {e}")
+        return None
+    if embeddings.ndim != 2 or keys.shape[0] != embeddings.shape[0]:
+        return None
+    return {key.decode("ascii"): row for row, key in enumerate(keys.tolist())}, embeddings
+
+
+def _prune(cache_dir: Path, keep: str) -> None:
+    """Remove older generations, stale staging dirs and the legacy pickle cache.
+
+    Readers that still map an old generation keep their pages until they
+    close them; unlinking does not invalidate an existing mapping.
+    """
+    now = time.time()
+    for path in cache_dir.iterdir():
+        if path.name == keep:
+            continue
+        if path.is_dir() and path.name.startswith("gen-"):
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.is_dir() and path.name.startswith(".gen-"):
+            # Another process may still be writing this one
+            if now - path.stat().st_mtime > _STAGING_MAX_AGE_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        elif path.name in _LEGACY_FILES:
+            path.unlink(missing_ok=True)
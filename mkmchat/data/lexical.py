@@ -0,0 +1,168 @@
+"""Inverted index with BM25 scoring for lexical retrieval over RAG documents"""
+
+import math
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+MATCH_STOPWORDS: Set[str] = {
+    "the", "and", "for", "with", "from", "that", "this", "what", "which", "about",
+    "tell", "show", "give", "does", "how", "when", "where", "why", "who", "into",
+    "can", "are", "is", "was", "were", "have", "has", "had", "please", "need",
+    "character", "characters", "variant", "variants",
+}
+
+_NON_ALNUM = re.compile(r"[^a-z0-9\s]+")
+
+
+def normalize_for_match(text: str) -> str:
+    """Lowercase and replace punctuation with spaces."""
+    return _NON_ALNUM.sub(" ", (text or "").lower()).strip()
+
+
+def _token_list(text: str) -> List[str]:
+    return [
+        token
+        for token in normalize_for_match(text).split()
+        if len(token) >= 3 and token not in MATCH_STOPWORDS
+    ]
+
+
+def tokenize_for_match(text: str) -> Set[str]:
+    """Distinct match terms: alphanumeric tokens of 3+ chars that are not stopwords."""
+    return set(_token_list(text))
+
+
+class InvertedIndex:
+    """BM25 postings over document names and contents.
+
+    Built once per document list; lookups and scoring only touch the postings
+    of the query terms, so cost grows with query length rather than corpus size.
+    """
+
+    FIELDS = ("name", "content")
+
+    def __init__(self, documents: Sequence, k1: float = 1.2, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.doc_count = len(documents)
+
+        self.name_terms: List[FrozenSet[str]] = []
+        self.name_norms: List[str] = []
+        self._name_phrases: Dict[str, List[int]] = {}
+        self._max_name_words = 0
+        type_vocab: Dict[str, int] = {}
+        type_codes = np.empty(self.doc_count, dtype=np.int16)
+        raw: Dict[str, Dict[str, Dict[int, int]]] = {field: {} for field in self.FIELDS}
+        lengths = {field: np.zeros(self.doc_count, dtype=np.float32) for field in self.FIELDS}
+
+        for row, doc in enumerate(documents):
+            type_codes[row] = type_vocab.setdefault(doc.doc_type, len(type_vocab))
+            name = str(doc.metadata.get("name", "") or "").strip()
+            name_tokens = _token_list(name)
+            name_norm = " ".join(normalize_for_match(name).split())
+            self.name_norms.append(name_norm)
+            self.name_terms.append(frozenset(name_tokens))
+            if name_norm:
+                self._name_phrases.setdefault(name_norm, []).append(row)
+                self._max_name_words = max(self._max_name_words, name_norm.count(" ") + 1)
+
+            for field, tokens in (("name", name_tokens), ("content", _token_list(doc.content))):
+                lengths[field][row] = len(tokens)
+                for token in tokens:
+                    postings = raw[field].setdefault(token, {})
+                    postings[row] = postings.get(row, 0) + 1
+
+        self._type_vocab = type_vocab
+        self._type_codes = type_codes
+        self._lengths = lengths
+        self._avg_length = {
+            field: max(float(lengths[field].mean()), 1.0) if self.doc_count else 1.0
+            for field in self.FIELDS
+        }
+        self._postings: Dict[str, Dict[str, Tuple[np.ndarray, np.ndarray]]] = {
+            field: {
+                term: (
+                    np.fromiter(postings.keys(), dtype=np.intp, count=len(postings)),
+                    np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+                )
+                for term, postings in by_term.items()
+            }
+            for field, by_term in raw.items()
+        }
+
+    def _postings_for(
+        self, field: str, term: str, doc_type: Optional[str]
+    ) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Return (rows, term frequencies, document frequency) for one term."""
+        entry = self._postings[field].get(term)
+        if entry is None:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), 0
+        rows, tfs = entry
+        df = rows.size
+        if doc_type:
+            keep = self._type_codes[rows] == self._type_vocab.get(doc_type, -1)
+            rows, tfs = rows[keep], tfs[keep]
+        return rows, tfs, df
+
+    def term_overlap(
+        self, terms: Iterable[str], field: str, doc_type: Optional[str] = None
+    ) -> Dict[int, int]:
+        """Map row -> number of distinct query terms found in that field."""
+        counts: Dict[int, int] = {}
+        for term in set(terms):
+            rows, _, _ = self._postings_for(field, term, doc_type)
+            for row in rows.tolist():
+                counts[row] = counts.get(row, 0) + 1
+        return counts
+
+    def name_phrase_rows(self, text: str, doc_type: Optional[str] = None) -> List[int]:
+        """Rows whose normalized name appears as a whole-word phrase in ``text``."""
+        words = normalize_for_match(text).split()
+        type_code = self._type_vocab.get(doc_type, -1) if doc_type else None
+        found: List[int] = []
+        seen: Set[int] = set()
+        for start in range(len(words)):
+            for size in range(1, min(self._max_name_words, len(words) - start) + 1):
+                for row in self._name_phrases.get(" ".join(words[start:start + size]), ()):
+                    if row in seen or (type_code is not None and self._type_codes[row] != type_code):
+                        continue
+                    seen.add(row)
+                    found.append(row)
+        return found
+
+    def bm25(
+        self,
+        terms: Iterable[str],
+        doc_type: Optional[str] = None,
+        name_weight: float = 2.0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score documents matching any term with BM25 over content plus weighted name.
+
+        Returns:
+            (rows, scores) for every document with at least one matching term
+        """
+        all_rows: List[np.ndarray] = []
+        all_scores: List[np.ndarray] = []
+        distinct_terms = set(terms)
+        for field, weight in (("content", 1.0), ("name", name_weight)):
+            if not weight:
+                continue
+            lengths = self._lengths[field]
+            avg_length = self._avg_length[field]
+            for term in distinct_terms:
+                rows, tfs, df = self._postings_for(field, term, doc_type)
+                if rows.size == 0:
+                    continue
+                idf = math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[rows] / avg_length)
+                all_rows.append(rows)
+                all_scores.append(weight * idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        if not all_rows:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        unique_rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores)).astype(np.float32)
+        return unique_rows, scores
@@ -1,35 +1,66 @@
 """RAG (Retrieval-Augmented Generation) system for intelligent data search"""
 
 import logging
+import os
 import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
-import pickle
+from typing import Callable, List, Dict, Optional, Tuple, Union, Sequence
 import hashlib
+import time
+
+import numpy as np
+
+from mkmchat.data import index_store
+from mkmchat.data.lexical import InvertedIndex, tokenize_for_match
+from mkmchat.data.watcher import DataWatcher, get_poll_interval, stat_fingerprint
 
 try:
     from sentence_transformers import SentenceTransformer
-    import numpy as np
     EMBEDDINGS_AVAILABLE = True
 except ImportError:
     EMBEDDINGS_AVAILABLE = False
     SentenceTransformer = None
-    np = None
 
 logger = logging.getLogger(__name__)
 
 # Tier ranking for sorting (higher = better)
 TIER_RANK = {"D": 0, "C": 1, "B": 2, "A": 3, "S": 4, "S+": 5}
 TIER_BOOST = 0.1  # Score boost per tier level
+LEXICAL_WEIGHT = 0.15  # Weight of the normalized BM25 score in hybrid ranking
+EMBED_BATCH_SIZE = 256  # Documents per encode call while (re)building the index
 
 
 def get_tier_rank(tier: str) -> int:
     """Get numeric rank for a tier string."""
     if tier:
-        return TIER_RANK.get(tier.strip(), 0)
+        return TIER_RANK.get(tier.strip().upper(), 0)
     return 0
 
 
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, best first.
+
+    Uses an O(N) argpartition followed by an O(k log k) sort of the winners.
+    """
+    if k >= scores.size:
+        return np.argsort(scores)[::-1]
+    winners = np.argpartition(scores, -k)[-k:]
+    return winners[np.argsort(scores[winners])[::-1]]
+
+
+def _encode_column(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, Dict[str, int]]:
+    """Dictionary-encode a metadata column (case-insensitive); missing values become -1."""
+    vocab: Dict[str, int] = {}
+    codes = np.full(len(values), -1, dtype=np.int16)
+    for i, value in enumerate(values):
+        key = str(value or "").strip().lower()
+        if key:
+            codes[i] = vocab.setdefault(key, len(vocab))
+    return codes, vocab
+
+
 class Document:
     """A document chunk with metadata"""
     
@@ -43,16 +74,193 @@ class Document:
         return f"Document(type={self.doc_type}, metadata={self.metadata})"
 
 
+class IndexSnapshot:
+    """Immutable view of one built index: documents, embeddings and the aux indexes.
+
+    A new snapshot is built off to the side on every (re)index and published by
+    swapping a single reference on RAGSystem, so a search that grabbed a
+    snapshot keeps a consistent view even while a rebuild is published. The
+    per-type row indices and metadata code arrays let search apply doc_type /
+    tier / rarity / class / equipment-type predicates as vectorized masks
+    instead of looping over Document objects.
+    """
+
+    def __init__(self, documents: Sequence[Document], embeddings: Optional[np.ndarray]):
+        docs = tuple(documents)
+        self.documents = docs
+        self.embeddings = embeddings
+        self._all_indices = np.arange(len(docs), dtype=np.intp)
+
+        type_codes, type_vocab = _encode_column([doc.doc_type for doc in docs])
+        self._type_index: Dict[str, np.ndarray] = {
+            doc_type: np.flatnonzero(type_codes == code) for doc_type, code in type_vocab.items()
+        }
+
+        self._tier_ranks = np.array(
+            [TIER_RANK.get(str(doc.metadata.get("tier") or "").strip().upper(), -1) for doc in docs],
+            dtype=np.int8,
+        )
+        # Per-row tier bonus units (unknown tier = 0), scaled by the caller's boost weight
+        self.tier_bonus = np.maximum(self._tier_ranks, 0).astype(np.float32)
+        self._rarity_codes, self._rarity_vocab = _encode_column(
+            [doc.metadata.get("rarity") for doc in docs]
+        )
+        self._class_codes, self._class_vocab = _encode_column(
+            [doc.metadata.get("class") if doc.doc_type == "character" else None for doc in docs]
+        )
+        self._equip_type_codes, self._equip_type_vocab = _encode_column(
+            [doc.metadata.get("type") if doc.doc_type == "equipment" else None for doc in docs]
+        )
+        # BM25 postings over names and contents for hybrid lexical + vector ranking
+        self.lexical_index = InvertedIndex(docs)
+
+        for array in (self._all_indices, self._tier_ranks, self.tier_bonus, *self._type_index.values()):
+            array.flags.writeable = False
+
+    def candidate_indices(
+        self,
+        doc_type: Optional[str],
+        min_tier: Optional[str] = None,
+        rarities: Optional[Sequence[str]] = None,
+        equip_type: Optional[str] = None,
+        char_class: Optional[str] = None,
+    ) -> np.ndarray:
+        """Return embedding row indices that satisfy the metadata predicates."""
+        indices = self._type_index.get(doc_type, self._all_indices[:0]) if doc_type else self._all_indices
+        if indices.size == 0 or not (min_tier or rarities or equip_type or char_class):
+            return indices
+
+        mask = np.ones(indices.size, dtype=bool)
+        if min_tier:
+            mask &= self._tier_ranks[indices] >= TIER_RANK.get(min_tier.strip().upper(), 0)
+        if rarities:
+            wanted = [self._rarity_vocab[r.strip().lower()] for r in rarities if r.strip().lower() in self._rarity_vocab]
+            mask &= np.isin(self._rarity_codes[indices], wanted)
+        if equip_type:
+            code = self._equip_type_vocab.get(equip_type.strip().lower(), -2)
+            mask &= self._equip_type_codes[indices] == code
+        if char_class:
+            code = self._class_vocab.get(char_class.strip().lower(), -2)
+            mask &= self._class_codes[indices] == code
+        return indices[mask]
+
+    def lexical_scores(
+        self, terms: Sequence[str], doc_type: Optional[str], indices: np.ndarray
+    ) -> Optional[np.ndarray]:
+        """BM25 scores aligned with ``indices``, normalized to 0-1; None when nothing matches."""
+        if not terms:
+            return None
+        rows, scores = self.lexical_index.bm25(terms, doc_type=doc_type)
+        if rows.size == 0:
+            return None
+        dense = np.zeros(len(self.documents), dtype=np.float32)
+        dense[rows] = scores
+        aligned = dense[indices]
+        peak = float(aligned.max()) if aligned.size else 0.0
+        if peak <= 0:
+            return None
+        return aligned / peak
+
+
+class QueryEmbeddingCache:
+    """Bounded, thread-safe LRU cache of query embeddings keyed by normalized query text.
+
+    Entries belong to a single embedding model; switching models clears the cache.
+    """
+
+    def __init__(self, model_name: str, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024):
+        self.model_name = model_name
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key: str, vector: np.ndarray) -> int:
+        return vector.nbytes + len(key.encode("utf-8"))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        if self.max_entries == 0:
+            return
+        vector = np.array(vector, dtype=np.float32, copy=True)
+        vector.setflags(write=False)
+        size = self._entry_size(key, vector)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._entry_size(key, previous)
+            self._entries[key] = vector
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                old_key, old_vector = self._entries.popitem(last=False)
+                self._bytes -= self._entry_size(old_key, old_vector)
+                self.evictions += 1
+
+    def clear(self, model_name: Optional[str] = None) -> None:
+        """Drop every entry, optionally re-binding the cache to a new model."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if model_name is not None:
+                self.model_name = model_name
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
 class RAGSystem:
     """Retrieval-Augmented Generation system for MK Mobile data"""
     
-    def __init__(self, data_dir: Optional[Path] = None, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        data_dir: Optional[Path] = None,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_dir: Optional[Path] = None,
+    ):
         """
         Initialize RAG system
         
         Args:
             data_dir: Directory containing game data files
             model_name: Name of the sentence transformer model to use
+            cache_dir: Index artifact directory (default: MKM_RAG_CACHE_DIR or <data_dir>/.rag_cache)
         """
         if not EMBEDDINGS_AVAILABLE:
             logger.warning("sentence-transformers not available. Install with: pip install sentence-transformers")
@@ -66,17 +274,60 @@ class RAGSystem:
         else:
             self.data_dir = Path(data_dir)
         
-        self.cache_dir = self.data_dir / ".rag_cache"
-        self.cache_dir.mkdir(exist_ok=True)
+        if cache_dir is None:
+            cache_dir = os.getenv("MKM_RAG_CACHE_DIR", "").strip() or self.data_dir / ".rag_cache"
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         # Initialize embedding model
         logger.info(f"Loading embedding model: {model_name}")
+        self.model_name = model_name
         self.model = SentenceTransformer(model_name)
+        self._query_cache = QueryEmbeddingCache(
+            model_name,
+            max_entries=_env_int("MKM_RAG_QUERY_CACHE_SIZE", 1024),
+            max_bytes=_env_int("MKM_RAG_QUERY_CACHE_MAX_BYTES", 8 * 1024 * 1024),
+        )
         
-        self.documents: List[Document] = []
-        self.embeddings: Optional[np.ndarray] = None
+        self._snapshot = IndexSnapshot([], None)
         self._last_data_hash: Optional[str] = None  # tracks hash after last index
-        
+        self._manifest: Optional[Dict] = None  # manifest of the on-disk index in use
+        self._data_fingerprint = None  # stat fingerprint of the data files last hashed
+        self._stale = False  # set by refresh_staleness(), read on the request path
+        self._watcher: Optional[DataWatcher] = None
+        self._build_lock = threading.Lock()
+        self._reindex_lock = threading.Lock()
+        self._reindex_thread: Optional[threading.Thread] = None
+        self._reindex_active = False
+        self._reindex_again = False
+        self._reindex_progress: Dict = {"state": "idle"}
+
+    @property
+    def snapshot(self) -> "IndexSnapshot":
+        """The current index; grab it once per search so a concurrent swap cannot split it."""
+        return self._snapshot
+
+    @property
+    def documents(self) -> Sequence[Document]:
+        return self._snapshot.documents
+
+    @property
+    def embeddings(self) -> Optional[np.ndarray]:
+        return self._snapshot.embeddings
+
+    @property
+    def lexical_index(self) -> InvertedIndex:
+        return self._snapshot.lexical_index
+
+    @property
+    def manifest(self) -> Optional[Dict]:
+        """Manifest of the on-disk index artifact in use, if any."""
+        return self._manifest
+
+    def _set_index(self, documents: List[Document], embeddings: Optional[np.ndarray]) -> None:
+        """Build a snapshot for a document list + embedding matrix and publish it."""
+        self._snapshot = IndexSnapshot(documents, embeddings)
+
     def _normalize_text(self, text: str) -> str:
         """Normalize text for better embedding consistency."""
         if not text:
@@ -85,55 +336,6 @@ class RAGSystem:
         text = text.replace('’', "'").replace('‘', "'").replace('“', '"').replace('”', '"')
         return text.strip()
 
-    def _apply_keyword_boost(self, query: str, results: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
-        """Apply a boost to results that contain keywords from the query."""
-        if not query or not results:
-            return results
-            
-        # Clean query: remove possessives and common punctuation
-        clean_query = query.lower().replace("'s", "").replace("s'", "").replace("’s", "")
-        for char in ".,!?;:()[]{}":
-            clean_query = clean_query.replace(char, " ")
-            
-        # Extract keywords (words > 3 chars or common MK terms)
-        words = clean_query.split()
-        keywords = [w for w in words if len(w) > 3]
-        
-        # Add important small terms if they appear
-        important_terms = ['set', 'gear', 'kard', 'tier']
-        for term in important_terms:
-            if term in words and term not in keywords:
-                keywords.append(term)
-                
-        # Character names and set types are crucial
-        set_types = ['brutality', 'friendship']
-        for stype in set_types:
-            if stype in clean_query and stype not in keywords:
-                keywords.append(stype)
-        
-        if not keywords:
-            return results
-            
-        boosted_results = []
-        for doc, score in results:
-            content_lower = doc.content.lower()
-            name_lower = doc.metadata.get('name', '').lower()
-            
-            boost = 0
-            for kw in keywords:
-                # Big boost for direct name match
-                if kw in name_lower:
-                    boost += 0.15
-                # Medium boost for content match (tags, character names in desc)
-                elif kw in content_lower:
-                    boost += 0.05
-            
-            boosted_results.append((doc, score + boost))
-            
-        # Re-sort by boosted score
-        boosted_results.sort(key=lambda x: x[1], reverse=True)
-        return boosted_results
-
     def _get_cache_hash(self) -> str:
         """Generate hash of data files for cache validation"""
         hasher = hashlib.md5()
@@ -143,92 +345,134 @@ class RAGSystem:
             hasher.update(file.read_bytes())
         return hasher.hexdigest()
     
-    def _load_cache(self) -> bool:
-        """Load cached embeddings if available and valid"""
-        cache_file = self.cache_dir / "embeddings.pkl"
-        hash_file = self.cache_dir / "data_hash.txt"
-        
-        if not cache_file.exists() or not hash_file.exists():
-            return False
-        
-        # Check if data has changed
-        current_hash = self._get_cache_hash()
-        cached_hash = hash_file.read_text().strip()
-        
-        if current_hash != cached_hash:
-            logger.info("Data files changed, rebuilding embeddings")
-            return False
-        
-        # Load cached embeddings
-        try:
-            with open(cache_file, 'rb') as f:
-                cache_data = pickle.load(f)
-                self.documents = cache_data['documents']
-                self.embeddings = cache_data['embeddings']
-            logger.info(f"Loaded {len(self.documents)} documents from cache")
-            return True
-        except Exception as e:
-            logger.warning(f"Failed to load cache: {e}")
+    def _load_cache(self, data_hash: Optional[str] = None, allow_stale: bool = False) -> bool:
+        """Load cached embeddings if available and valid
+
+        With ``allow_stale`` any artifact built by this model is accepted, even
+        for older data; ``_last_data_hash`` then records the data it was built from.
+        """
+        loaded = index_store.load_index(
+            self.cache_dir,
+            model_name=self.model_name,
+            data_hash=None if allow_stale else (data_hash or self._get_cache_hash()),
+        )
+        if loaded is None:
             return False
+
+        rows, embeddings, manifest = loaded
+        documents = [Document(content, metadata, doc_type) for content, metadata, doc_type in rows]
+        self._set_index(documents, embeddings)
+        self._manifest = manifest
+        self._last_data_hash = manifest.get("data_hash")
+        logger.info(f"Loaded {len(self.documents)} documents from cache")
+        return True
     
-    def _save_cache(self):
+    def _save_cache(self, data_hash: Optional[str] = None, snapshot: Optional["IndexSnapshot"] = None):
         """Save embeddings to cache"""
+        snapshot = snapshot or self._snapshot
         try:
-            cache_file = self.cache_dir / "embeddings.pkl"
-            hash_file = self.cache_dir / "data_hash.txt"
-            
-            with open(cache_file, 'wb') as f:
-                pickle.dump({
-                    'documents': self.documents,
-                    'embeddings': self.embeddings
-                }, f)
-            
-            hash_file.write_text(self._get_cache_hash())
+            self._manifest = index_store.save_index(
+                self.cache_dir,
+                [(doc.content, doc.metadata, doc.doc_type) for doc in snapshot.documents],
+                snapshot.embeddings,
+                model_name=self.model_name,
+                data_hash=data_hash or self._get_cache_hash(),
+            )
             logger.info("Saved embeddings to cache")
         except Exception as e:
             logger.warning(f"Failed to save cache: {e}")
     
-    def index_data(self, force_rebuild: bool = False):
-        """Index all data files for semantic search"""
+    def index_data(self, force_rebuild: bool = False, blocking: bool = False):
+        """Index all data files for semantic search
+
+        A valid prebuilt artifact is always loaded instead of embedding. If the
+        artifact was built from older data it is served as-is and the
+        difference is re-embedded in the background, unless ``blocking``.
+        Documents are only embedded in the caller when there is no artifact
+        for this model at all (or on ``force_rebuild``).
+        """
         if not self.enabled:
             return
         
+        fingerprint = stat_fingerprint(self.data_dir)
+        
         # Try loading from cache
-        if not force_rebuild and self._load_cache():
-            return
+        if not force_rebuild:
+            if self._load_cache():
+                self._data_fingerprint = fingerprint
+                self._stale = False
+                return
+            if not blocking and self._load_cache(allow_stale=True):
+                logger.info("Serving prebuilt index built from older data; re-indexing in the background")
+                self._data_fingerprint = fingerprint
+                self._stale = True
+                self.request_reindex()
+                return
         
-        logger.info("Building document index...")
-        self.documents = []
+        self._rebuild(fingerprint, reuse_artifact=not force_rebuild)
+
+    def _build_documents(self) -> List[Document]:
+        """Read every data file into a fresh document list."""
+        documents: List[Document] = []
         
         # Index characters from TSV
-        self._index_characters()
+        self._index_characters(documents)
         
         # Index equipment
-        self._index_equipment()
+        self._index_equipment(documents)
         
         # Index gameplay mechanics
-        self._index_gameplay()
+        self._index_gameplay(documents)
         
         # Index glossary
-        self._index_glossary()
-        
-        # Generate embeddings
-        if self.documents:
-            logger.info(f"Generating embeddings for {len(self.documents)} documents...")
-            contents = [doc.content for doc in self.documents]
-            self.embeddings = self.model.encode(contents, show_progress_bar=True)
-            logger.info("Embeddings generated successfully")
+        self._index_glossary(documents)
+        return documents
+
+    def _rebuild(
+        self,
+        fingerprint,
+        progress: Optional[Callable[..., None]] = None,
+        reuse_artifact: bool = True,
+    ) -> None:
+        """Build a new snapshot off to the side, publish it, then persist it.
+
+        Searches keep using the previous snapshot until the single reference
+        swap, so they never see a half-built index. Builds hold the cache dir's
+        file lock, so concurrent replicas wait for one build and then load its
+        artifact instead of embedding the same data again.
+        """
+        report = progress or (lambda **fields: None)
+        with self._build_lock, index_store.build_lock(self.cache_dir):
+            report(phase="reading")
+            data_hash = self._get_cache_hash()
+            if reuse_artifact and self._load_cache(data_hash):
+                self._data_fingerprint = fingerprint
+                self._stale = False
+                return
+
+            logger.info("Building document index...")
+            documents = self._build_documents()
             
-            # Save to cache
-            self._save_cache()
-        
-        # Remember the hash of the data we just indexed
-        self._last_data_hash = self._get_cache_hash()
-        
-        if not self.documents:
-            logger.warning("No documents found to index")
+            # Generate embeddings
+            if documents:
+                report(phase="embedding", documents=len(documents))
+                contents = [doc.content for doc in documents]
+                snapshot = IndexSnapshot(documents, self._embed_documents(contents, progress=report))
+                self._snapshot = snapshot
+                logger.info("Embeddings generated successfully")
+                
+                # Save to cache
+                report(phase="saving")
+                self._save_cache(data_hash, snapshot)
+            else:
+                logger.warning("No documents found to index")
+            
+            # Remember the hash of the data we just indexed
+            self._last_data_hash = data_hash
+            self._data_fingerprint = fingerprint
+            self._stale = False
     
-    def _index_characters(self):
+    def _index_characters(self, documents: List[Document]):
         """Index character data"""
         import csv
         
@@ -305,11 +549,11 @@ class RAGSystem:
                 },
                 doc_type='character'
             )
-            self.documents.append(doc)
+            documents.append(doc)
         
         logger.info(f"Indexed {len(chars_data)} characters")
     
-    def _index_equipment(self):
+    def _index_equipment(self, documents: List[Document]):
         """Index equipment data from basic, krypt and towers files"""
         import csv
         
@@ -385,7 +629,7 @@ class RAGSystem:
                 },
                 doc_type='equipment'
             )
-            self.documents.append(doc)
+            documents.append(doc)
             equipment_count += 1
         
         if equipment_count > 0:
@@ -393,7 +637,7 @@ class RAGSystem:
         else:
             logger.warning("No equipment files found, skipping equipment indexing")
     
-    def _index_gameplay(self):
+    def _index_gameplay(self, documents: List[Document]):
         """Index gameplay mechanics — one Document per line for precise retrieval."""
         gameplay_file = self.data_dir / "gameplay.txt"
         if not gameplay_file.exists():
@@ -431,12 +675,12 @@ class RAGSystem:
                 metadata={'line': i, 'topic': topic},
                 doc_type='gameplay'
             )
-            self.documents.append(doc)
+            documents.append(doc)
             count += 1
 
         logger.info(f"Indexed {count} gameplay lines")
     
-    def _index_glossary(self):
+    def _index_glossary(self, documents: List[Document]):
         """Index glossary terms — one Document per term for precise retrieval."""
         glossary_file = self.data_dir / "glossary.txt"
         if not glossary_file.exists():
@@ -467,7 +711,7 @@ class RAGSystem:
                     metadata={'term': term.lower(), 'category': current_category},
                     doc_type='glossary'
                 )
-                self.documents.append(doc)
+                documents.append(doc)
                 count += 1
             else:
                 # Non-term line — index as-is under current category
@@ -476,17 +720,110 @@ class RAGSystem:
                     metadata={'category': current_category},
                     doc_type='glossary'
                 )
-                self.documents.append(doc)
+                documents.append(doc)
                 count += 1
 
         logger.info(f"Indexed {count} glossary entries")
     
+    def _embed_documents(
+        self, contents: Sequence[str], progress: Optional[Callable[..., None]] = None
+    ) -> np.ndarray:
+        """Embed document contents, reusing cached vectors for unchanged content.
+
+        Embeddings are addressed by sha256(model name + content), so after a
+        data edit only new or changed documents go through the model.
+        ``progress`` is called with embedded=/to_embed= counts as batches finish.
+        """
+        keys = [index_store.content_key(self.model_name, content) for content in contents]
+        store = index_store.load_embedding_store(self.cache_dir, model_name=self.model_name)
+        known, cached = store if store is not None else ({}, None)
+
+        missing = [i for i, key in enumerate(keys) if key not in known]
+        logger.info(
+            f"Generating embeddings for {len(missing)} of {len(contents)} documents "
+            f"({len(contents) - len(missing)} reused)..."
+        )
+        fresh = self._encode_in_batches([contents[i] for i in missing], progress) if missing else None
+        if cached is None:
+            return fresh
+
+        dim = cached.shape[1] if fresh is None else fresh.shape[1]
+        if fresh is not None and fresh.shape[1] != cached.shape[1]:
+            # Same model name but a different output size: nothing is reusable
+            return self._encode_in_batches(list(contents), progress)
+
+        embeddings = np.empty((len(contents), dim), dtype=np.float32)
+        reused = [i for i, key in enumerate(keys) if key in known]
+        if reused:
+            embeddings[reused] = cached[[known[keys[i]] for i in reused]]
+        if missing:
+            embeddings[missing] = fresh
+        return embeddings
+
+    def _encode_in_batches(
+        self, texts: List[str], progress: Optional[Callable[..., None]] = None
+    ) -> np.ndarray:
+        report = progress or (lambda **fields: None)
+        report(embedded=0, to_embed=len(texts))
+        chunks = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            chunks.append(np.asarray(self.model.encode(batch, show_progress_bar=False), dtype=np.float32))
+            report(embedded=start + len(batch), to_embed=len(texts))
+        return np.vstack(chunks)
+
+    def _encode_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Encode query strings, serving repeats from the LRU cache.
+
+        Cache misses are encoded together in a single batched forward pass.
+        """
+        cache = self._query_cache
+        if cache.model_name != self.model_name:
+            cache.clear(self.model_name)
+
+        keys = [self._normalize_text(query) for query in queries]
+        vectors: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        for key in dict.fromkeys(keys):
+            vector = cache.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                vectors[key] = vector
+
+        if missing:
+            encoded = np.asarray(self.model.encode(missing), dtype=np.float32)
+            for key, vector in zip(missing, encoded):
+                cache.put(key, vector)
+                vectors[key] = vector
+
+        return np.vstack([vectors[key] for key in keys])
+
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embedding of a query as search() computes it (shared LRU); None when disabled."""
+        if not self.enabled:
+            return None
+        return self._encode_queries([query])[0]
+
+    def embed_texts(self, texts: Sequence[str]) -> Optional[np.ndarray]:
+        """Embeddings of arbitrary texts in one batch, bypassing the query cache; None when disabled."""
+        if not self.enabled:
+            return None
+        return np.asarray(self.model.encode(list(texts), show_progress_bar=False), dtype=np.float32)
+
     def search(
         self,
         query: str,
         top_k: int = 5,
         doc_type: Optional[str] = None,
-        min_similarity: float = 0.3
+        min_similarity: float = 0.3,
+        *,
+        min_tier: Optional[str] = None,
+        rarities: Optional[Sequence[str]] = None,
+        equip_type: Optional[str] = None,
+        char_class: Optional[str] = None,
+        tier_boost: float = 0.0,
+        lexical_weight: float = 0.0,
     ) -> List[Tuple[Document, float]]:
         """
         Search for relevant documents using semantic similarity
@@ -496,48 +833,143 @@ class RAGSystem:
             top_k: Number of results to return
             doc_type: Filter by document type ('character', 'equipment', 'gameplay', 'glossary')
             min_similarity: Minimum similarity score (0-1)
+            min_tier: Only return documents at or above this tier (e.g. 'A')
+            rarities: Only return documents with one of these rarities
+            equip_type: Only return equipment of this type ('Weapon', 'Armor', 'Accessory')
+            char_class: Only return characters of this class
+            tier_boost: Score added per tier level (S+ > S > A > B > C > D) before top-k selection
+            lexical_weight: Weight of the normalized BM25 score fused with the similarity
             
         Returns:
-            List of (document, similarity_score) tuples
+            List of (document, score) tuples
+        """
+        return self.search_many(
+            [query],
+            [doc_type],
+            top_k=top_k,
+            min_similarity=min_similarity,
+            min_tier=min_tier,
+            rarities=rarities,
+            equip_type=equip_type,
+            char_class=char_class,
+            tier_boost=tier_boost,
+            lexical_weight=lexical_weight,
+        ).get(doc_type, [])
+
+    def search_many(
+        self,
+        queries: Sequence[str],
+        doc_types: Optional[Sequence[Optional[str]]] = None,
+        top_k: Union[int, Dict[str, int]] = 5,
+        min_similarity: Union[float, Dict[str, float]] = 0.3,
+        *,
+        min_tier: Optional[str] = None,
+        rarities: Optional[Sequence[str]] = None,
+        equip_type: Optional[str] = None,
+        char_class: Optional[str] = None,
+        tier_boost: Union[float, Dict[str, float]] = 0.0,
+        lexical_weight: Union[float, Dict[str, float]] = 0.0,
+    ) -> Dict[Optional[str], List[Tuple[Document, float]]]:
+        """
+        Search several queries across several document types in one pass.
+
+        Every distinct query string is encoded once in a single batched call and
+        scored against the embedding matrix with one matrix product. For each
+        doc type the top_k hits of every query are pooled, keeping the best
+        score per document. Metadata predicates are applied to every doc type.
+
+        When tier_boost is set, ``tier_boost * tier_rank`` is added to the raw
+        similarity of every candidate before top-k selection, so high-tier
+        documents just below the cutoff are never lost. min_similarity always
+        applies to the raw similarity.
+
+        When lexical_weight is set, each query's BM25 score (from the inverted
+        index, normalized to 0-1 within the doc type) is added as well; documents
+        with a lexical match stay eligible even below min_similarity.
+
+        Args:
+            queries: Query strings (e.g. Klassic/Classic variants of one question)
+            doc_types: Document types to search; None searches all documents as one pool
+            top_k: Results per query, or a mapping of doc_type -> results per query
+            min_similarity: Minimum similarity score, or a mapping of doc_type -> minimum
+            min_tier, rarities, equip_type, char_class: Metadata predicates (see search())
+            tier_boost: Score per tier level, or a mapping of doc_type -> score per tier level
+            lexical_weight: BM25 weight, or a mapping of doc_type -> BM25 weight
+
+        Returns:
+            Mapping of doc_type -> list of (document, similarity_score) tuples, best first
         """
+        types = list(doc_types) if doc_types else [None]
+        results: Dict[Optional[str], List[Tuple[Document, float]]] = {t: [] for t in types}
+
         if not self.enabled:
-            return []
-        
-        if not self.documents or self.embeddings is None:
+            return results
+
+        snapshot = self._snapshot
+        if not snapshot.documents or snapshot.embeddings is None:
             logger.warning("No indexed documents. Call index_data() first.")
-            return []
-        
-        # Generate query embedding
-        query_embedding = self.model.encode([query])[0]
-        
-        # Calculate similarities
-        similarities = np.dot(self.embeddings, query_embedding)
-        
-        # Filter by document type if specified
-        if doc_type:
-            filtered_indices = [i for i, doc in enumerate(self.documents) if doc.doc_type == doc_type]
-            filtered_similarities = similarities[filtered_indices]
-            filtered_docs = [self.documents[i] for i in filtered_indices]
-        else:
-            filtered_similarities = similarities
-            filtered_docs = self.documents
-        
-        # Get top-k results
-        top_indices = np.argsort(filtered_similarities)[-top_k:][::-1]
-        
-        results = []
-        for idx in top_indices:
-            score = float(filtered_similarities[idx])
-            if score >= min_similarity:
-                results.append((filtered_docs[idx], score))
-        
+            return results
+
+        distinct_queries = list(dict.fromkeys(queries))
+        if not distinct_queries:
+            return results
+
+        # One batched encode + one (Q x D) @ (D x N) product for every query/type pair
+        query_embeddings = self._encode_queries(distinct_queries)
+        similarities = query_embeddings @ np.asarray(snapshot.embeddings).T
+        query_terms = [tokenize_for_match(query) for query in distinct_queries]
+
+        for doc_type in types:
+            k = top_k.get(doc_type, 5) if isinstance(top_k, dict) else top_k
+            floor = (
+                min_similarity.get(doc_type, 0.3)
+                if isinstance(min_similarity, dict)
+                else min_similarity
+            )
+            boost = tier_boost.get(doc_type, 0.0) if isinstance(tier_boost, dict) else tier_boost
+            lex_weight = (
+                lexical_weight.get(doc_type, 0.0)
+                if isinstance(lexical_weight, dict)
+                else lexical_weight
+            )
+            if k <= 0:
+                continue
+
+            indices = snapshot.candidate_indices(doc_type, min_tier, rarities, equip_type, char_class)
+            if indices.size == 0:
+                continue
+
+            pool: Dict[int, float] = {}
+            for raw, terms in zip(similarities[:, indices], query_terms):
+                lexical = snapshot.lexical_scores(terms, doc_type, indices) if lex_weight else None
+                if lexical is not None:
+                    eligible = np.flatnonzero((raw >= floor) | (lexical > 0))
+                else:
+                    eligible = np.flatnonzero(raw >= floor)
+                if eligible.size == 0:
+                    continue
+                rows = indices[eligible]
+                scores = raw[eligible]
+                if boost:
+                    scores = scores + boost * snapshot.tier_bonus[rows]
+                if lexical is not None:
+                    scores = scores + lex_weight * lexical[eligible]
+                top = _top_k_indices(scores, k)
+                for doc_idx, score in zip(rows[top].tolist(), scores[top].tolist()):
+                    if score > pool.get(doc_idx, float("-inf")):
+                        pool[doc_idx] = score
+
+            ranked = sorted(pool.items(), key=lambda item: item[1], reverse=True)
+            results[doc_type] = [(snapshot.documents[i], score) for i, score in ranked]
+
         return results
     
     def search_characters(
         self,
         query: str,
         top_k: int = 10,
-        prioritize_tier: bool = True
+        prioritize_tier: bool = True,
+        tier_boost: float = TIER_BOOST,
     ) -> List[Tuple[Document, float]]:
         """
         Search for characters matching the query with optional tier prioritization.
@@ -546,40 +978,27 @@ class RAGSystem:
             query: Search query
             top_k: Number of results to return
             prioritize_tier: If True, boost scores based on tier (S+ > S > A > B > C > D)
+            tier_boost: Score added per tier level when prioritize_tier is set
             
         Returns:
             List of (Document, score) tuples sorted by adjusted score
         """
-        # Fetch more results to allow tier reranking
-        fetch_k = top_k * 3 if prioritize_tier else top_k
-        base_results = self.search(query, top_k=fetch_k, doc_type='character')
-        
-        if not prioritize_tier:
-            return base_results[:top_k]
-        
-        # Apply tier boost to scores
-        adjusted_results = []
-        for doc, score in base_results:
-            tier = doc.metadata.get('tier', '')
-            tier_rank = get_tier_rank(tier)
-            # Boost: S+ gets +0.5, S gets +0.4, A gets +0.3, etc.
-            tier_bonus = tier_rank * TIER_BOOST
-            adjusted_score = score + tier_bonus
-            adjusted_results.append((doc, adjusted_score))
-        
-        # Sort by adjusted score (highest first) and limit to top_k
-        adjusted_results.sort(key=lambda x: x[1], reverse=True)
-        
-        # Apply keyword boost for direct relevance
-        final_results = self._apply_keyword_boost(query, adjusted_results)
-        
-        return final_results[:top_k]
+        # Tier bonus and BM25 keyword relevance are fused into the similarity
+        # scores before top-k selection
+        return self.search(
+            query,
+            top_k=top_k,
+            doc_type='character',
+            tier_boost=tier_boost if prioritize_tier else 0.0,
+            lexical_weight=LEXICAL_WEIGHT if prioritize_tier else 0.0,
+        )
     
     def search_equipment(
         self,
         query: str,
         top_k: int = 20,
-        prioritize_tier: bool = True
+        prioritize_tier: bool = True,
+        tier_boost: float = TIER_BOOST,
     ) -> List[Tuple[Document, float]]:
         """
         Search for equipment matching the query with optional tier prioritization.
@@ -588,34 +1007,20 @@ class RAGSystem:
             query: Search query
             top_k: Number of results to return
             prioritize_tier: If True, boost scores based on tier (S+ > S > A > B > C > D)
+            tier_boost: Score added per tier level when prioritize_tier is set
             
         Returns:
             List of (Document, score) tuples sorted by adjusted score
         """
-        # Fetch more results to allow tier reranking
-        fetch_k = top_k * 3 if prioritize_tier else top_k
-        base_results = self.search(query, top_k=fetch_k, doc_type='equipment')
-        
-        if not prioritize_tier:
-            return base_results[:top_k]
-        
-        # Apply tier boost to scores
-        adjusted_results = []
-        for doc, score in base_results:
-            tier = doc.metadata.get('tier', '')
-            tier_rank = get_tier_rank(tier)
-            # Boost: S+ gets +0.5, S gets +0.4, A gets +0.3, etc.
-            tier_bonus = tier_rank * TIER_BOOST
-            adjusted_score = score + tier_bonus
-            adjusted_results.append((doc, adjusted_score))
-        
-        # Sort by adjusted score (highest first) and limit to top_k
-        adjusted_results.sort(key=lambda x: x[1], reverse=True)
-        
-        # Apply keyword boost for direct relevance
-        final_results = self._apply_keyword_boost(query, adjusted_results)
-        
-        return final_results[:top_k]
+        # Tier bonus and BM25 keyword relevance are fused into the similarity
+        # scores before top-k selection
+        return self.search(
+            query,
+            top_k=top_k,
+            doc_type='equipment',
+            tier_boost=tier_boost if prioritize_tier else 0.0,
+            lexical_weight=LEXICAL_WEIGHT if prioritize_tier else 0.0,
+        )
     
     def search_gameplay(self, query: str, top_k: int = 3) -> List[Tuple[Document, float]]:
         """Search for gameplay mechanics matching the query"""
@@ -629,34 +1034,135 @@ class RAGSystem:
     # Runtime cache-invalidation helpers
     # ------------------------------------------------------------------
 
-    def is_stale(self) -> bool:
-        """Return True if the data files have changed since the last index."""
+    def refresh_staleness(self) -> bool:
+        """Re-check the data files and update the stale flag.
+
+        Stats the files first and only re-hashes their content when the
+        (mtime, size, inode) fingerprint moved. Meant to run on the watcher
+        thread; returns the new stale flag.
+        """
         if not self.enabled or self._last_data_hash is None:
             return False
-        return self._get_cache_hash() != self._last_data_hash
+        fingerprint = stat_fingerprint(self.data_dir)
+        if fingerprint == self._data_fingerprint:
+            return self._stale
+        stale = self._get_cache_hash() != self._last_data_hash
+        self._data_fingerprint = fingerprint
+        self._stale = stale
+        if stale:
+            logger.info("Data files changed since last index")
+        return stale
+
+    def start_watcher(self, interval: Optional[float] = None) -> bool:
+        """Start the background data watcher (MKM_RAG_WATCH_INTERVAL_SECONDS, 0 disables).
+
+        Returns True when a watcher is running afterwards.
+        """
+        if not self.enabled:
+            return False
+        if self._watcher is not None and self._watcher.running:
+            return True
+        interval = get_poll_interval() if interval is None else interval
+        if interval <= 0:
+            return False
+        self._watcher = DataWatcher(self.data_dir, self._watch_tick, interval)
+        self._watcher.start()
+        return True
+
+    def _watch_tick(self) -> None:
+        if self.refresh_staleness():
+            self.check_and_reindex()
+
+    def stop_watcher(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def is_stale(self) -> bool:
+        """Return True if the watcher has seen the data files change since the last index."""
+        return bool(self.enabled and self._stale)
 
     def check_and_reindex(self) -> bool:
-        """Re-index data if the underlying files changed.  Returns True if a rebuild happened."""
-        if self.is_stale():
-            logger.info("Data files changed since last index — rebuilding…")
-            self.index_data(force_rebuild=True)
+        """Start a background re-index if the data files changed.
+
+        Never blocks on the rebuild; returns True if one was started.
+        """
+        if self.is_stale() and not self.reindex_running:
+            logger.info("Data files changed since last index — rebuilding in the background…")
+            self.request_reindex()
             return True
         return False
 
+    @property
+    def reindex_running(self) -> bool:
+        return self._reindex_active
+
+    def request_reindex(self) -> Dict:
+        """Start a background rebuild, or queue one more behind a running rebuild.
+
+        Returns:
+            The rebuild progress at the time of the call
+        """
+        if not self.enabled:
+            return {"state": "disabled"}
+        with self._reindex_lock:
+            if self._reindex_active:
+                self._reindex_again = True
+                return {**self._reindex_progress, "queued": True}
+            self._reindex_active = True
+            self._reindex_progress = {"state": "running", "phase": "starting", "started_at": time.time()}
+            self._reindex_thread = threading.Thread(
+                target=self._reindex_worker, name="mkm-reindex", daemon=True
+            )
+            self._reindex_thread.start()
+            return dict(self._reindex_progress)
+
+    def reindex_progress(self) -> Dict:
+        """Snapshot of the background rebuild's state, phase and embedding counts."""
+        with self._reindex_lock:
+            return {**self._reindex_progress, "queued": self._reindex_again}
+
+    def _update_reindex_progress(self, **fields) -> None:
+        with self._reindex_lock:
+            self._reindex_progress = {**self._reindex_progress, **fields}
+
+    def _reindex_worker(self) -> None:
+        while True:
+            try:
+                self._rebuild(stat_fingerprint(self.data_dir), progress=self._update_reindex_progress)
+                self._update_reindex_progress(
+                    state="done", phase="published", finished_at=time.time(),
+                    document_count=len(self._snapshot.documents),
+                )
+            except Exception as e:
+                logger.exception("Background re-index failed")
+                self._update_reindex_progress(state="failed", error=str(e), finished_at=time.time())
+
+            with self._reindex_lock:
+                if not self._reindex_again:
+                    self._reindex_active = False
+                    return
+                self._reindex_again = False
+                self._reindex_progress = {"state": "running", "phase": "starting", "started_at": time.time()}
+
     def get_status(self) -> Dict:
         """Return a status dict useful for health / observability endpoints."""
         import datetime
 
-        cache_file = self.cache_dir / "embeddings.pkl" if self.enabled else None
+        manifest = getattr(self, "_manifest", None) if self.enabled else None
         cache_age = None
-        if cache_file and cache_file.exists():
-            mtime = cache_file.stat().st_mtime
-            cache_age = str(datetime.datetime.fromtimestamp(mtime))
+        manifest_file = self.cache_dir / index_store.MANIFEST_NAME if manifest else None
+        if manifest_file and manifest_file.exists():
+            cache_age = str(datetime.datetime.fromtimestamp(manifest_file.stat().st_mtime))
 
         return {
             "enabled": self.enabled,
             "document_count": len(self.documents) if self.enabled else 0,
             "cache_dir": str(self.cache_dir) if self.enabled else None,
             "cache_last_built": cache_age,
+            "cache_format_version": manifest.get("format_version") if manifest else None,
             "data_stale": self.is_stale() if self.enabled else False,
+            "data_watcher_running": bool(self.enabled and self._watcher and self._watcher.running),
+            "reindex": self.reindex_progress() if self.enabled else None,
+            "query_embedding_cache": self._query_cache.stats() if self.enabled else None,
         }
@@ -0,0 +1,114 @@
+"""Background watcher that keeps RAG staleness up to date off the request path"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+DATA_PATTERNS = ("*.tsv", "*.txt")
+DEFAULT_POLL_INTERVAL_SECONDS = 5.0
+
+Fingerprint = Tuple[Tuple[str, int, int, int], ...]
+
+
+def stat_fingerprint(data_dir: Path, patterns: Tuple[str, ...] = DATA_PATTERNS) -> Fingerprint:
+    """Cheap fingerprint of the data files: (name, mtime_ns, size, inode) per file.
+
+    Only stats the files, so it can run often; content is hashed only when
+    this changes.
+    """
+    entries = []
+    for pattern in patterns:
+        for path in Path(data_dir).glob(pattern):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((path.name, st.st_mtime_ns, st.st_size, st.st_ino))
+    return tuple(sorted(entries))
+
+
+def get_poll_interval() -> float:
+    """Seconds between fingerprint checks (MKM_RAG_WATCH_INTERVAL_SECONDS, 0 disables)."""
+    try:
+        return max(0.0, float(os.getenv("MKM_RAG_WATCH_INTERVAL_SECONDS", DEFAULT_POLL_INTERVAL_SECONDS)))
+    except ValueError:
+        return DEFAULT_POLL_INTERVAL_SECONDS
+
+
+class _WakeHandler(FileSystemEventHandler):
+    def __init__(self, wake: threading.Event):
+        self._wake = wake
+
+    def on_any_event(self, event):
+        self._wake.set()
+
+
+class DataWatcher:
+    """Daemon thread that calls ``check`` every ``interval`` seconds.
+
+    When watchdog is installed (inotify on Linux), file events wake the
+    thread immediately; polling stays on as the fallback either way.
+    """
+
+    def __init__(self, data_dir: Path, check: Callable[[], object], interval: float):
+        self.data_dir = Path(data_dir)
+        self.interval = interval
+        self._check = check
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        if WATCHDOG_AVAILABLE:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_WakeHandler(self._wake), str(self.data_dir), recursive=False)
+                self._observer.daemon = True
+                self._observer.start()
+            except Exception as e:
+                logger.warning(f"File event watcher unavailable, polling only: {e}")
+                self._observer = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="mkm-data-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self._check()
+            except Exception:
+                logger.exception("Data watcher check failed")
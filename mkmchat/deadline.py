@@ -0,0 +1,106 @@
+"""Request deadlines and per-stage time budgets"""
+
+import asyncio
+import contextvars
+import os
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Seconds the caller is still willing to wait; capped by MKM_HTTP_TIMEOUT_SECONDS
+DEADLINE_HEADER = "X-Request-Timeout"
+
+# Stage -> (env var, default seconds); 0 leaves the stage bounded by the request deadline only
+STAGE_BUDGETS = {
+    "retrieval": ("MKM_RETRIEVAL_TIMEOUT_SECONDS", 30.0),
+    "summary": ("MKM_SUMMARY_TIMEOUT_SECONDS", 60.0),
+    "generation": ("MKM_GENERATION_TIMEOUT_SECONDS", 0.0),
+}
+
+# Absolute time.monotonic() by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("mkm_request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """A request ran out of time, either overall or within one stage's budget."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def request_timeout(header_value: Optional[str], maximum: float) -> float:
+    """Seconds to allow a request: the caller's ``X-Request-Timeout`` if sooner than ``maximum``."""
+    try:
+        requested = float(header_value) if header_value else 0.0
+    except ValueError:
+        requested = 0.0
+    return min(requested, maximum) if requested > 0 else maximum
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining(fallback: float, deadline: Optional[float] = None) -> float:
+    """Seconds left before the request deadline (``fallback`` when none is set), never above ``fallback``."""
+    deadline = deadline if deadline is not None else _deadline.get()
+    if deadline is None:
+        return fallback
+    return max(0.0, min(fallback, deadline - time.monotonic()))
+
+
+def _stage_budget(stage: str) -> float:
+    env_name, default = STAGE_BUDGETS[stage]
+    try:
+        return max(0.0, float(os.getenv(env_name, str(default))))
+    except ValueError:
+        return default
+
+
+def stage_timeout(stage: str, fallback: float) -> float:
+    """Seconds ``stage`` may take: its own budget, cut short by what is left of the request."""
+    left = remaining(fallback)
+    budget = _stage_budget(stage)
+    return min(left, budget) if budget > 0 else left
+
+
+async def within(stage: str, awaitable: Awaitable[T], fallback: float) -> T:
+    """Await ``awaitable`` inside ``stage``'s budget; raises DeadlineExceeded when it runs out."""
+    timeout = stage_timeout(stage, fallback)
+    if timeout <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(stage)
+
+
+async def without_deadline(awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` with no request deadline, for work shared by requests with different ones.
+
+    Callers still bound their own wait for it (e.g. with_deadline around a shield).
+    """
+    token = _deadline.set(None)
+    try:
+        return await awaitable
+    finally:
+        _deadline.reset(token)
+
+
+async def with_deadline(seconds: float, awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` as a request that must finish within ``seconds``.
+
+    The deadline is visible to every stage awaited underneath, so retrieval,
+    queueing, summarization and generation all stop at the same instant.
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        return await asyncio.wait_for(awaitable, timeout=seconds)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("request")
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,132 @@
+"""Extractive chat summaries: salient sentences picked on the CPU with the retrieval encoder"""
+
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from mkmchat.data.lexical import MATCH_STOPWORDS
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_MARKDOWN = re.compile(r"^\s*(?:[-*+>]|\d+[.)]|#+)\s+|\*\*|__|`")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_CAPITALIZED_RUN = re.compile(r"\b[A-Z][A-Za-z0-9'-]*(?:\s+[A-Z0-9][A-Za-z0-9'-]*)*")
+
+# Capitalized words that open clauses rather than name things
+_NOT_ENTITIES = MATCH_STOPWORDS | {
+    "i", "a", "an", "in", "on", "at", "to", "of", "if", "it", "its", "my", "your", "you", "we",
+    "they", "he", "she", "yes", "no", "ok", "also", "but", "so", "then", "use", "try", "best",
+    "user", "assistant", "mentioned", "note",
+}
+
+_MIN_SENTENCE_WORDS = 3
+_MAX_ENTITIES = 20
+# Sentences at least this similar to one already kept add nothing
+_DUPLICATE_SIMILARITY = 0.9
+
+
+def _entities(raw: str) -> List[str]:
+    """Named things in one raw sentence: **bold** spans, then capitalized runs past sentence-initial filler."""
+    found = [span.strip() for span in _BOLD.findall(raw) if span.strip()]
+    text = _MARKDOWN.sub("", raw).strip()
+    for match in _CAPITALIZED_RUN.finditer(text):
+        # A sentence's first word is capitalized whether or not it names anything
+        words = match.group(0).split()[1:] if match.start() == 0 else match.group(0).split()
+        while words and words[0].lower() in _NOT_ENTITIES:
+            words.pop(0)
+        if words:
+            found.append(" ".join(words))
+    return found
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _words(text: str) -> int:
+    return len(text.split())
+
+
+def summarize_extractively(
+    existing_summary: str,
+    messages: List[Dict[str, str]],
+    encode: Callable[[Sequence[str]], Optional[np.ndarray]],
+    max_words: int = 250,
+    diversity: float = 0.7,
+) -> Optional[str]:
+    """Merge ``messages`` into ``existing_summary`` by extracting their salient sentences.
+
+    Sentences of the new messages are embedded with ``encode`` and ranked by
+    maximal marginal relevance: similarity to the centroid of the new
+    messages, minus ``1 - diversity`` times the similarity to the closest
+    sentence already in the running summary or already picked; near
+    duplicates of those are skipped outright. Picked
+    sentences keep their speaker and original wording and order. Named
+    entities from sentences that were left out are listed on a final
+    ``Mentioned:`` line. The result is capped at ``max_words``: new
+    sentences get what the existing summary leaves free, but at least half
+    of it, and the oldest sentences of the existing summary are dropped
+    first to make room.
+    """
+    candidates: List[str] = []
+    entities: List[str] = []
+    for message in messages:
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        for raw in _SENTENCE_SPLIT.split(message["content"]):
+            entities.extend(_entities(raw))
+            text = _MARKDOWN.sub("", raw).strip()
+            if _words(text) >= _MIN_SENTENCE_WORDS:
+                candidates.append(f"{speaker}: {text}")
+
+    summary_sentences = [part.strip() for part in _SENTENCE_SPLIT.split(existing_summary or "") if part.strip()]
+    if not candidates:
+        return existing_summary or None
+
+    encoded = encode(summary_sentences + candidates)
+    if encoded is None:
+        return None
+    vectors = _unit(np.asarray(encoded, dtype=np.float32))
+    summary_vectors, candidate_vectors = vectors[: len(summary_sentences)], vectors[len(summary_sentences):]
+
+    relevance = candidate_vectors @ _unit(candidate_vectors.mean(axis=0))
+    redundancy = (
+        (candidate_vectors @ summary_vectors.T).max(axis=1)
+        if len(summary_sentences)
+        else np.zeros(len(candidates), dtype=np.float32)
+    )
+    summary_words = sum(_words(sentence) for sentence in summary_sentences)
+    budget = max(max_words // 2, max_words - summary_words)
+
+    picked: List[int] = []
+    used = 0
+    available = np.ones(len(candidates), dtype=bool)
+    while available.any():
+        scores = np.where(available, diversity * relevance - (1 - diversity) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        available[best] = False
+        length = _words(candidates[best])
+        if used + length > budget or redundancy[best] >= _DUPLICATE_SIMILARITY:
+            continue
+        picked.append(best)
+        used += length
+        redundancy = np.maximum(redundancy, candidate_vectors @ candidate_vectors[best])
+
+    body = [candidates[index] for index in sorted(picked)]
+    room = max_words - sum(_words(sentence) for sentence in body)
+    kept_text = " ".join(summary_sentences + body)
+    missing = [name for name in dict.fromkeys(entities) if name not in kept_text][:_MAX_ENTITIES]
+    while missing and 1 + sum(_words(name) for name in missing) > room:
+        missing.pop()
+    if missing:
+        body.append(f"Mentioned: {', '.join(missing)}.")
+        room -= _words(body[-1])
+
+    kept: List[str] = []
+    for sentence in reversed(summary_sentences):
+        room -= _words(sentence)
+        if room < 0:
+            break
+        kept.insert(0, sentence)
+
+    return "\n".join(kept + body) or existing_summary or None
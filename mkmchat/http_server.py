@@ -1,29 +1,71 @@
 """HTTP Server for MK Mobile Assistant API"""
 
 import asyncio
+import concurrent.futures
+import hashlib
 import hmac
 import json
 import logging
+import math
 import os
 import re
-from collections import defaultdict, deque
+import select
+import socket
+import threading
+from contextlib import aclosing, asynccontextmanager, nullcontext
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
-from time import monotonic
+from pathlib import Path
 from urllib.parse import urlparse, parse_qs
-from typing import Optional, List, Dict, Tuple, Set
-
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Callable, NamedTuple, Optional, List, Dict, Tuple, Set, TypeVar
+
+from mkmchat.chat_sessions import ChatSessionStore
+from mkmchat.data.lexical import MATCH_STOPWORDS, normalize_for_match, tokenize_for_match
+from mkmchat.data.rag import TIER_BOOST, get_tier_rank
+from mkmchat.deadline import (
+    DEADLINE_HEADER,
+    DeadlineExceeded,
+    current_deadline,
+    remaining,
+    request_timeout,
+    stage_timeout,
+    with_deadline,
+    within,
+    without_deadline,
+)
+from mkmchat.extractive_summary import summarize_extractively
+from mkmchat.llm.http_client import OllamaStreamError, ollama_client, stream_completion
+from mkmchat.llm.json_stream import IncrementalJSONObject
 from mkmchat.llm.ollama import get_ollama_assistant
+from mkmchat.llm.scheduler import (
+    ENDPOINT_PRIORITIES,
+    SchedulerRejected,
+    current_client,
+    current_priority,
+    generation_slot,
+    get_scheduler,
+    scheduler_stats,
+    with_client,
+)
+from mkmchat.pipeline import PIPELINE_STATS, Pipeline
+from mkmchat.rate_limit import TokenBucketLimiter
+from mkmchat.response_cache import ResponseCache, SemanticAnswerCache
+from mkmchat.singleflight import SingleFlight
+from mkmchat.summary_cache import SummaryCache
 from mkmchat.tools.semantic_search import get_rag_system
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Default port
 DEFAULT_PORT = 8080
 
-_IP_REQUESTS = defaultdict(deque)
-_IP_BURST_REQUESTS = defaultdict(deque)
+# How often a waiting handler checks whether its client has gone away
+DISCONNECT_POLL_SECONDS = 0.25
+
+_rate_limiter = TokenBucketLimiter()
 
 
 def _get_http_timeout_seconds() -> int:
@@ -97,6 +139,14 @@ def _safe_positive_int(value: str, fallback: int) -> int:
         return fallback
 
 
+def _get_tier_boost(env_name: str, default: float) -> float:
+    """Per-endpoint tier boost weight (score added per tier level); negatives disable it."""
+    try:
+        return max(0.0, float(os.getenv(env_name, str(default))))
+    except ValueError:
+        return default
+
+
 def _sanitize_chat_messages(messages: object) -> List[Dict[str, str]]:
     if not isinstance(messages, list):
         return []
@@ -139,25 +189,51 @@ def _chat_query_variants(query: str) -> List[str]:
     return dedup
 
 
-_MATCH_STOPWORDS: Set[str] = {
-    "the", "and", "for", "with", "from", "that", "this", "what", "which", "about",
-    "tell", "show", "give", "does", "how", "when", "where", "why", "who", "into",
-    "can", "are", "is", "was", "were", "have", "has", "had", "please", "need",
-    "character", "characters", "variant", "variants",
-}
-
+_MATCH_STOPWORDS = MATCH_STOPWORDS
+_normalize_for_match = normalize_for_match
+_tokenize_for_match = tokenize_for_match
 
-def _normalize_for_match(text: str) -> str:
-    return re.sub(r"[^a-z0-9\s]+", " ", (text or "").lower()).strip()
 
+def _lexical_candidates(
+    rag,
+    doc_type: str,
+    full_query: str,
+    query_terms: Set[str],
+    *,
+    with_content: bool = False,
+):
+    """Yield (doc, name, name_norm, name_terms, content_overlap) lexical candidates.
+
+    Uses the RAG's prebuilt inverted index when present so only documents that
+    share a term (or whose name appears as a phrase) with the query are visited;
+    otherwise scans every document of ``doc_type``. ``content_overlap`` is the
+    number of query terms found in the content, or 0 when ``with_content`` is off.
+    """
+    index = getattr(rag, "lexical_index", None)
+    if index is None:
+        for doc in rag.documents:
+            if doc.doc_type != doc_type:
+                continue
+            name = str(doc.metadata.get("name", "")).strip()
+            if not name:
+                continue
+            content_overlap = (
+                len(query_terms & _tokenize_for_match(doc.content)) if with_content else 0
+            )
+            yield doc, name, _normalize_for_match(name), _tokenize_for_match(name), content_overlap
+        return
 
-def _tokenize_for_match(text: str) -> Set[str]:
-    normalized = _normalize_for_match(text)
-    return {
-        token
-        for token in normalized.split()
-        if len(token) >= 3 and token not in _MATCH_STOPWORDS
-    }
+    name_overlap = index.term_overlap(query_terms, "name", doc_type)
+    content_counts = index.term_overlap(query_terms, "content", doc_type) if with_content else {}
+    rows = dict.fromkeys(index.name_phrase_rows(full_query, doc_type))
+    rows.update(dict.fromkeys(name_overlap))
+    rows.update(dict.fromkeys(content_counts))
+    for row in rows:
+        doc = index.documents[row]
+        name = str(doc.metadata.get("name", "")).strip()
+        if not name:
+            continue
+        yield doc, name, index.name_norms[row], index.name_terms[row], content_counts.get(row, 0)
 
 
 # ---------------------------------------------------------------------------
@@ -251,6 +327,49 @@ def _extract_passive(doc_content: str) -> str:
     return ""
 
 
+def _search_many(
+    rag,
+    queries: List[str],
+    *,
+    doc_types: List[str],
+    top_k: Dict[str, int],
+    min_similarity: Dict[str, float],
+    tier_boost: Optional[Dict[str, float]] = None,
+) -> Dict[str, List[Tuple[object, float]]]:
+    """Search every query across every doc type, pooling the best score per document.
+
+    Uses ``rag.search_many`` (one batched encode for all queries, tier bonus
+    fused before top-k) when the RAG system provides it, and falls back to one
+    ``rag.search`` call per pair.
+    """
+    boosts = {doc_type: w for doc_type, w in (tier_boost or {}).items() if w}
+    search_many = getattr(rag, "search_many", None)
+    if search_many is not None:
+        kwargs = {"tier_boost": boosts} if boosts else {}
+        hits = search_many(queries, doc_types, top_k=top_k, min_similarity=min_similarity, **kwargs)
+        return {doc_type: list(hits.get(doc_type, [])) for doc_type in doc_types}
+
+    pooled: Dict[str, List[Tuple[object, float]]] = {}
+    for doc_type in doc_types:
+        weight = boosts.get(doc_type, 0.0)
+        pool: Dict[int, Tuple[object, float]] = {}
+        for query in queries:
+            for doc, score in rag.search(
+                query,
+                top_k=top_k[doc_type],
+                doc_type=doc_type,
+                min_similarity=min_similarity[doc_type],
+            ):
+                if weight:
+                    score += weight * get_tier_rank(str(doc.metadata.get("tier", "")))
+                key = id(doc)
+                existing = pool.get(key)
+                if not existing or score > existing[1]:
+                    pool[key] = (doc, score)
+        pooled[doc_type] = sorted(pool.values(), key=lambda x: x[1], reverse=True)
+    return pooled
+
+
 def _search_with_variants(
     rag,
     query: str,
@@ -258,24 +377,40 @@ def _search_with_variants(
     doc_type: str,
     top_k_per_variant: int,
     min_similarity: float,
+    tier_boost: float = 0.0,
 ) -> List[Tuple[object, float]]:
     variants = _chat_query_variants(query)
     search_variants = variants or [query]
-    pool: Dict[int, Tuple[object, float]] = {}
+    return _search_many(
+        rag,
+        search_variants,
+        doc_types=[doc_type],
+        top_k={doc_type: top_k_per_variant},
+        min_similarity={doc_type: min_similarity},
+        tier_boost={doc_type: tier_boost},
+    )[doc_type]
 
-    for variant in search_variants:
-        for doc, score in rag.search(
-            variant,
-            top_k=top_k_per_variant,
-            doc_type=doc_type,
-            min_similarity=min_similarity,
-        ):
-            key = id(doc)
-            existing = pool.get(key)
-            if not existing or score > existing[1]:
-                pool[key] = (doc, score)
 
-    return sorted(pool.values(), key=lambda x: x[1], reverse=True)
+def _prefetch_semantic_hits(
+    rag,
+    query: str,
+    plan: Dict[str, Tuple[int, float, float]],
+) -> Dict[str, List[Tuple[object, float]]]:
+    """Run every semantic sub-search of a context builder in one batched pass.
+
+    ``plan`` maps doc_type -> (top_k_per_variant, min_similarity, tier_boost).
+    """
+    if not plan:
+        return {}
+    search_variants = _chat_query_variants(query) or [query]
+    return _search_many(
+        rag,
+        search_variants,
+        doc_types=list(plan),
+        top_k={doc_type: spec[0] for doc_type, spec in plan.items()},
+        min_similarity={doc_type: spec[1] for doc_type, spec in plan.items()},
+        tier_boost={doc_type: spec[2] for doc_type, spec in plan.items()},
+    )
 
 
 def _retrieve_character_items(
@@ -285,7 +420,10 @@ def _retrieve_character_items(
     top_k_semantic: int,
     top_k_final: int,
     min_similarity: float,
+    semantic_hits: Optional[List[Tuple[object, float]]] = None,
+    tier_boost: float = 0.0,
 ) -> List[Tuple[object, float]]:
+    """Retrieve characters with tier-fused semantic search + lexical name matching."""
     character_pool: Dict[int, Tuple[object, float]] = {}
 
     def _upsert_character(doc: object, score: float) -> None:
@@ -294,13 +432,16 @@ def _retrieve_character_items(
         if not existing or score > existing[1]:
             character_pool[key] = (doc, score)
 
-    for doc, score in _search_with_variants(
-        rag,
-        query,
-        doc_type="character",
-        top_k_per_variant=top_k_semantic,
-        min_similarity=min_similarity,
-    ):
+    if semantic_hits is None:
+        semantic_hits = _search_with_variants(
+            rag,
+            query,
+            doc_type="character",
+            top_k_per_variant=top_k_semantic,
+            min_similarity=min_similarity,
+            tier_boost=tier_boost,
+        )
+    for doc, score in semantic_hits:
         _upsert_character(doc, score)
 
     search_variants = _chat_query_variants(query) or [query]
@@ -309,15 +450,9 @@ def _retrieve_character_items(
     query_norm = _normalize_for_match(full_query)
     query_terms = _tokenize_for_match(full_query)
 
-    for doc in rag.documents:
-        if doc.doc_type != "character":
-            continue
-        name = str(doc.metadata.get("name", "")).strip()
-        if not name:
-            continue
-
-        name_norm = _normalize_for_match(name)
-        name_terms = _tokenize_for_match(name)
+    for doc, name, name_norm, name_terms, _ in _lexical_candidates(
+        rag, "character", full_query, query_terms
+    ):
         overlap = len(query_terms & name_terms) if name_terms else 0
         coverage = (overlap / len(name_terms)) if name_terms else 0.0
 
@@ -330,7 +465,8 @@ def _retrieve_character_items(
             lexical_score = 0.93
 
         if lexical_score is not None:
-            _upsert_character(doc, lexical_score)
+            tier_bonus = tier_boost * get_tier_rank(str(doc.metadata.get("tier", "")))
+            _upsert_character(doc, lexical_score + tier_bonus)
 
     character_items: List[Tuple[object, float]] = list(character_pool.values())
     character_items.sort(key=lambda x: x[1], reverse=True)
@@ -344,8 +480,13 @@ def _retrieve_equipment_items(
     top_k_per_variant: int,
     top_k_final: int,
     min_similarity: float,
+    semantic_hits: Optional[List[Tuple[object, float]]] = None,
+    tier_boost: float = TIER_BOOST,
 ) -> List[Tuple[object, float]]:
-    """Retrieve equipment with semantic search + lexical boost + tier boost."""
+    """Retrieve equipment with tier-fused semantic search + lexical boost.
+
+    ``semantic_hits``, when supplied, must already carry the same tier boost.
+    """
     equipment_pool: Dict[int, Tuple[object, float]] = {}
 
     def _upsert_equipment(doc: object, score: float) -> None:
@@ -355,13 +496,16 @@ def _retrieve_equipment_items(
             equipment_pool[key] = (doc, score)
 
     # 1. Semantic search
-    for doc, score in _search_with_variants(
-        rag,
-        query,
-        doc_type="equipment",
-        top_k_per_variant=top_k_per_variant,
-        min_similarity=min_similarity,
-    ):
+    if semantic_hits is None:
+        semantic_hits = _search_with_variants(
+            rag,
+            query,
+            doc_type="equipment",
+            top_k_per_variant=top_k_per_variant,
+            min_similarity=min_similarity,
+            tier_boost=tier_boost,
+        )
+    for doc, score in semantic_hits:
         _upsert_equipment(doc, score)
 
     # 2. Lexical matching
@@ -371,16 +515,9 @@ def _retrieve_equipment_items(
     query_norm = _normalize_for_match(full_query)
     query_terms = _tokenize_for_match(full_query)
 
-    for doc in rag.documents:
-        if doc.doc_type != "equipment":
-            continue
-        
-        name = str(doc.metadata.get("name", "")).strip()
-        if not name:
-            continue
-
-        name_norm = _normalize_for_match(name)
-        name_terms = _tokenize_for_match(name)
+    for doc, name, name_norm, name_terms, content_overlap in _lexical_candidates(
+        rag, "equipment", full_query, query_terms, with_content=True
+    ):
         overlap = len(query_terms & name_terms) if name_terms else 0
         coverage = (overlap / len(name_terms)) if name_terms else 0.0
 
@@ -392,27 +529,16 @@ def _retrieve_equipment_items(
         elif overlap >= 2 and coverage >= 0.5:
             lexical_score = 0.92 + min(0.05, overlap * 0.01)
         # Content match (Brutality/Friendship for character)
-        else:
-            content_norm = _normalize_for_match(doc.content)
-            content_terms = _tokenize_for_match(doc.content)
-            content_overlap = len(query_terms & content_terms)
-            if content_overlap >= 3:
-                lexical_score = 0.85 + min(0.1, content_overlap * 0.01)
+        elif content_overlap >= 3:
+            lexical_score = 0.85 + min(0.1, content_overlap * 0.01)
 
         if lexical_score is not None:
-            _upsert_equipment(doc, lexical_score)
+            tier_bonus = tier_boost * get_tier_rank(str(doc.metadata.get("tier", "")))
+            _upsert_equipment(doc, lexical_score + tier_bonus)
 
-    # 3. Apply Tier Boost
-    final_results = []
-    # Local tier rank mapping to avoid dependency on rag.py internals
-    tiers = {"D": 0, "C": 1, "B": 2, "A": 3, "S": 4, "S+": 5}
-    for doc, score in equipment_pool.values():
-        tier = str(doc.metadata.get("tier", "")).strip().upper()
-        tier_rank = tiers.get(tier, 0)
-        final_results.append((doc, score + (tier_rank * 0.1)))
-
-    final_results.sort(key=lambda x: x[1], reverse=True)
-    return final_results[:top_k_final]
+    equipment_items: List[Tuple[object, float]] = list(equipment_pool.values())
+    equipment_items.sort(key=lambda x: x[1], reverse=True)
+    return equipment_items[:top_k_final]
 
 
 def _format_retrieved_snippets(
@@ -426,19 +552,23 @@ def _format_retrieved_snippets(
     max_chars: Optional[int],
     snippet_chars: int,
     empty_text: str,
+    semantic_hits: Optional[List[Tuple[object, float]]] = None,
 ) -> str:
     if not rag or not rag.enabled:
         return empty_text
 
+    if semantic_hits is None:
+        semantic_hits = _search_with_variants(
+            rag,
+            query,
+            doc_type=doc_type,
+            top_k_per_variant=top_k_per_variant,
+            min_similarity=min_similarity,
+        )
+
     lines: List[str] = []
     used_chars = 0
-    for doc, score in _search_with_variants(
-        rag,
-        query,
-        doc_type=doc_type,
-        top_k_per_variant=top_k_per_variant,
-        min_similarity=min_similarity,
-    )[:max_items]:
+    for doc, score in semantic_hits[:max_items]:
         content = str(getattr(doc, "content", "")).strip().replace("\n", " ")
         if not content:
             continue
@@ -457,8 +587,12 @@ def _format_retrieved_snippets(
     return "\n".join(lines) if lines else empty_text
 
 
-def build_chat_context(rag, question: str) -> Dict[str, str]:
-    """Build focused, relevance-filtered context for chat QA."""
+def build_chat_context(rag, question: str, pipeline: Optional[Pipeline] = None) -> Dict[str, str]:
+    """Build focused, relevance-filtered context for chat QA.
+
+    With a ``pipeline``, the per-doc-type passes that follow the shared
+    semantic search run concurrently on its thread pool and are timed.
+    """
     context = {
         "characters": "",
         "equipment": "",
@@ -471,13 +605,29 @@ def build_chat_context(rag, question: str) -> Dict[str, str]:
 
     intent = _classify_query_intent(question)
 
-    if "character" in intent:
+    # Encode the question (and its Klassic/Classic variant) once for every doc type.
+    equipment_tier_boost = _get_tier_boost("MKM_CHAT_TIER_BOOST", TIER_BOOST)
+    search_plan = {
+        "character": (16, 0.20, 0.0),
+        "equipment": (15, 0.22, equipment_tier_boost),
+        "gameplay": (5, 0.18, 0.0),
+        "glossary": (5, 0.18, 0.0),
+    }
+    with pipeline.timed("retrieval.search") if pipeline is not None else nullcontext():
+        semantic = _prefetch_semantic_hits(
+            rag,
+            question,
+            {doc_type: spec for doc_type, spec in search_plan.items() if doc_type in intent},
+        )
+
+    def _characters() -> str:
         character_items = _retrieve_character_items(
             rag,
             question,
             top_k_semantic=16,
             top_k_final=12,
             min_similarity=0.20,
+            semantic_hits=semantic["character"],
         )
         char_lines: List[str] = []
         for doc, score in character_items:
@@ -492,15 +642,17 @@ def build_chat_context(rag, question: str) -> Dict[str, str]:
                 )
             else:
                 char_lines.append(f"- (rel={score_tag}) [{tier}] {name} | Rarity: {rarity}")
-        context["characters"] = "\n".join(char_lines) if char_lines else "No relevant character matches found."
+        return "\n".join(char_lines) if char_lines else "No relevant character matches found."
 
-    if "equipment" in intent:
+    def _equipment() -> str:
         equipment_items = _retrieve_equipment_items(
             rag,
             question,
             top_k_per_variant=15,
             top_k_final=10,
             min_similarity=0.22,
+            semantic_hits=semantic["equipment"],
+            tier_boost=equipment_tier_boost,
         )
         equip_lines: List[str] = []
         for doc, score in equipment_items:
@@ -514,10 +666,10 @@ def build_chat_context(rag, question: str) -> Dict[str, str]:
                     break
             suffix = f" | Effect: {effect}" if effect else ""
             equip_lines.append(f"- (rel={score:.2f}) [{tier}] {name} ({equip_type}){suffix}")
-        context["equipment"] = "\n".join(equip_lines) if equip_lines else "No relevant equipment matches found."
+        return "\n".join(equip_lines) if equip_lines else "No relevant equipment matches found."
 
-    if "gameplay" in intent:
-        context["gameplay"] = _format_retrieved_snippets(
+    def _gameplay() -> str:
+        return _format_retrieved_snippets(
             rag,
             question,
             doc_type="gameplay",
@@ -527,10 +679,11 @@ def build_chat_context(rag, question: str) -> Dict[str, str]:
             max_chars=None,
             snippet_chars=260,
             empty_text="No directly relevant gameplay snippets found.",
+            semantic_hits=semantic["gameplay"],
         )
 
-    if "glossary" in intent:
-        context["glossary"] = _format_retrieved_snippets(
+    def _glossary() -> str:
+        return _format_retrieved_snippets(
             rag,
             question,
             doc_type="glossary",
@@ -540,8 +693,24 @@ def build_chat_context(rag, question: str) -> Dict[str, str]:
             max_chars=None,
             snippet_chars=220,
             empty_text="No directly relevant glossary snippets found.",
+            semantic_hits=semantic["glossary"],
         )
 
+    sections = {
+        key: build
+        for doc_type, key, build in (
+            ("character", "characters", _characters),
+            ("equipment", "equipment", _equipment),
+            ("gameplay", "gameplay", _gameplay),
+            ("glossary", "glossary", _glossary),
+        )
+        if doc_type in intent
+    }
+    if pipeline is not None:
+        built = pipeline.map_threads({f"retrieval.{key}": build for key, build in sections.items()})
+        context.update({key: built[f"retrieval.{key}"] for key in sections})
+    else:
+        context.update({key: build() for key, build in sections.items()})
     return context
 
 
@@ -581,10 +750,8 @@ Rules:
         ]
     )
 
-    import httpx
-
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
+    async with ollama_client(assistant.base_url) as client:
+        summary_request = client.post(
             f"{assistant.base_url}/api/chat",
             json={
                 "model": summary_model,
@@ -599,8 +766,9 @@ Rules:
                     "num_predict": 500,
                 },
             },
-            timeout=_get_http_timeout_seconds(),
+            timeout=stage_timeout("summary", _get_http_timeout_seconds()),
         )
+        response = await within("summary", summary_request, _get_http_timeout_seconds())
 
     if response.status_code != 200:
         logger.warning("Chat summary request failed with status %s", response.status_code)
@@ -617,6 +785,58 @@ Rules:
     return text
 
 
+def _chat_summary_engine() -> str:
+    """``llm`` (default) or ``extractive``; ``auto`` picks extractive while the LLM queue is busy."""
+    engine = os.getenv("MKM_CHAT_SUMMARY_ENGINE", "llm").strip().lower()
+    if engine == "auto":
+        engine = "extractive" if get_scheduler().busy() else "llm"
+    if engine != "extractive" or not getattr(get_rag_system(), "enabled", False):
+        return "llm"
+    return engine
+
+
+async def _summarize_extractively(existing_summary: str, messages_to_summarize: List[Dict[str, str]]) -> Optional[str]:
+    """Merge messages into the summary on the CPU with the RAG encoder instead of the LLM."""
+    if not messages_to_summarize:
+        return existing_summary or None
+    rag = get_rag_system()
+    return await within(
+        "summary",
+        asyncio.to_thread(summarize_extractively, existing_summary, messages_to_summarize, rag.embed_texts),
+        _get_http_timeout_seconds(),
+    )
+
+
+def _chat_compaction_mode() -> str:
+    """``background`` (default) answers without waiting for the summary; ``inline`` waits for it."""
+    mode = os.getenv("MKM_CHAT_COMPACTION", "background").strip().lower()
+    return mode if mode in {"background", "inline"} else "background"
+
+
+_summary_cache: Optional[SummaryCache] = None
+_summary_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    """Shared cache of compacted chat summaries (in-process only)."""
+    global _summary_cache
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache(
+                max_entries=_safe_positive_int(os.getenv("MKM_CHAT_SUMMARY_CACHE_SIZE", "256"), 256)
+            )
+        return _summary_cache
+
+
+def _compaction_window() -> Tuple[int, int]:
+    """(messages kept verbatim, history length that triggers compaction)"""
+    keep_recent = _safe_positive_int(os.getenv("MKM_CHAT_KEEP_RECENT_MESSAGES", "4"), 4)
+    compact_trigger = _safe_positive_int(
+        os.getenv("MKM_CHAT_COMPACT_TRIGGER_MESSAGES", "8"), 8
+    )
+    return keep_recent, compact_trigger
+
+
 async def _compact_chat_history(
     assistant,
     use_model: str,
@@ -624,10 +844,7 @@ async def _compact_chat_history(
     existing_summary: str,
     existing_summary_count: int,
 ) -> Tuple[Optional[str], int, List[Dict[str, str]]]:
-    keep_recent = _safe_positive_int(os.getenv("MKM_CHAT_KEEP_RECENT_MESSAGES", "4"), 4)
-    compact_trigger = _safe_positive_int(
-        os.getenv("MKM_CHAT_COMPACT_TRIGGER_MESSAGES", "8"), 8
-    )
+    keep_recent, compact_trigger = _compaction_window()
 
     if len(messages) <= keep_recent:
         return (existing_summary or None, max(0, existing_summary_count), messages)
@@ -638,17 +855,181 @@ async def _compact_chat_history(
     summarize_chunk = messages[:-keep_recent]
     recent_messages = messages[-keep_recent:]
 
-    merged_summary = await _summarize_messages(
-        assistant=assistant,
-        use_model=use_model,
-        existing_summary=existing_summary,
-        messages_to_summarize=summarize_chunk,
-    )
+    cache = get_summary_cache()
+    chunk_key = cache.prefix_keys(use_model, existing_summary, summarize_chunk)[-1]
+    covered, merged_summary = cache.longest([chunk_key])
+    if not covered:
+        try:
+            if _chat_summary_engine() == "extractive":
+                merged_summary = await _summarize_extractively(existing_summary, summarize_chunk)
+            else:
+                async with _generation_slot():
+                    merged_summary = await _summarize_messages(
+                        assistant=assistant,
+                        use_model=use_model,
+                        existing_summary=existing_summary,
+                        messages_to_summarize=summarize_chunk,
+                    )
+        except DeadlineExceeded:
+            # Answer with the full history this turn; the client resends it next time
+            logger.warning("Chat summary ran out of time; skipping compaction")
+            return (existing_summary or None, max(0, existing_summary_count), messages)
+        if merged_summary and merged_summary != existing_summary:
+            cache.put(chunk_key, merged_summary)
 
     new_summary_count = max(0, existing_summary_count) + len(summarize_chunk)
     return (merged_summary, new_summary_count, recent_messages)
 
 
+async def _background_summary(
+    assistant, use_model: str, existing_summary: str, messages_to_summarize: List[Dict[str, str]]
+) -> Optional[str]:
+    """Summarize off the request path at the lowest scheduler priority; None unless a new summary came back."""
+    async with get_scheduler().slot(
+        current_client.get(), ENDPOINT_PRIORITIES["chat-summary"], _get_http_timeout_seconds()
+    ):
+        merged = await with_deadline(
+            _get_http_timeout_seconds(),
+            _summarize_messages(
+                assistant=assistant,
+                use_model=use_model,
+                existing_summary=existing_summary,
+                messages_to_summarize=messages_to_summarize,
+            ),
+        )
+    return merged if merged and merged != existing_summary else None
+
+
+async def _compact_chat_history_in_background(
+    assistant,
+    use_model: str,
+    messages: List[Dict[str, str]],
+    existing_summary: str,
+    existing_summary_count: int,
+) -> Tuple[Optional[str], int, List[Dict[str, str]]]:
+    """Compact without waiting on the LLM.
+
+    The longest prefix of ``messages`` summarized by an earlier turn is
+    folded into the summary straight away. If what is left still reaches the
+    trigger, its older part is summarized in the background and this turn is
+    answered from the current summary plus the recent window; the merged
+    summary is handed back on a later turn, once the client resends the
+    same history. The extractive engine is fast enough to fold that part in
+    right away, so it is only left to the background when extraction fails.
+    """
+    keep_recent, compact_trigger = _compaction_window()
+    cache = get_summary_cache()
+    summary = existing_summary or None
+    summary_count = max(0, existing_summary_count)
+
+    summarizable = max(0, len(messages) - keep_recent)
+    covered, cached_summary = cache.longest(cache.prefix_keys(use_model, existing_summary, messages[:summarizable]))
+    if covered:
+        summary, summary_count, messages = cached_summary, summary_count + covered, messages[covered:]
+
+    if len(messages) <= keep_recent or len(messages) < compact_trigger:
+        return (summary, summary_count, messages)
+
+    summarize_chunk = messages[:-keep_recent]
+    chunk_key = cache.prefix_keys(use_model, summary, summarize_chunk)[-1]
+    if _chat_summary_engine() == "extractive":
+        try:
+            merged = await _summarize_extractively(summary or "", summarize_chunk)
+        except Exception as e:
+            logger.warning("Extractive chat summary failed: %s", e)
+            merged = None
+        if merged:
+            cache.put(chunk_key, merged)
+            return (merged, summary_count + len(summarize_chunk), messages[-keep_recent:])
+    cache.schedule(
+        chunk_key, lambda: _background_summary(assistant, use_model, summary or "", summarize_chunk)
+    )
+    return (summary, summary_count, messages[-keep_recent:])
+
+
+# Client-chosen chat session IDs; long enough to be unguessable (e.g. a UUID)
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,128}$")
+
+_chat_session_store: Optional[ChatSessionStore] = None
+_chat_session_store_lock = threading.Lock()
+
+
+def get_chat_session_store() -> ChatSessionStore:
+    """Shared chat session store; memory-only unless MKM_CHAT_SESSION_PATH names a SQLite file."""
+    global _chat_session_store
+    with _chat_session_store_lock:
+        if _chat_session_store is None:
+            path = os.getenv("MKM_CHAT_SESSION_PATH", "").strip()
+            _chat_session_store = ChatSessionStore(
+                Path(path) if path and path.lower() != "memory" else None,
+                max_sessions=_safe_positive_int(os.getenv("MKM_CHAT_SESSION_MAX", "1024"), 1024),
+                ttl=_safe_positive_int(os.getenv("MKM_CHAT_SESSION_TTL_SECONDS", "86400"), 86400),
+            )
+        return _chat_session_store
+
+
+class _SessionTurnLock:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+# session_id -> lock serializing its turns; dropped once no turn holds or waits on it
+_chat_session_turns: Dict[str, _SessionTurnLock] = {}
+
+
+@asynccontextmanager
+async def _chat_session_turn(session_id: str) -> AsyncIterator[None]:
+    """Hold ``session_id`` from loading its state to saving the finished turn.
+
+    Overlapping turns on one session (e.g. a client retrying while the first
+    attempt is still generating) run one after the other, each starting from
+    the history the previous one saved, instead of overwriting each other.
+    """
+    turn = _chat_session_turns.setdefault(session_id, _SessionTurnLock())
+    turn.users += 1
+    try:
+        async with turn.lock:
+            yield
+    finally:
+        turn.users -= 1
+        if turn.users == 0 and _chat_session_turns.get(session_id) is turn:
+            del _chat_session_turns[session_id]
+
+
+async def _load_chat_session(
+    session_id: str,
+    messages: Optional[List[Dict[str, str]]],
+    summary_text: Optional[str],
+    summary_message_count: int,
+) -> Dict:
+    """The stored state of ``session_id``; an unknown session starts from whatever history the body carries."""
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(None, get_chat_session_store().get, session_id)
+    if session is not None:
+        return session
+    return {
+        "messages": _sanitize_chat_messages(messages or []),
+        "summary_text": (summary_text or "").strip() or None,
+        "summary_message_count": max(0, int(summary_message_count or 0)),
+        "retrieval": None,
+    }
+
+
+async def _save_chat_session(session_id: str, session: Dict, message: str, reply: str) -> None:
+    """Append the finished turn to the session and store it."""
+    session["messages"] = session["messages"] + [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": reply},
+    ]
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, get_chat_session_store().put, session_id, session)
+
+
+# ID prefix per equipment type in catalog-labelled context (characters use "C")
+_CATALOG_PREFIXES = {"Weapon": "W", "Armor": "A", "Accessory": "X"}
+
+
 def build_structured_context(
     rag,
     strategy: str,
@@ -658,12 +1039,20 @@ def build_structured_context(
     passive_max_chars: Optional[int] = None,
     gameplay_max_chars: Optional[int] = 1200,
     glossary_max_chars: Optional[int] = 1200,
+    tier_boost: float = 0.0,
+    catalog: Optional[Dict[str, Dict[str, str]]] = None,
 ) -> Dict[str, str]:
     """
     Build clearly structured context for the LLM to reduce hallucinations.
     
     Returns dict with separate lists for characters and equipment by type.
-    Results are already sorted by tier from RAG system (prioritize_tier=True).
+    With a non-zero tier_boost, character and equipment hits are ranked by
+    similarity + tier_boost * tier_rank in a single fused scoring pass.
+
+    When a ``catalog`` dict is passed, every listed character / equipment
+    line is prefixed with a short ID (C1, W1, A1, X1) and the catalog is
+    filled with ID -> full, untruncated entry, so the model can answer with
+    IDs and the server hydrates the text (see _hydrate_team).
     """
     context = {
         "characters": "No matches found",
@@ -696,6 +1085,16 @@ def build_structured_context(
     # Variant-aware retrieval with lexical boosting to avoid missing partial character names.
     character_limit = max(8, min(80, int(character_limit)))
     equipment_limit = max(8, min(80, int(equipment_limit)))
+    gameplay_top_k = _safe_positive_int(os.getenv("MKM_STRUCTURED_GAMEPLAY_TOP_K", "8"), 8)
+    glossary_top_k = _safe_positive_int(os.getenv("MKM_STRUCTURED_GLOSSARY_TOP_K", "8"), 8)
+
+    # Encode the strategy (and its Klassic/Classic variant) once for every doc type.
+    search_plan = {"gameplay": (gameplay_top_k, 0.18, 0.0), "glossary": (glossary_top_k, 0.18, 0.0)}
+    if "character" in intent:
+        search_plan["character"] = (24, 0.18, tier_boost)
+    if "equipment" in intent:
+        search_plan["equipment"] = (24, 0.18, tier_boost)
+    semantic = _prefetch_semantic_hits(rag, strategy, search_plan)
 
     if "character" in intent:
         char_results = _retrieve_character_items(
@@ -704,6 +1103,8 @@ def build_structured_context(
             top_k_semantic=24,
             top_k_final=character_limit,
             min_similarity=0.18,
+            semantic_hits=semantic["character"],
+            tier_boost=tier_boost,
         )
         char_list = []
         for doc, score in char_results:
@@ -716,20 +1117,18 @@ def build_structured_context(
                 if line.startswith("Passive:"):
                     passive = line.replace("Passive:", "").strip()
                     break
+            label = ""
+            if catalog is not None:
+                label = f"C{len(char_list) + 1} "
+                catalog[label.strip()] = {"name": name, "rarity": rarity, "passive": passive}
             if passive_max_chars and passive_max_chars > 0 and len(passive) > passive_max_chars:
                 passive = passive[:passive_max_chars].rstrip() + "..."
-            char_list.append(f"- [{tier}] Rarity: {rarity} | Name: {name} | Passive: {passive}" if passive else f"- [{tier}] Rarity: {rarity} | Name: {name}")
+            char_list.append(f"- {label}[{tier}] Rarity: {rarity} | Name: {name} | Passive: {passive}" if passive else f"- {label}[{tier}] Rarity: {rarity} | Name: {name}")
         context["characters"] = "\n".join(char_list) if char_list else context["characters"]
 
     if "equipment" in intent:
         # Variant-aware equipment retrieval.
-        equip_results = _search_with_variants(
-            rag,
-            strategy,
-            doc_type="equipment",
-            top_k_per_variant=24,
-            min_similarity=0.18,
-        )[:equipment_limit]
+        equip_results = semantic["equipment"][:equipment_limit]
         weapons, armor, accessories = [], [], []
         for doc, score in equip_results:
             name = doc.metadata.get("name", "Unknown")
@@ -741,14 +1140,15 @@ def build_structured_context(
                 if line.startswith("Effect:"):
                     effect = line.replace("Effect:", "").strip()
                     break
-            item_str = f"- [{tier}] {name}" + (f" ({effect})" if effect else "")
             # Categorize by type field from TSV
-            if equip_type == "Weapon":
-                weapons.append(item_str)
-            elif equip_type == "Armor":
-                armor.append(item_str)
-            elif equip_type == "Accessory":
-                accessories.append(item_str)
+            bucket = {"Weapon": weapons, "Armor": armor, "Accessory": accessories}.get(equip_type)
+            if bucket is None:
+                continue
+            label = ""
+            if catalog is not None:
+                label = f"{_CATALOG_PREFIXES[equip_type]}{len(bucket) + 1} "
+                catalog[label.strip()] = {"name": name, "slot": equip_type.lower(), "effect": effect}
+            bucket.append(f"- {label}[{tier}] {name}" + (f" ({effect})" if effect else ""))
         # Items within each category maintain tier order from RAG
         context["weapons"] = "\n".join(weapons[:]) if weapons else context["weapons"]
         context["armor"] = "\n".join(armor[:]) if armor else context["armor"]
@@ -758,227 +1158,281 @@ def build_structured_context(
         rag,
         strategy,
         doc_type="gameplay",
-        top_k_per_variant=_safe_positive_int(os.getenv("MKM_STRUCTURED_GAMEPLAY_TOP_K", "8"), 8),
+        top_k_per_variant=gameplay_top_k,
         min_similarity=0.18,
         max_items=_safe_positive_int(os.getenv("MKM_STRUCTURED_GAMEPLAY_MAX_ITEMS", "8"), 8),
         max_chars=gameplay_max_chars,
         snippet_chars=260,
         empty_text=context["gameplay"],
+        semantic_hits=semantic["gameplay"],
     )
     context["glossary"] = _format_retrieved_snippets(
         rag,
         strategy,
         doc_type="glossary",
-        top_k_per_variant=_safe_positive_int(os.getenv("MKM_STRUCTURED_GLOSSARY_TOP_K", "8"), 8),
+        top_k_per_variant=glossary_top_k,
         min_similarity=0.18,
         max_items=_safe_positive_int(os.getenv("MKM_STRUCTURED_GLOSSARY_MAX_ITEMS", "8"), 8),
         max_chars=glossary_max_chars,
         snippet_chars=240,
         empty_text=context["glossary"],
+        semantic_hits=semantic["glossary"],
     )
     
     return context
 
 
-async def suggest_team_json(
-    strategy: str,
-    owned_characters: Optional[List[str]] = None,
-    model: Optional[str] = None
-) -> dict:
-    """
-    Get team composition suggestions as structured JSON
-    
-    Args:
-        strategy: Desired strategy (e.g., "aggressive rush", "defensive tank")
-        owned_characters: Optional list of characters the player owns
-        model: Optional Ollama model tag to use (e.g., "llama3.2:3b")
-        
-    Returns:
-        Structured JSON with team suggestion
-    """
-    def _clean_llm_json(text: str) -> str:
-        """Strip thinking tags, markdown wrappers, and trailing debris."""
-        if not text:
-            return ""
-        # Remove thinking tags (even if unclosed due to truncation)
-        import re
-        text = re.sub(r'<think>.*?(?:</think>|$)', '', text, flags=re.DOTALL)
-        # Find first { and last }
-        start = text.find('{')
-        end = text.rfind('}')
-        if start != -1:
-            if end != -1 and end > start:
-                return text[start:end+1]
-            return text[start:] # Return from start of JSON even if truncated
-        return text.strip()
-
-    def _normalize_team_payload(payload: object) -> Dict[str, object]:
-        def _to_effect_text(item: object) -> str:
-            if isinstance(item, str):
-                return item.strip()
-            if isinstance(item, dict):
-                # Check multiple possible keys
-                for k in ["effect", "description", "passive", "text"]:
-                    val = item.get(k)
-                    if isinstance(val, str) and val.strip():
-                        return val.strip()
-            return ""
-
-        def _normalize_char(char_obj: object) -> Dict[str, object]:
-            if not isinstance(char_obj, dict):
-                return {}
-
-            char = dict(char_obj)
-            # Ensure passive is a string
-            passive_val = char.get("passive")
-            if isinstance(passive_val, dict):
-                char["passive"] = _to_effect_text(passive_val)
-            elif not isinstance(passive_val, str):
-                char["passive"] = ""
-
-            # Ensure rarity is a string
-            rarity_val = char.get("rarity")
-            if not isinstance(rarity_val, str):
-                char["rarity"] = "?"
-
-            equipment = char.get("equipment")
-            if not isinstance(equipment, list):
-                # Try translation from dict-based slots or weapons/armor/accessories lists
-                built_equipment: List[Dict[str, str]] = []
-                for src_key in ["weapon", "armor", "accessory", "extra", "weapons", "armor", "accessories"]:
-                    source = char.get(src_key)
-                    if not source:
-                        continue
-                    items = source if isinstance(source, list) else [source]
-                    for item in items:
-                        if isinstance(item, dict):
-                            name = str(item.get("name", "")).strip()
-                            effect = _to_effect_text(item)
-                        else:
-                            name = str(item).strip()
-                            effect = ""
-                        if name:
-                            slot = src_key.rstrip('s')
-                            if slot == "extra": slot = "accessory" # treat extra as accessory
-                            built_equipment.append({"slot": slot, "name": name, "effect": effect})
-                char["equipment"] = built_equipment
-            else:
-                # Clean existing list
-                normalized_equipment: List[Dict[str, str]] = []
-                for item in equipment:
+def _clean_llm_json(text: str) -> str:
+    """Strip thinking tags, markdown wrappers, and trailing debris."""
+    if not text:
+        return ""
+    # Remove thinking tags (even if unclosed due to truncation)
+    text = re.sub(r'<think>.*?(?:</think>|$)', '', text, flags=re.DOTALL)
+    # Find first { and last }
+    start = text.find('{')
+    end = text.rfind('}')
+    if start != -1:
+        if end != -1 and end > start:
+            return text[start:end+1]
+        return text[start:] # Return from start of JSON even if truncated
+    return text.strip()
+
+
+def _normalize_team_payload(payload: object) -> Dict[str, object]:
+    def _to_effect_text(item: object) -> str:
+        if isinstance(item, str):
+            return item.strip()
+        if isinstance(item, dict):
+            # Check multiple possible keys
+            for k in ["effect", "description", "passive", "text"]:
+                val = item.get(k)
+                if isinstance(val, str) and val.strip():
+                    return val.strip()
+        return ""
+
+    def _normalize_char(char_obj: object) -> Dict[str, object]:
+        if not isinstance(char_obj, dict):
+            return {}
+
+        char = dict(char_obj)
+        # Ensure passive is a string
+        passive_val = char.get("passive")
+        if isinstance(passive_val, dict):
+            char["passive"] = _to_effect_text(passive_val)
+        elif not isinstance(passive_val, str):
+            char["passive"] = ""
+
+        # Ensure rarity is a string
+        rarity_val = char.get("rarity")
+        if not isinstance(rarity_val, str):
+            char["rarity"] = "?"
+
+        equipment = char.get("equipment")
+        if not isinstance(equipment, list):
+            # Try translation from dict-based slots or weapons/armor/accessories lists
+            built_equipment: List[Dict[str, str]] = []
+            for src_key in ["weapon", "armor", "accessory", "extra", "weapons", "armor", "accessories"]:
+                source = char.get(src_key)
+                if not source:
+                    continue
+                items = source if isinstance(source, list) else [source]
+                for item in items:
                     if isinstance(item, dict):
-                        slot = str(item.get("slot", "")).strip().lower() or "accessory"
                         name = str(item.get("name", "")).strip()
-                        if name:
-                            normalized_equipment.append({
-                                "slot": slot,
-                                "name": name,
-                                "effect": _to_effect_text(item)
-                            })
-                    elif isinstance(item, str) and item.strip():
+                        effect = _to_effect_text(item)
+                    else:
+                        name = str(item).strip()
+                        effect = ""
+                    if name:
+                        slot = src_key.rstrip('s')
+                        if slot == "extra": slot = "accessory" # treat extra as accessory
+                        built_equipment.append({"slot": slot, "name": name, "effect": effect})
+            char["equipment"] = built_equipment
+        else:
+            # Clean existing list
+            normalized_equipment: List[Dict[str, str]] = []
+            for item in equipment:
+                if isinstance(item, dict):
+                    slot = str(item.get("slot", "")).strip().lower() or "accessory"
+                    name = str(item.get("name", "")).strip()
+                    if name:
                         normalized_equipment.append({
-                            "slot": "accessory",
-                            "name": item.strip(),
-                            "effect": ""
+                            "slot": slot,
+                            "name": name,
+                            "effect": _to_effect_text(item)
                         })
-                char["equipment"] = normalized_equipment
+                elif isinstance(item, str) and item.strip():
+                    normalized_equipment.append({
+                        "slot": "accessory",
+                        "name": item.strip(),
+                        "effect": ""
+                    })
+            char["equipment"] = normalized_equipment
+
+        return char
+
+    if not isinstance(payload, dict):
+        return {}
+
+    team = dict(payload)
+    # Pull from "response" or "team" nested keys if present
+    for k in ["response", "team", "data"]:
+        nested = team.get(k)
+        if isinstance(nested, dict):
+            # Merge nested into top level
+            for nk, nv in nested.items():
+                if nk not in team or not team[nk]:
+                    team[nk] = nv
+
+    if "strategy" not in team and isinstance(team.get("text"), str):
+        team["strategy"] = str(team.get("text", "")).strip()
+
+    # Alternate schema: single character object at top-level.
+    if "char1" not in team and isinstance(team.get("name"), str):
+        team["char1"] = dict(team)
+
+    # Handle "characters": [...] list
+    chars_list = team.get("characters")
+    if isinstance(chars_list, list):
+        for idx, item in enumerate(chars_list[:3], start=1):
+            key = f"char{idx}"
+            if key not in team or not team[key]:
+                team[key] = item
+
+    # Final pass over char1, char2, char3
+    for idx in range(1, 4):
+        key = f"char{idx}"
+        if key in team:
+            team[key] = _normalize_char(team[key])
+        else:
+            team[key] = {"name": "Placeholder", "rarity": "Gold", "passive": "", "equipment": []}
 
-            return char
+    if not team.get("strategy"):
+        team["strategy"] = "Optimized team based on your request."
 
-        if not isinstance(payload, dict):
-            return {}
+    return team
 
-        team = dict(payload)
-        # Pull from "response" or "team" nested keys if present
-        for k in ["response", "team", "data"]:
-            nested = team.get(k)
-            if isinstance(nested, dict):
-                # Merge nested into top level
-                for nk, nv in nested.items():
-                    if nk not in team or not team[nk]:
-                        team[nk] = nv
-
-        if "strategy" not in team and isinstance(team.get("text"), str):
-            team["strategy"] = str(team.get("text", "")).strip()
-
-        # Alternate schema: single character object at top-level.
-        if "char1" not in team and isinstance(team.get("name"), str):
-            team["char1"] = dict(team)
-
-        # Handle "characters": [...] list
-        chars_list = team.get("characters")
-        if isinstance(chars_list, list):
-            for idx, item in enumerate(chars_list[:3], start=1):
-                key = f"char{idx}"
-                if key not in team or not team[key]:
-                    team[key] = item
-
-        # Final pass over char1, char2, char3
-        for idx in range(1, 4):
-            key = f"char{idx}"
-            if key in team:
-                team[key] = _normalize_char(team[key])
-            else:
-                team[key] = {"name": "Placeholder", "rarity": "Gold", "passive": "", "equipment": []}
 
-        if not team.get("strategy"):
-            team["strategy"] = "Optimized team based on your request."
+def _enforce_team_output_format(team: Dict[str, object]) -> Optional[Dict[str, object]]:
+    """Permissive enforcer: ensures key fields exist, but doesn't crash on partial data."""
+    if not isinstance(team, dict):
+        return None
 
-        return team
+    # We must at least have char1 and strategy
+    if not team.get("char1") or not isinstance(team["char1"], dict):
+        return None
 
-    def _enforce_team_output_format(team: Dict[str, object]) -> Optional[Dict[str, object]]:
-        """Permissive enforcer: ensures key fields exist, but doesn't crash on partial data."""
-        if not isinstance(team, dict):
-            return None
+    # Ensure name exists for all characters
+    for idx in range(1, 4):
+        key = f"char{idx}"
+        char = team.get(key)
+        if not isinstance(char, dict) or not char.get("name"):
+            # If char2 or char3 is missing, we fill with empty instead of failing
+            team[key] = {"name": "Unknown", "rarity": "Gold", "passive": "", "equipment": []}
 
-        # We must at least have char1 and strategy
-        if not team.get("char1") or not isinstance(team["char1"], dict):
-            return None
-        
-        # Ensure name exists for all characters
-        for idx in range(1, 4):
-            key = f"char{idx}"
-            char = team.get(key)
-            if not isinstance(char, dict) or not char.get("name"):
-                # If char2 or char3 is missing, we fill with empty instead of failing
-                team[key] = {"name": "Unknown", "rarity": "Gold", "passive": "", "equipment": []}
-            
-            # Ensure equipment is a list
-            if not isinstance(team[key].get("equipment"), list):
-                team[key]["equipment"] = []
+        # Ensure equipment is a list
+        if not isinstance(team[key].get("equipment"), list):
+            team[key]["equipment"] = []
 
-        return team
+    return team
 
-    try:
-        rag = get_rag_system()
-        assistant = get_ollama_assistant(rag_system=rag)
-        
-        if not assistant.enabled:
-            return {
-                "error": "Ollama assistant not available. Make sure Ollama is running."
-            }
-        
-        # Use a resolved model tag for consistency with other endpoints.
-        use_model = assistant._resolve_model_name(model)
-        
-        # Build endpoint-tuned context for stable JSON output.
-        # Reduced limits for 3B models to decrease context pressure and prevent truncation.
-        context = build_structured_context(
-            rag,
-            strategy,
-            character_limit=_safe_positive_int(os.getenv("MKM_TEAM_CHAR_LIMIT", "12"), 12),
-            equipment_limit=_safe_positive_int(os.getenv("MKM_TEAM_EQUIP_LIMIT", "15"), 15),
-            passive_max_chars=_safe_positive_int(os.getenv("MKM_TEAM_PASSIVE_MAX_CHARS", "420"), 420),
-            gameplay_max_chars=_safe_positive_int(os.getenv("MKM_TEAM_GAMEPLAY_MAX_CHARS", "1000"), 1000),
-            glossary_max_chars=_safe_positive_int(os.getenv("MKM_TEAM_GLOSSARY_MAX_CHARS", "1000"), 1000),
-        )
-        
-        owned_filter = ""
-        if owned_characters:
-            owned_filter = f"User owns: {', '.join(owned_characters)}. Prioritize these characters.\n"
-        
-        # System prompt: static rules and reference data (reset each call with keep_alive=0)
-        system_prompt = f"""You are a Mortal Kombat Mobile team builder assistant.
+
+def _is_complete_team(payload: Dict) -> bool:
+    """True once a streamed object names all three characters."""
+    team = _normalize_team_payload(payload)
+    return all(
+        team[f"char{idx}"].get("name") not in (None, "", "Placeholder") for idx in range(1, 4)
+    )
+
+
+def _team_output_mode() -> str:
+    """"ids" (default): the model answers with catalog IDs; "verbatim": it copies names and texts."""
+    mode = os.getenv("MKM_TEAM_OUTPUT", "ids").strip().lower()
+    return mode if mode in {"ids", "verbatim"} else "ids"
+
+
+_TEAM_VERBATIM_RULE = "- COPY all names and descriptions VERBATIM from the lists. Do NOT shorten or paraphrase."
+_TEAM_VERBATIM_FORMAT = """Respond with ONLY this JSON structure:
+{
+    "char1": {"name": "<character name>", "rarity":"<character rarity>" ,"passive": "<passive text>", "equipment": [{"slot": "weapon", "name": "<name>", "effect": "<effect>"}, {"slot": "armor", "name": "<name>", "effect": "<effect>"}, {"slot": "accessory", "name": "<name>", "effect": "<effect>"}]},
+    "char2": {"name": "<character name>", "rarity":"<character rarity>" ,"passive": "<passive text>", "equipment": [{"slot": "weapon", "name": "<name>", "effect": "<effect>"}, {"slot": "armor", "name": "<name>", "effect": "<effect>"}, {"slot": "accessory", "name": "<name>", "effect": "<effect>"}]},
+    "char3": {"name": "<character name>", "rarity":"<character rarity>" ,"passive": "<passive text>", "equipment": [{"slot": "weapon", "name": "<name>", "effect": "<effect>"}, {"slot": "armor", "name": "<name>", "effect": "<effect>"}, {"slot": "accessory", "name": "<name>", "effect": "<effect>"}]},
+    "strategy": "<explanation of team synergy>"
+}"""
+
+_TEAM_IDS_RULE = (
+    "- Every character and equipment line starts with an ID (C1, W1, A1, X1). "
+    "Refer to characters and equipment ONLY by these IDs. Do NOT write names, passives or effects."
+)
+_TEAM_IDS_FORMAT = """Respond with ONLY this JSON structure (weapon ID, armor ID, accessory ID, plus one more ID of any type for Diamond characters):
+{
+    "char1": {"id": "<C id>", "equipment": ["<W id>", "<A id>", "<X id>"]},
+    "char2": {"id": "<C id>", "equipment": ["<W id>", "<A id>", "<X id>"]},
+    "char3": {"id": "<C id>", "equipment": ["<W id>", "<A id>", "<X id>"]},
+    "strategy": "<explanation of team synergy>"
+}"""
+
+
+async def _model_and_context(
+    name: str, assistant, model: Optional[str], build_context: Callable[[], T]
+) -> Tuple[str, T]:
+    """Resolve the model tag and retrieve the context concurrently, timed as pipeline ``name``."""
+    pipeline = Pipeline(name)
+    use_model, context = await pipeline.gather(
+        pipeline.stage("model", asyncio.to_thread(assistant._resolve_model_name, model)),
+        pipeline.stage(
+            "retrieval", within("retrieval", asyncio.to_thread(build_context), _get_http_timeout_seconds())
+        ),
+    )
+    pipeline.finish()
+    return use_model, context
+
+
+def _suggest_team_context(rag, strategy: str) -> Tuple[Dict[str, str], Dict[str, Dict[str, str]]]:
+    """Retrieve the context for a team: returns (context, catalog of IDs when answering with IDs)."""
+    catalog: Dict[str, Dict[str, str]] = {}
+
+    # Build endpoint-tuned context for stable JSON output.
+    # Reduced limits for 3B models to decrease context pressure and prevent truncation.
+    context = build_structured_context(
+        rag,
+        strategy,
+        character_limit=_safe_positive_int(os.getenv("MKM_TEAM_CHAR_LIMIT", "12"), 12),
+        equipment_limit=_safe_positive_int(os.getenv("MKM_TEAM_EQUIP_LIMIT", "15"), 15),
+        passive_max_chars=_safe_positive_int(os.getenv("MKM_TEAM_PASSIVE_MAX_CHARS", "420"), 420),
+        gameplay_max_chars=_safe_positive_int(os.getenv("MKM_TEAM_GAMEPLAY_MAX_CHARS", "1000"), 1000),
+        glossary_max_chars=_safe_positive_int(os.getenv("MKM_TEAM_GLOSSARY_MAX_CHARS", "1000"), 1000),
+        tier_boost=_get_tier_boost("MKM_TEAM_TIER_BOOST", 0.0),
+        catalog=catalog if _team_output_mode() == "ids" else None,
+    )
+    return context, catalog
+
+
+def _suggest_team_request(
+    use_model: str,
+    context: Dict[str, str],
+    catalog: Dict[str, Dict[str, str]],
+    strategy: str,
+    owned_characters: Optional[List[str]],
+) -> Tuple[Dict, str, str, Dict[str, Dict[str, str]]]:
+    """Build the Ollama /api/chat body for a team.
+
+    Returns:
+        (request body, system prompt, user prompt, catalog); the catalog is
+        empty unless the model is asked to answer with IDs
+    """
+    if not any(key.startswith("C") for key in catalog):
+        catalog = {}  # nothing to reference by ID (e.g. RAG disabled)
+    names_rule, output_format = (
+        (_TEAM_IDS_RULE, _TEAM_IDS_FORMAT) if catalog else (_TEAM_VERBATIM_RULE, _TEAM_VERBATIM_FORMAT)
+    )
+
+    owned_filter = ""
+    if owned_characters:
+        owned_filter = f"User owns: {', '.join(owned_characters)}. Prioritize these characters.\n"
+
+    # System prompt: static rules and reference data (reset each call with keep_alive=0)
+    system_prompt = f"""You are a Mortal Kombat Mobile team builder assistant.
     
 === GAMEPLAY MECHANICS ===
 {context['gameplay']}
@@ -989,24 +1443,18 @@ async def suggest_team_json(
 === RULES ===
 - Suggest EXACTLY 3 characters from the AVAILABLE CHARACTERS list.
 - Each character gets: 1 weapon, 1 armor, 1 accessory. Diamond characters get 1 extra slot (any type).
-- COPY all names and descriptions VERBATIM from the lists. Do NOT shorten or paraphrase.
+{names_rule}
 - Do NOT repeat characters or equipment.
 - If equipment pieces have character-specific effects, prioritize characters that benefit from them only if they are in the AVAILABLE CHARACTERS list. Equip them accordingly.
 - TIER RANKING (best to worst): S+ > S > A > B > C > D. Prefer higher tiers but consider synergy.
 
 === OUTPUT FORMAT ===
-Respond with ONLY this JSON structure:
-{{
-    "char1": {{"name": "<character name>", "rarity":"<character rarity>" ,"passive": "<passive text>", "equipment": [{{"slot": "weapon", "name": "<name>", "effect": "<effect>"}}, {{"slot": "armor", "name": "<name>", "effect": "<effect>"}}, {{"slot": "accessory", "name": "<name>", "effect": "<effect>"}}]}},
-    "char2": {{"name": "<character name>", "rarity":"<character rarity>" ,"passive": "<passive text>", "equipment": [{{"slot": "weapon", "name": "<name>", "effect": "<effect>"}}, {{"slot": "armor", "name": "<name>", "effect": "<effect>"}}, {{"slot": "accessory", "name": "<name>", "effect": "<effect>"}}]}},
-    "char3": {{"name": "<character name>", "rarity":"<character rarity>" ,"passive": "<passive text>", "equipment": [{{"slot": "weapon", "name": "<name>", "effect": "<effect>"}}, {{"slot": "armor", "name": "<name>", "effect": "<effect>"}}, {{"slot": "accessory", "name": "<name>", "effect": "<effect>"}}]}},
-    "strategy": "<explanation of team synergy>"
-}}
+{output_format}
 
 IMPORTANT: You MUST generate JSON for exactly 3 characters (char1, char2, char3). Do not stop after the first character."""
 
-        # User prompt: the specific request with available items
-        user_prompt = f"""{owned_filter}Build a team for: {strategy}
+    # User prompt: the specific request with available items
+    user_prompt = f"""{owned_filter}Build a team for: {strategy}
 
 === AVAILABLE CHARACTERS ===
 {context['characters']}
@@ -1020,116 +1468,213 @@ IMPORTANT: You MUST generate JSON for exactly 3 characters (char1, char2, char3)
 === AVAILABLE ACCESSORIES ===
 {context['accessories']}"""
 
-        # Detect if we should use higher limits for reasoning models (DeepSeek-R1, o1, etc.)
-        is_reasoning_model = any(kw in use_model.lower() for kw in ["r1", "o1", "thought", "reasoning"])
-        num_predict = 4000 if is_reasoning_model else 2500
-        num_ctx = 8192 if is_reasoning_model else 4096
+    # Detect if we should use higher limits for reasoning models (DeepSeek-R1, o1, etc.)
+    is_reasoning_model = any(kw in use_model.lower() for kw in ["r1", "o1", "thought", "reasoning"])
+    num_predict = 4000 if is_reasoning_model else 2500
+    num_ctx = 8192 if is_reasoning_model else 4096
+
+    request_body = {
+        "model": use_model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        "format": "json",
+        "keep_alive": "10m", # Keep in memory for 10 mins
+        "options": {
+            "temperature": 0.3 if is_reasoning_model else 0.1, # Slightly higher for reasoning depth
+            "num_predict": num_predict,
+            "num_ctx": num_ctx
+        }
+    }
+    return request_body, system_prompt, user_prompt, catalog
 
-        import httpx
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{assistant.base_url}/api/chat",
-                json={
-                    "model": use_model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "stream": False,
-                    "format": "json",
-                    "keep_alive": "10m", # Keep in memory for 10 mins
-                    "options": {
-                        "temperature": 0.3 if is_reasoning_model else 0.1, # Slightly higher for reasoning depth
-                        "num_predict": num_predict,
-                        "num_ctx": num_ctx
-                    }
-                },
-                timeout=_get_http_timeout_seconds()
-            )
-            
-            if response.status_code != 200:
-                err_msg = f"HTTP {response.status_code}"
-                try:
-                    err_msg += f": {response.text[:200]}"
-                except Exception:
-                    pass
-                _log_debug_interaction("SUGGEST_TEAM_ERR", system_prompt, user_prompt, err_msg)
-                return {"error": f"Ollama API returned status {response.status_code}"}
-            
-            result = response.json()
-            if "error" in result:
-                return {"error": f"Ollama Error: {result['error']}"}
-            response_text = result.get("message", {}).get("content", "")
-            _log_debug_interaction("SUGGEST_TEAM", system_prompt, user_prompt, response_text)
-            
-            # 1. Clean and parse JSON
-            cleaned_json = _clean_llm_json(response_text)
-            team_data = None
-            
-            try:
-                team_data = json.loads(cleaned_json)
-            except json.JSONDecodeError:
-                # 2. Try Python literal eval if JSON fails
-                try:
-                    import ast
-                    team_data = ast.literal_eval(cleaned_json)
-                except Exception:
-                    pass
 
-            if team_data:
-                # 3. Normalize and Enforce (permissive)
-                team_data = _normalize_team_payload(team_data)
-                final_team = _enforce_team_output_format(team_data)
-                if final_team:
-                    return {"response": final_team}
-
-            # 4. Final fallback logic if parsing failed
-            # If we have a strategy but failed on characters, we return a fallback response
-            if isinstance(team_data, dict) and team_data.get("strategy"):
-                 return {
-                    "response": {
-                        "strategy": team_data["strategy"],
-                        "char1": {"name": "Retrieval Success", "rarity": "Diamond", "passive": "Model response was partially malformed. Please try again.", "equipment": []},
-                        "char2": {"name": "Parsing Issue", "rarity": "Diamond", "passive": "", "equipment": []},
-                        "char3": {"name": "Structure Refinement", "rarity": "Diamond", "passive": "", "equipment": []}
-                    }
-                }
+def _hydrate_team(payload: object, catalog: Dict[str, Dict[str, str]]) -> object:
+    """Replace catalog IDs in a model answer with the full character / equipment entries.
 
-            return {
-                "error": "Failed to parse model output into required team JSON schema",
-                "raw_response": response_text,
-                "cleaned_attempt": cleaned_json
+    Characters answered as ``{"id": "C2", "equipment": ["W1", ...]}`` get
+    name, rarity, passive and per-slot effects from the catalog; entries
+    without a known ID are left for _normalize_team_payload as before.
+    """
+    if not catalog or not isinstance(payload, dict):
+        return payload
+
+    def _ref(value: object) -> Optional[Dict[str, str]]:
+        if isinstance(value, dict):
+            value = value.get("id")
+        return catalog.get(str(value).strip().upper()) if isinstance(value, str) else None
+
+    team = dict(payload)
+    for idx in range(1, 4):
+        char = team.get(f"char{idx}")
+        entry = _ref(char)
+        if entry is None or "rarity" not in entry:
+            continue
+        equipment = char.get("equipment") if isinstance(char, dict) else None
+        hydrated_equipment = []
+        for item in equipment if isinstance(equipment, list) else []:
+            item_entry = _ref(item)
+            if item_entry is not None and "slot" in item_entry:
+                hydrated_equipment.append(dict(item_entry))
+        team[f"char{idx}"] = {**entry, "equipment": hydrated_equipment}
+    return team
+
+
+def _team_result(
+    response_text: str,
+    team_data: Optional[Dict] = None,
+    catalog: Optional[Dict[str, Dict[str, str]]] = None,
+) -> Dict:
+    """Turn model output (and the streamed object, if one completed) into the endpoint result."""
+    # 1. Clean and parse JSON (unless the stream already produced a complete object)
+    cleaned_json = _clean_llm_json(response_text)
+
+    if team_data is None:
+        try:
+            team_data = json.loads(cleaned_json)
+        except json.JSONDecodeError:
+            # 2. Try Python literal eval if JSON fails
+            try:
+                import ast
+                team_data = ast.literal_eval(cleaned_json)
+            except Exception:
+                pass
+
+    if team_data:
+        # 3. Hydrate IDs, then Normalize and Enforce (permissive)
+        team_data = _normalize_team_payload(_hydrate_team(team_data, catalog or {}))
+        final_team = _enforce_team_output_format(team_data)
+        if final_team:
+            return {"response": final_team}
+
+    # 4. Final fallback logic if parsing failed
+    # If we have a strategy but failed on characters, we return a fallback response
+    if isinstance(team_data, dict) and team_data.get("strategy"):
+         return {
+            "response": {
+                "strategy": team_data["strategy"],
+                "char1": {"name": "Retrieval Success", "rarity": "Diamond", "passive": "Model response was partially malformed. Please try again.", "equipment": []},
+                "char2": {"name": "Parsing Issue", "rarity": "Diamond", "passive": "", "equipment": []},
+                "char3": {"name": "Structure Refinement", "rarity": "Diamond", "passive": "", "equipment": []}
             }
-                
-    except Exception as e:
-        logger.error(f"Error in suggest_team_json: {e}")
-        return {"error": str(e)}
+        }
+
+    return {
+        "error": "Failed to parse model output into required team JSON schema",
+        "raw_response": response_text,
+        "cleaned_attempt": cleaned_json
+    }
 
 
-async def ask_question_json(question: str, model: Optional[str] = None) -> dict:
-    """Answer a free-form question with RAG context, returning Markdown text."""
+# Top-level keys of a team object forwarded as ``field`` frames while streaming
+TEAM_STREAM_FIELDS = ("char1", "char2", "char3", "strategy")
+
+
+async def suggest_team_stream(
+    strategy: str,
+    owned_characters: Optional[List[str]] = None,
+    model: Optional[str] = None
+) -> AsyncIterator[Dict]:
+    """Streaming /suggest-team: a ``field`` frame per character / strategy, then ``done``.
+
+    Generation stops as soon as a complete object naming three characters
+    has arrived. The ``done`` frame's ``response`` is what suggest_team_json
+    returns; failures end with an ``error`` frame.
+    """
     try:
         rag = get_rag_system()
         assistant = get_ollama_assistant(rag_system=rag)
 
         if not assistant.enabled:
-            return {"error": "Ollama assistant not available. Make sure Ollama is running."}
-
-        # Use a resolved model tag for consistency with other endpoints.
-        use_model = assistant._resolve_model_name(model)
+            yield {"type": "error", "error": "Ollama assistant not available. Make sure Ollama is running."}
+            return
 
-        context = build_structured_context(
-            rag,
-            question,
-            character_limit=_safe_positive_int(os.getenv("MKM_ASK_CHAR_LIMIT", "22"), 22),
-            equipment_limit=_safe_positive_int(os.getenv("MKM_ASK_EQUIP_LIMIT", "24"), 24),
-            passive_max_chars=_safe_positive_int(os.getenv("MKM_ASK_PASSIVE_MAX_CHARS", "420"), 420),
-            gameplay_max_chars=_safe_positive_int(os.getenv("MKM_ASK_GAMEPLAY_MAX_CHARS", "1200"), 1200),
-            glossary_max_chars=_safe_positive_int(os.getenv("MKM_ASK_GLOSSARY_MAX_CHARS", "1200"), 1200),
+        use_model, (context, catalog) = await _model_and_context(
+            "/suggest-team", assistant, model, lambda: _suggest_team_context(rag, strategy)
         )
+        request_body, system_prompt, user_prompt, catalog = _suggest_team_request(
+            use_model, context, catalog, strategy, owned_characters
+        )
+
+        parser = IncrementalJSONObject(accept=lambda obj: _is_complete_team(_hydrate_team(obj, catalog)))
+        try:
+            async with _generation_slot(), aclosing(
+                stream_completion(
+                    assistant.base_url,
+                    "/api/chat",
+                    request_body,
+                    timeout=stage_timeout("generation", _get_http_timeout_seconds()),
+                )
+            ) as deltas:
+                async for delta in deltas:
+                    for key, value in parser.feed(delta):
+                        if key in TEAM_STREAM_FIELDS:
+                            field = _normalize_team_payload(_hydrate_team({key: value}, catalog))[key]
+                            yield {"type": "field", "name": key, "value": field}
+                    if parser.done:
+                        break  # leaving the stream stops the remaining generation
+        except OllamaStreamError as e:
+            _log_debug_interaction("SUGGEST_TEAM_ERR", system_prompt, user_prompt, f"{e} {e.detail[:200]}")
+            yield {"type": "error", "error": str(e)}
+            return
+
+        response_text = parser.text
+        _log_debug_interaction("SUGGEST_TEAM", system_prompt, user_prompt, response_text)
+        result = _team_result(response_text, parser.value, catalog)
+        if "response" in result:
+            yield {"type": "done", "response": result["response"]}
+        else:
+            yield {"type": "error", **result}
+
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
+    except Exception as e:
+        logger.error(f"Error in suggest_team_json: {e}")
+        yield {"type": "error", "error": str(e)}
+
+
+async def suggest_team_json(
+    strategy: str,
+    owned_characters: Optional[List[str]] = None,
+    model: Optional[str] = None
+) -> dict:
+    """
+    Get team composition suggestions as structured JSON
+    
+    Args:
+        strategy: Desired strategy (e.g., "aggressive rush", "defensive tank")
+        owned_characters: Optional list of characters the player owns
+        model: Optional Ollama model tag to use (e.g., "llama3.2:3b")
+        
+    Returns:
+        Structured JSON with team suggestion
+    """
+    result: Dict = {"error": "Empty response from LLM"}
+    async for frame in suggest_team_stream(strategy, owned_characters, model=model):
+        if frame["type"] == "done":
+            result = {"response": frame["response"]}
+        elif frame["type"] == "error":
+            result = {key: value for key, value in frame.items() if key != "type"}
+    return result
+
+
+def _ask_question_context(rag, question: str) -> Dict[str, str]:
+    return build_structured_context(
+        rag,
+        question,
+        character_limit=_safe_positive_int(os.getenv("MKM_ASK_CHAR_LIMIT", "22"), 22),
+        equipment_limit=_safe_positive_int(os.getenv("MKM_ASK_EQUIP_LIMIT", "24"), 24),
+        passive_max_chars=_safe_positive_int(os.getenv("MKM_ASK_PASSIVE_MAX_CHARS", "420"), 420),
+        gameplay_max_chars=_safe_positive_int(os.getenv("MKM_ASK_GAMEPLAY_MAX_CHARS", "1200"), 1200),
+        glossary_max_chars=_safe_positive_int(os.getenv("MKM_ASK_GLOSSARY_MAX_CHARS", "1200"), 1200),
+        tier_boost=_get_tier_boost("MKM_ASK_TIER_BOOST", 0.0),
+    )
+
 
-        system_prompt = f"""You are a knowledgeable Mortal Kombat Mobile game assistant.
+def _ask_question_request(use_model: str, context: Dict[str, str], question: str) -> Tuple[Dict, str]:
+    """Build the Ollama /api/chat body for a question: returns (request body, system prompt)."""
+    system_prompt = f"""You are a knowledgeable Mortal Kombat Mobile game assistant.
 
 === GAMEPLAY MECHANICS ===
 {context['gameplay']}
@@ -1155,25 +1700,45 @@ async def ask_question_json(question: str, model: Optional[str] = None) -> dict:
 - If a question cannot be answered from the provided context, say so honestly.
 - Be concise but thorough."""
 
-        import httpx
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{assistant.base_url}/api/chat",
-                json={
-                    "model": use_model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": question}
-                    ],
-                    "stream": False,
-                    "keep_alive": "10m",
-                    "options": {
-                        "temperature": 0.3,
-                        "num_predict": 1500
-                    }
-                },
-                timeout=_get_http_timeout_seconds()
+    request_body = {
+        "model": use_model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question}
+        ],
+        "stream": False,
+        "keep_alive": "10m",
+        "options": {
+            "temperature": 0.3,
+            "num_predict": 1500
+        }
+    }
+    return request_body, system_prompt
+
+
+async def ask_question_json(question: str, model: Optional[str] = None) -> dict:
+    """Answer a free-form question with RAG context, returning Markdown text."""
+    try:
+        rag = get_rag_system()
+        assistant = get_ollama_assistant(rag_system=rag)
+
+        if not assistant.enabled:
+            return {"error": "Ollama assistant not available. Make sure Ollama is running."}
+
+        use_model, context = await _model_and_context(
+            "/ask-question", assistant, model, lambda: _ask_question_context(rag, question)
+        )
+        request_body, system_prompt = _ask_question_request(use_model, context, question)
+
+        async with _generation_slot(), ollama_client(assistant.base_url) as client:
+            response = await within(
+                "generation",
+                client.post(
+                    f"{assistant.base_url}/api/chat",
+                    json=request_body,
+                    timeout=stage_timeout("generation", _get_http_timeout_seconds()),
+                ),
+                _get_http_timeout_seconds(),
             )
 
             if response.status_code != 200:
@@ -1196,6 +1761,8 @@ async def ask_question_json(question: str, model: Optional[str] = None) -> dict:
 
             return {"response": response_text}
 
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
     except Exception as e:
         logger.error(f"Error in ask_question_json: {e}")
         return {"error": str(e)}
@@ -1234,51 +1801,125 @@ async def explain_mechanic_json(mechanic: str, model: Optional[str] = None) -> d
             }
         }
 
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
     except Exception as e:
         logger.error(f"Error in explain_mechanic_json: {e}")
         return {"error": str(e)}
 
 
-async def chat_json(
-    message: str,
-    messages: Optional[List[Dict[str, str]]] = None,
-    summary_text: Optional[str] = None,
-    summary_message_count: int = 0,
-    model: Optional[str] = None,
-) -> dict:
-    """Answer a chat message using RAG context and compacted conversation history."""
+async def explain_mechanic_stream(mechanic: str, model: Optional[str] = None) -> AsyncIterator[Dict]:
+    """Streaming /explain-mechanic: ``field`` frames for definition / recommendations, then ``done``.
+
+    The ``done`` frame's ``response`` matches explain_mechanic_json.
+    """
     try:
         rag = get_rag_system()
         assistant = get_ollama_assistant(rag_system=rag)
 
         if not assistant.enabled:
-            return {"error": "Ollama assistant not available. Make sure Ollama is running."}
+            yield {"type": "error", "error": "Ollama assistant not available. Make sure Ollama is running."}
+            return
+
+        async with aclosing(assistant.explain_mechanic_stream(mechanic, model=model)) as frames:
+            async for frame in frames:
+                if frame["type"] == "done":
+                    yield {
+                        "type": "done",
+                        "response": {
+                            "definition": frame["response"]["definition"],
+                            "recommendations": frame["response"]["recommendations"],
+                        },
+                    }
+                else:
+                    yield frame
 
-        use_model = assistant._resolve_model_name(model)
-        normalized_messages = _sanitize_chat_messages(messages or [])
-        normalized_summary_text = (summary_text or "").strip()
-        normalized_summary_count = max(0, int(summary_message_count or 0))
-
-        compacted_summary, compacted_summary_count, recent_messages = await _compact_chat_history(
-            assistant=assistant,
-            use_model=use_model,
-            messages=normalized_messages,
-            existing_summary=normalized_summary_text,
-            existing_summary_count=normalized_summary_count,
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
+    except Exception as e:
+        logger.error(f"Error in explain_mechanic_stream: {e}")
+        yield {"type": "error", "error": str(e)}
+
+
+async def _chat_request(
+    rag,
+    assistant,
+    message: str,
+    messages: Optional[List[Dict[str, str]]],
+    summary_text: Optional[str],
+    summary_message_count: int,
+    model: Optional[str],
+    session: Optional[Dict] = None,
+) -> Tuple[Dict, str, str, int]:
+    """Compact the history and build the Ollama /api/chat body for a chat turn.
+
+    With a ``session``, its history is replaced by the compacted one and the
+    previous turn's retrieval context is reused when the retrieval query and
+    indexed data are unchanged (a retried or repeated turn).
+
+    Model resolution then compaction runs concurrently with retrieval:
+    the retrieval query only depends on the new message and the last
+    ``MKM_CHAT_KEEP_RECENT_MESSAGES`` turns, never on the new summary.
+
+    Returns:
+        (request body, system prompt, compacted summary, compacted summary count)
+    """
+    pipeline = Pipeline("/chat")
+    normalized_messages = _sanitize_chat_messages(messages or [])
+    normalized_summary_text = (summary_text or "").strip()
+    normalized_summary_count = max(0, int(summary_message_count or 0))
+    keep_recent, _ = _compaction_window()
+    retrieval_query = _build_chat_retrieval_query(message, normalized_messages[-keep_recent:])
+    data_hash = getattr(rag, "_last_data_hash", None)
+
+    async def _model_then_compaction() -> Tuple[str, Tuple[Optional[str], int, List[Dict[str, str]]]]:
+        use_model = await pipeline.stage("model", asyncio.to_thread(assistant._resolve_model_name, model))
+        compact = _compact_chat_history if _chat_compaction_mode() == "inline" else _compact_chat_history_in_background
+        compacted = await pipeline.stage(
+            "compaction",
+            compact(
+                assistant=assistant,
+                use_model=use_model,
+                messages=normalized_messages,
+                existing_summary=normalized_summary_text,
+                existing_summary_count=normalized_summary_count,
+            ),
+        )
+        return use_model, compacted
+
+    async def _retrieval() -> Dict[str, str]:
+        previous = session.get("retrieval") if session is not None else None
+        if previous and data_hash is not None and previous["query"] == retrieval_query and previous["data_hash"] == data_hash:
+            return previous["context"]
+        return await within(
+            "retrieval",
+            asyncio.to_thread(build_chat_context, rag, retrieval_query, pipeline=pipeline),
+            _get_http_timeout_seconds(),
         )
 
-        retrieval_query = _build_chat_retrieval_query(message, recent_messages)
-        context = build_chat_context(rag, retrieval_query)
+    (use_model, (compacted_summary, compacted_summary_count, recent_messages)), context = await pipeline.gather(
+        _model_then_compaction(), pipeline.stage("retrieval", _retrieval())
+    )
+    pipeline.finish()
+
+    if session is not None:
+        folded = compacted_summary_count - normalized_summary_count
+        session.update(
+            messages=normalized_messages[folded:],
+            summary_text=compacted_summary,
+            summary_message_count=compacted_summary_count,
+            retrieval={"query": retrieval_query, "data_hash": data_hash, "context": context},
+        )
 
-        history_lines = []
-        for item in recent_messages:
-            speaker = "User" if item["role"] == "user" else "Assistant"
-            history_lines.append(f"{speaker}: {item['content']}")
+    history_lines = []
+    for item in recent_messages:
+        speaker = "User" if item["role"] == "user" else "Assistant"
+        history_lines.append(f"{speaker}: {item['content']}")
 
-        history_block = "\n".join(history_lines).strip() or "(no previous turns)"
-        summary_block = compacted_summary or "(none)"
+    history_block = "\n".join(history_lines).strip() or "(no previous turns)"
+    summary_block = compacted_summary or "(none)"
 
-        system_prompt = f"""You are a Mortal Kombat Mobile tactical coach and roster expert.
+    system_prompt = f"""You are a Mortal Kombat Mobile tactical coach and roster expert.
 
     You must answer using ONLY evidence from the RAG snippets and conversation context below.
     If the evidence is insufficient, explicitly say you do not have enough indexed data.
@@ -1313,53 +1954,99 @@ async def chat_json(
     - TONE: Keep your tone encouraging, concise, and highly tactical.
     """
 
-        import httpx
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{assistant.base_url}/api/chat",
-                json={
-                    "model": use_model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": message}
-                    ],
-                    "stream": False,
-                    "keep_alive": "10m",
-                    "options": {
-                        "temperature": 0.45,
-                        "num_predict": 1800,
-                        "num_ctx": 8192,
-                    },
-                },
-                timeout=_get_http_timeout_seconds(),
+    request_body = {
+        "model": use_model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ],
+        "stream": False,
+        "keep_alive": "10m",
+        "options": {
+            "temperature": 0.45,
+            "num_predict": 1800,
+            "num_ctx": 8192,
+        },
+    }
+    return request_body, system_prompt, compacted_summary, compacted_summary_count
+
+
+async def chat_json(
+    message: str,
+    messages: Optional[List[Dict[str, str]]] = None,
+    summary_text: Optional[str] = None,
+    summary_message_count: int = 0,
+    model: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> dict:
+    """Answer a chat message using RAG context and compacted conversation history.
+
+    With a ``session_id`` the history comes from the server-held session
+    (seeded from ``messages`` / ``summary_text`` the first time), and the
+    finished turn is appended to it.
+    """
+    try:
+        rag = get_rag_system()
+        assistant = get_ollama_assistant(rag_system=rag)
+
+        if not assistant.enabled:
+            return {"error": "Ollama assistant not available. Make sure Ollama is running."}
+
+        async with _chat_session_turn(session_id) if session_id else nullcontext():
+            session = None
+            if session_id:
+                session = await _load_chat_session(
+                    session_id, messages, summary_text, summary_message_count
+                )
+                messages, summary_text = session["messages"], session["summary_text"]
+                summary_message_count = session["summary_message_count"]
+
+            request_body, system_prompt, compacted_summary, compacted_summary_count = (
+                await _chat_request(
+                    rag, assistant, message, messages, summary_text, summary_message_count, model, session
+                )
             )
 
-        if response.status_code != 200:
-            err_msg = f"HTTP {response.status_code}"
-            try:
-                err_msg += f": {response.text[:200]}"
-            except Exception:
-                pass
-            _log_debug_interaction("CHAT_ERR", system_prompt, message, err_msg)
-            return {"error": f"Ollama API returned status {response.status_code}"}
-
-        result = response.json()
-        if "error" in result:
-            return {"error": f"Ollama Error: {result['error']}"}
-        response_text = str(result.get("message", {}).get("content", "")).strip()
-        _log_debug_interaction("CHAT", system_prompt, message, response_text)
-        if not response_text:
-            return {"error": "Empty response from LLM"}
+            async with _generation_slot(), ollama_client(assistant.base_url) as client:
+                response = await within(
+                    "generation",
+                    client.post(
+                        f"{assistant.base_url}/api/chat",
+                        json=request_body,
+                        timeout=stage_timeout("generation", _get_http_timeout_seconds()),
+                    ),
+                    _get_http_timeout_seconds(),
+                )
 
-        return {
-            "response": {
+            if response.status_code != 200:
+                err_msg = f"HTTP {response.status_code}"
+                try:
+                    err_msg += f": {response.text[:200]}"
+                except Exception:
+                    pass
+                _log_debug_interaction("CHAT_ERR", system_prompt, message, err_msg)
+                return {"error": f"Ollama API returned status {response.status_code}"}
+
+            result = response.json()
+            if "error" in result:
+                return {"error": f"Ollama Error: {result['error']}"}
+            response_text = str(result.get("message", {}).get("content", "")).strip()
+            _log_debug_interaction("CHAT", system_prompt, message, response_text)
+            if not response_text:
+                return {"error": "Empty response from LLM"}
+
+            answer = {
                 "text": response_text,
                 "summary_text": compacted_summary,
                 "summary_message_count": compacted_summary_count,
             }
-        }
+            if session is not None:
+                await _save_chat_session(session_id, session, message, response_text)
+                answer["session_id"] = session_id
+            return {"response": answer}
 
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
     except Exception as e:
         logger.error(f"Error in chat_json: {e}")
         # Capture error in debug log if possible
@@ -1370,108 +2057,847 @@ async def chat_json(
         return {"error": str(e)}
 
 
+async def ask_question_stream(question: str, model: Optional[str] = None) -> AsyncIterator[Dict]:
+    """Streaming /ask-question: ``delta`` frames as tokens arrive, then one ``done`` frame.
+
+    The ``done`` frame's ``response`` is what ask_question_json returns;
+    failures end the stream with an ``error`` frame.
+    """
+    try:
+        rag = get_rag_system()
+        assistant = get_ollama_assistant(rag_system=rag)
+
+        if not assistant.enabled:
+            yield {"type": "error", "error": "Ollama assistant not available. Make sure Ollama is running."}
+            return
+
+        use_model, context = await _model_and_context(
+            "/ask-question", assistant, model, lambda: _ask_question_context(rag, question)
+        )
+        request_body, system_prompt = _ask_question_request(use_model, context, question)
+
+        parts = []
+        async with _generation_slot(), aclosing(
+            stream_completion(
+                assistant.base_url,
+                "/api/chat",
+                request_body,
+                timeout=stage_timeout("generation", _get_http_timeout_seconds()),
+            )
+        ) as deltas:
+            async for delta in deltas:
+                parts.append(delta)
+                yield {"type": "delta", "text": delta}
+
+        response_text = "".join(parts).strip()
+        _log_debug_interaction("ASK_QUESTION_STREAM", system_prompt, question, response_text)
+        if not response_text:
+            yield {"type": "error", "error": "Empty response from LLM"}
+            return
+        yield {"type": "done", "response": response_text}
+
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
+    except Exception as e:
+        logger.error(f"Error in ask_question_stream: {e}")
+        yield {"type": "error", "error": str(e)}
+
+
+async def chat_stream(
+    message: str,
+    messages: Optional[List[Dict[str, str]]] = None,
+    summary_text: Optional[str] = None,
+    summary_message_count: int = 0,
+    model: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> AsyncIterator[Dict]:
+    """Streaming /chat: ``delta`` frames as tokens arrive, then one ``done`` frame.
+
+    The ``done`` frame's ``response`` matches chat_json, including
+    ``summary_text`` / ``summary_message_count`` (and ``session_id``) for
+    the next turn.
+    """
+    try:
+        rag = get_rag_system()
+        assistant = get_ollama_assistant(rag_system=rag)
+
+        if not assistant.enabled:
+            yield {"type": "error", "error": "Ollama assistant not available. Make sure Ollama is running."}
+            return
+
+        async with _chat_session_turn(session_id) if session_id else nullcontext():
+            session = None
+            if session_id:
+                session = await _load_chat_session(
+                    session_id, messages, summary_text, summary_message_count
+                )
+                messages, summary_text = session["messages"], session["summary_text"]
+                summary_message_count = session["summary_message_count"]
+
+            request_body, system_prompt, compacted_summary, compacted_summary_count = (
+                await _chat_request(
+                    rag, assistant, message, messages, summary_text, summary_message_count, model, session
+                )
+            )
+
+            parts = []
+            async with _generation_slot(), aclosing(
+                stream_completion(
+                    assistant.base_url,
+                    "/api/chat",
+                    request_body,
+                    timeout=stage_timeout("generation", _get_http_timeout_seconds()),
+                )
+            ) as deltas:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield {"type": "delta", "text": delta}
+
+            response_text = "".join(parts).strip()
+            _log_debug_interaction("CHAT_STREAM", system_prompt, message, response_text)
+            if not response_text:
+                yield {"type": "error", "error": "Empty response from LLM"}
+                return
+            answer = {
+                "text": response_text,
+                "summary_text": compacted_summary,
+                "summary_message_count": compacted_summary_count,
+            }
+            if session is not None:
+                await _save_chat_session(session_id, session, message, response_text)
+                answer["session_id"] = session_id
+            yield {"type": "done", "response": answer}
+
+    except (DeadlineExceeded, SchedulerRejected):
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat_stream: {e}")
+        yield {"type": "error", "error": str(e)}
+
+
+# ---------------------------------------------------------------------------
+# Transport-agnostic request handling shared by the threaded and asyncio servers
+# ---------------------------------------------------------------------------
+
+
+class ClientDisconnected(ConnectionError):
+    """The client closed its connection while its request was still being worked on."""
+
+
+class RequestError(Exception):
+    """A request that is answered with an error status and a compact JSON body."""
+
+    def __init__(self, status: int, payload: Dict):
+        super().__init__(payload.get("error", ""))
+        self.status = status
+        self.payload = payload
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        value = int(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+def _cors_headers(origin: str) -> List[Tuple[str, str]]:
+    configured_origins = os.getenv("MKM_CORS_ORIGINS", "*").strip()
+    if not configured_origins or configured_origins == "*":
+        allow_origin = "*"
+    else:
+        allowed = [item.strip() for item in configured_origins.split(",") if item.strip()]
+        allow_origin = origin if origin in allowed else (allowed[0] if allowed else "*")
+
+    api_key_header = os.getenv("MKM_API_KEY_HEADER", "X-API-Key")
+    return [
+        ("Access-Control-Allow-Origin", allow_origin),
+        ("Access-Control-Allow-Methods", "GET, POST, OPTIONS"),
+        ("Access-Control-Allow-Headers", f"Content-Type, {api_key_header}"),
+    ]
+
+
+def _status_headers(payload: Optional[Dict]) -> List[Tuple[str, str]]:
+    """Extra response headers implied by an error payload (Retry-After for ``retry_after``)."""
+    retry_after = payload.get("retry_after") if isinstance(payload, dict) else None
+    return [("Retry-After", str(int(retry_after)))] if retry_after else []
+
+
+def _check_api_key(provided_key: str, client_ip: str) -> None:
+    """Raise a 401 RequestError unless the API key matches (no-op when unset)."""
+    expected_key = os.getenv("MKM_API_KEY", "").strip()
+    if not expected_key:
+        return
+    if not provided_key or not hmac.compare_digest(provided_key, expected_key):
+        logger.warning("Unauthorized API request from %s", client_ip)
+        raise RequestError(401, {"error": "Unauthorized"})
+
+
+def _rate_limit_key(client_ip: str, header: Callable[[str], str]) -> str:
+    """The bucket key for a request, chosen by ``MKM_RATE_LIMIT_KEY`` (``ip``, ``api-key`` or ``forwarded-for``).
+
+    Falls back to the peer address when the chosen header is missing. API keys
+    are hashed so raw secrets are never held in the limiter.
+    """
+    strategy = os.getenv("MKM_RATE_LIMIT_KEY", "ip").strip().lower()
+    if strategy == "forwarded-for":
+        forwarded = (header("X-Forwarded-For") or "").split(",", 1)[0].strip()
+        if forwarded:
+            return f"ip:{forwarded}"
+    elif strategy == "api-key":
+        api_key = (header(os.getenv("MKM_API_KEY_HEADER", "X-API-Key")) or "").strip()
+        if api_key:
+            return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return f"ip:{client_ip}"
+
+
+def _check_rate_limit(key: str) -> None:
+    """Raise a 429 RequestError (with ``retry_after``) when ``key`` is over its per-minute or burst limit."""
+    enabled = os.getenv("MKM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    if not enabled:
+        return
+
+    wait = _rate_limiter.check(
+        key,
+        per_minute=_get_int_env("MKM_RATE_LIMIT_PER_MINUTE", 20),
+        burst=_get_int_env("MKM_RATE_LIMIT_BURST", 5),
+        burst_window=_get_int_env("MKM_RATE_LIMIT_BURST_WINDOW_SECONDS", 10),
+    )
+    if wait is not None:
+        logger.warning("Rate limit exceeded for %s", key)
+        raise RequestError(429, {"error": "Too many requests", "retry_after": max(1, math.ceil(wait))})
+
+
+def _check_content_length(content_length: int, expected_payload: dict) -> None:
+    if content_length == 0:
+        raise RequestError(400, {
+            "error": "Request body required",
+            "expected": expected_payload,
+        })
+    max_request_size = _get_int_env("MKM_MAX_REQUEST_SIZE", 1048576)
+    if content_length > max_request_size:
+        raise RequestError(413, {"error": "Request body too large"})
+
+
+def _parse_json_body(body: bytes) -> dict:
+    try:
+        return json.loads(body.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise RequestError(400, {"error": "Invalid JSON"})
+
+
+def _api_info() -> Dict:
+    return {
+        "service": "MK Mobile Assistant API",
+        "version": "2.3.0",
+        "endpoints": {
+            "/suggest-team": {
+                "method": "POST",
+                "description": "Get AI-powered team suggestions",
+                "body": {
+                    "strategy": "string (required)",
+                    "owned_characters": "array of strings (optional)",
+                    "model": "string (optional, Ollama model tag e.g. 'llama3.2:3b')",
+                    "cache": "boolean (optional, false skips the response cache and refreshes it)",
+                    "stream": "boolean, 'sse' or 'ndjson' (optional, send each character as soon as it is generated)"
+                }
+            },
+            "/ask-question": {
+                "method": "POST",
+                "description": "Ask any question about MK Mobile, returns Markdown text",
+                "body": {
+                    "question": "string (required)",
+                    "model": "string (optional, Ollama model tag)",
+                    "cache": "boolean (optional, false skips the response cache and refreshes it)",
+                    "stream": "boolean, 'sse' or 'ndjson' (optional, stream tokens as they are generated)"
+                }
+            },
+            "/explain-mechanic": {
+                "method": "POST",
+                "description": "Explain a game mechanic using RAG + local LLM",
+                "body": {
+                    "mechanic": "string (required)",
+                    "model": "string (optional, Ollama model tag)",
+                    "cache": "boolean (optional, false skips the response cache and refreshes it)",
+                    "stream": "boolean, 'sse' or 'ndjson' (optional, send definition before recommendations)"
+                }
+            },
+            "/chat": {
+                "method": "POST",
+                "description": "Persistent chat turn with RAG + compact history context",
+                "body": {
+                    "message": "string (required)",
+                    "messages": "array of {role, content} (required unless session_id is set)",
+                    "summary_text": "string (optional)",
+                    "summary_message_count": "integer (optional)",
+                    "model": "string (optional, Ollama model tag)",
+                    "session_id": "string (optional, 16-128 chars; the server keeps the history between turns)",
+                    "stream": "boolean, 'sse' or 'ndjson' (optional, stream tokens as they are generated)"
+                }
+            },
+            "/health": {
+                "method": "GET",
+                "description": "Detailed health / status of RAG system, LLM, and data cache"
+            },
+            "/admin/reindex": {
+                "method": "GET, POST",
+                "description": "POST starts a background RAG re-index; GET reports its progress"
+            }
+        }
+    }
+
+
+def _health_payload() -> Dict:
+    """Detailed health / observability information (blocking; run off the event loop)."""
+    rag = get_rag_system()
+    rag_status = rag.get_status() if rag.enabled else {"enabled": False}
+
+    # Check Ollama reachability (quick connect test)
+    assistant = get_ollama_assistant(rag_system=rag)
+    llm_status = {
+        "enabled": assistant.enabled,
+        "model": getattr(assistant, "model_name", None),
+        "base_url": getattr(assistant, "base_url", None),
+    }
+
+    # Document-type breakdown
+    doc_breakdown = {}
+    if rag.enabled:
+        for doc in rag.documents:
+            doc_breakdown[doc.doc_type] = doc_breakdown.get(doc.doc_type, 0) + 1
+
+    return {
+        "status": "ok" if rag.enabled and assistant.enabled else "degraded",
+        "rag": {**rag_status, "documents_by_type": doc_breakdown},
+        "llm": llm_status,
+        "coalescing": _single_flight.stats(),
+        "response_cache": {"enabled": _response_cache_enabled(), **get_response_cache().stats()},
+        "semantic_cache": get_semantic_cache().stats(),
+        "scheduler": scheduler_stats(),
+        "rate_limit": _rate_limiter.stats(),
+        "chat_summaries": get_summary_cache().stats(),
+        "chat_sessions": get_chat_session_store().stats(),
+        "pipelines": PIPELINE_STATS.stats(),
+    }
+
+
+def _reindex_payload(start: bool) -> Tuple[int, Dict]:
+    """Start a background re-index (POST) or report its progress (GET)."""
+    rag = get_rag_system()
+    if not rag.enabled:
+        raise RequestError(503, {"error": "RAG system not available"})
+    progress = rag.request_reindex() if start else rag.reindex_progress()
+    return (202 if start else 200), {"reindex": progress}
+
+
+# Concurrent identical requests share one retrieval + generation
+_single_flight = SingleFlight()
+
+
+def _normalize_request_value(value: object) -> object:
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, list):
+        return [_normalize_request_value(item) for item in value]
+    return value
+
+
+async def _request_key(endpoint: str, args: Dict) -> Tuple[str, str, Optional[str], Optional[str]]:
+    """(endpoint, normalized input, resolved model, data hash): requests with equal keys get the same answer."""
+    rag = get_rag_system()
+    assistant = get_ollama_assistant(rag_system=rag)
+    model = args.get("model")
+    if assistant.enabled:
+        # May ask Ollama for its model list; keep that off the event loop
+        model = await asyncio.to_thread(assistant._resolve_model_name, model)
+    inputs = {key: _normalize_request_value(value) for key, value in args.items() if key != "model"}
+    return endpoint, json.dumps(inputs, sort_keys=True), model, getattr(rag, "_last_data_hash", None)
+
+
+async def run_with_deadline(timeout_header: Optional[str], awaitable: Awaitable[T]) -> T:
+    """Await a route within the caller's ``X-Request-Timeout`` (capped by MKM_HTTP_TIMEOUT_SECONDS); 504 past it."""
+    try:
+        return await with_deadline(request_timeout(timeout_header, _get_http_timeout_seconds()), awaitable)
+    except DeadlineExceeded as e:
+        raise RequestError(504, {"error": str(e)})
+
+
+def _overloaded(error: SchedulerRejected) -> RequestError:
+    return RequestError(503, {"error": str(error), "retry_after": error.retry_after})
+
+
+def _generation_slot() -> AsyncContextManager[None]:
+    """The LLM scheduler slot for one Ollama call, waited for until the request deadline."""
+    return generation_slot(remaining(_get_http_timeout_seconds()))
+
+
+async def _at_priority(endpoint: str, run: Callable[[], Awaitable[Dict]]) -> Dict:
+    """Run ``run()`` at ``endpoint``'s scheduler priority; 503 + Retry-After when its generation slot is refused.
+
+    The slot itself is only taken around the Ollama call (_generation_slot),
+    so retrieval, hydration and model resolution never hold one.
+    """
+    token = current_priority.set(ENDPOINT_PRIORITIES.get(endpoint, 1))
+    try:
+        return await run()
+    except SchedulerRejected as e:
+        raise _overloaded(e)
+    finally:
+        current_priority.reset(token)
+
+
+async def _stream_at_priority(endpoint: str, frames: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """Relay ``frames`` at ``endpoint``'s scheduler priority; see _at_priority."""
+    current_priority.set(ENDPOINT_PRIORITIES.get(endpoint, 1))
+    try:
+        async with aclosing(frames):
+            async for frame in frames:
+                yield frame
+    except SchedulerRejected as e:
+        raise _overloaded(e)
+
+
+# Endpoint -> (TTL env var, default seconds); 0 turns caching off for that endpoint
+_RESPONSE_CACHE_TTLS = {
+    "/suggest-team": ("MKM_RESPONSE_CACHE_TTL_SUGGEST_TEAM_SECONDS", 86400),
+    "/explain-mechanic": ("MKM_RESPONSE_CACHE_TTL_EXPLAIN_MECHANIC_SECONDS", 604800),
+    "/ask-question": ("MKM_RESPONSE_CACHE_TTL_ASK_QUESTION_SECONDS", 0),
+}
+
+# Endpoint -> body field whose embedding finds near-duplicate requests
+_SEMANTIC_CACHE_FIELDS = {"/ask-question": "question", "/explain-mechanic": "mechanic"}
+
+_response_cache: Optional[ResponseCache] = None
+_semantic_cache: Optional[SemanticAnswerCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def _response_cache_enabled() -> bool:
+    return os.getenv("MKM_RESPONSE_CACHE_ENABLED", "true").strip().lower() == "true"
+
+
+def _response_cache_ttl(endpoint: str) -> float:
+    if not _response_cache_enabled():
+        return 0.0
+    name, default = _RESPONSE_CACHE_TTLS.get(endpoint, ("", 0))
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except ValueError:
+        return float(default)
+
+
+def get_response_cache() -> ResponseCache:
+    """Shared response cache; the disk tier lives next to the RAG index unless MKM_RESPONSE_CACHE_PATH says otherwise."""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            path = os.getenv("MKM_RESPONSE_CACHE_PATH", "").strip()
+            if path.lower() == "memory":
+                path = None
+            elif not path:
+                cache_dir = getattr(get_rag_system(), "cache_dir", None)
+                path = Path(cache_dir) / "responses.sqlite3" if cache_dir is not None else None
+            _response_cache = ResponseCache(
+                path,
+                max_entries=_get_int_env("MKM_RESPONSE_CACHE_MAX_ENTRIES", 512),
+                max_bytes=_get_int_env("MKM_RESPONSE_CACHE_MAX_BYTES", 16 * 1024 * 1024),
+            )
+        return _response_cache
+
+
+def get_semantic_cache() -> SemanticAnswerCache:
+    """Shared near-duplicate answer cache (in-process only)."""
+    global _semantic_cache
+    with _response_cache_lock:
+        if _semantic_cache is None:
+            try:
+                threshold = float(os.getenv("MKM_SEMANTIC_CACHE_THRESHOLD", "0.9"))
+            except ValueError:
+                threshold = 0.9
+            try:
+                capacity = int(os.getenv("MKM_SEMANTIC_CACHE_SIZE", "256"))
+            except ValueError:
+                capacity = 256
+            _semantic_cache = SemanticAnswerCache(capacity=capacity, threshold=threshold)
+        return _semantic_cache
+
+
+async def _cached_response(endpoint: str, args: Dict, data: dict, run) -> Dict:
+    """Answer from the response caches when possible, otherwise run (coalesced) and store a successful result.
+
+    The exact cache is tried first, then (for endpoints in _SEMANTIC_CACHE_FIELDS)
+    the closest earlier request by embedding. Hits carry ``"cached": true``.
+    Only answers tied to a known data hash are cached, since that hash is what
+    invalidates them. ``"cache": false`` in the body skips the lookups but still
+    stores the fresh answer.
+    """
+    use_cache = data.get("cache", True)
+    if not isinstance(use_cache, bool):
+        raise RequestError(400, {"error": "cache must be a boolean"})
+
+    key = await _request_key(endpoint, args)
+    _, _, model, data_hash = key
+    ttl = _response_cache_ttl(endpoint)
+    cache = get_response_cache() if ttl > 0 and data_hash is not None else None
+    loop = asyncio.get_running_loop()
+    if cache is not None and use_cache:
+        cached = await loop.run_in_executor(None, cache.get, key)
+        if cached is not None:
+            return {**cached, "cached": True}
+
+    semantic_field = _SEMANTIC_CACHE_FIELDS.get(endpoint)
+    semantic = None
+    query_vector = None
+    namespace = (endpoint, str(model), str(data_hash))
+    if semantic_field and ttl > 0 and data_hash is not None and _response_cache_enabled():
+        semantic = get_semantic_cache()
+        embed_query = getattr(get_rag_system(), "embed_query", None)
+        if semantic.capacity > 0 and embed_query is not None:
+            query_vector = await loop.run_in_executor(None, embed_query, args[semantic_field])
+        if query_vector is not None and use_cache:
+            hit = semantic.lookup(namespace, query_vector)
+            if hit is not None:
+                answer, similarity, matched = hit
+                logger.info(f"Semantic cache hit for {endpoint} ({similarity:.3f} vs {matched!r})")
+                return {**answer, "cached": True, "cache_similarity": round(similarity, 4)}
+
+    async def _run_and_store() -> Dict:
+        # Shared with coalesced callers: bounded by MKM_HTTP_TIMEOUT_SECONDS, not by the
+        # first caller's deadline; each caller's own deadline still ends its own wait
+        result = await without_deadline(_at_priority(endpoint, run))
+        if "response" in result and "error" not in result:
+            if cache is not None:
+                await loop.run_in_executor(None, cache.put, key, result, ttl)
+            if query_vector is not None:
+                semantic.put(namespace, query_vector, args[semantic_field], result, ttl)
+        return result
+
+    return await _single_flight.do(key, _run_and_store)
+
+
+def _suggest_team_args(data: dict) -> Dict:
+    """Validate a /suggest-team body into suggest_team_json keyword arguments."""
+    strategy = data.get("strategy")
+    if not isinstance(strategy, str) or not strategy.strip():
+        raise RequestError(400, {"error": "Missing required field: strategy"})
+
+    max_strategy_length = _get_int_env("MKM_MAX_STRATEGY_LENGTH", 2000)
+    if len(strategy) > max_strategy_length:
+        raise RequestError(400, {"error": f"Strategy exceeds {max_strategy_length} characters"})
+
+    owned_characters = data.get("owned_characters")
+    if owned_characters is not None and not isinstance(owned_characters, list):
+        raise RequestError(400, {"error": "owned_characters must be an array of strings"})
+    model = data.get("model")  # optional model override
+    return {"strategy": strategy, "owned_characters": owned_characters, "model": model}
+
+
+async def route_suggest_team(data: dict) -> Dict:
+    """Validate a /suggest-team body and run it (cached, coalesced with identical in-flight requests)."""
+    args = _suggest_team_args(data)
+    return await _cached_response("/suggest-team", args, data, lambda: suggest_team_json(**args))
+
+
+def _ask_question_args(data: dict) -> Dict:
+    """Validate an /ask-question body into ask_question_json keyword arguments."""
+    question = data.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise RequestError(400, {"error": "Missing required field: question"})
+
+    max_question_length = _get_int_env("MKM_MAX_QUESTION_LENGTH", 2000)
+    if len(question) > max_question_length:
+        raise RequestError(400, {"error": f"Question exceeds {max_question_length} characters"})
+
+    model = data.get("model")  # optional model override
+    return {"question": question, "model": model}
+
+
+async def route_ask_question(data: dict) -> Dict:
+    """Validate an /ask-question body and run it (cached, coalesced with identical in-flight requests)."""
+    args = _ask_question_args(data)
+    return await _cached_response("/ask-question", args, data, lambda: ask_question_json(**args))
+
+
+def _explain_mechanic_args(data: dict) -> Dict:
+    """Validate an /explain-mechanic body into explain_mechanic_json keyword arguments."""
+    mechanic = data.get("mechanic")
+    if not isinstance(mechanic, str) or not mechanic.strip():
+        raise RequestError(400, {"error": "Missing required field: mechanic"})
+
+    mechanic = mechanic.strip()
+    max_len = _get_int_env("MKM_MAX_MECHANIC_LENGTH", _get_int_env("MKM_MAX_QUESTION_LENGTH", 2000))
+    if len(mechanic) > max_len:
+        raise RequestError(400, {"error": f"Mechanic exceeds {max_len} characters"})
+
+    model = data.get("model")
+    return {"mechanic": mechanic, "model": model}
+
+
+async def route_explain_mechanic(data: dict) -> Dict:
+    """Validate an /explain-mechanic body and run it (cached, coalesced with identical in-flight requests)."""
+    args = _explain_mechanic_args(data)
+    return await _cached_response("/explain-mechanic", args, data, lambda: explain_mechanic_json(**args))
+
+
+def _chat_args(data: dict) -> Dict:
+    """Validate a /chat body into chat_json keyword arguments."""
+    message = data.get("message")
+    if not isinstance(message, str) or not message.strip():
+        raise RequestError(400, {"error": "Missing required field: message"})
+
+    max_question_length = _get_int_env("MKM_MAX_QUESTION_LENGTH", 2000)
+    if len(message) > max_question_length:
+        raise RequestError(400, {"error": f"Message exceeds {max_question_length} characters"})
+
+    session_id = data.get("session_id")
+    if session_id is not None and (not isinstance(session_id, str) or not _SESSION_ID_PATTERN.match(session_id)):
+        raise RequestError(400, {"error": "session_id must be 16-128 letters, digits, '-' or '_'"})
+
+    # In session mode the server holds the history, so messages may be left out
+    messages = data.get("messages", [] if session_id else None)
+    if not isinstance(messages, list):
+        raise RequestError(400, {"error": "messages must be an array of {role, content}"})
+
+    summary_text = data.get("summary_text")
+    if summary_text is not None and not isinstance(summary_text, str):
+        raise RequestError(400, {"error": "summary_text must be a string"})
+
+    raw_summary_count = data.get("summary_message_count", 0)
+    try:
+        summary_message_count = int(raw_summary_count)
+    except (TypeError, ValueError):
+        raise RequestError(400, {"error": "summary_message_count must be an integer"})
+
+    model = data.get("model")
+    return {
+        "message": message.strip(),
+        "messages": messages,
+        "summary_text": summary_text,
+        "summary_message_count": summary_message_count,
+        "model": model,
+        "session_id": session_id,
+    }
+
+
+async def route_chat(data: dict) -> Dict:
+    """Validate a /chat body and answer it at chat priority."""
+    args = _chat_args(data)
+    return await _at_priority("/chat", lambda: chat_json(**args))
+
+
+# POST route -> (handler, expected payload shown when the body is missing)
+POST_ROUTES = {
+    "/suggest-team": (route_suggest_team, {"strategy": "string", "owned_characters": ["string"]}),
+    "/ask-question": (route_ask_question, {"question": "string"}),
+    "/explain-mechanic": (route_explain_mechanic, {"mechanic": "string"}),
+    "/chat": (
+        route_chat,
+        {
+            "message": "string",
+            "messages": "array of {role, content}",
+            "summary_text": "string (optional)",
+            "summary_message_count": "integer (optional)",
+            "model": "string (optional)",
+            "session_id": "string (optional)",
+        },
+    ),
+}
+
+
+def _result_status(result: Dict) -> int:
+    return 500 if "error" in result and "response" not in result else 200
+
+
+# POST routes that can answer with a stream of frames when the body sets "stream"
+STREAM_ROUTES = {
+    "/suggest-team": lambda data: _stream_at_priority(
+        "/suggest-team", suggest_team_stream(**_suggest_team_args(data))
+    ),
+    "/ask-question": lambda data: _stream_at_priority(
+        "/ask-question", ask_question_stream(**_ask_question_args(data))
+    ),
+    "/explain-mechanic": lambda data: _stream_at_priority(
+        "/explain-mechanic", explain_mechanic_stream(**_explain_mechanic_args(data))
+    ),
+    "/chat": lambda data: _stream_at_priority("/chat", chat_stream(**_chat_args(data))),
+}
+
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+class StreamResponse(NamedTuple):
+    """A started streaming answer: wire format, the first frame, the rest and the request deadline."""
+
+    format: str
+    first: Dict
+    frames: AsyncIterator[Dict]
+    deadline: Optional[float] = None
+
+
+def _stream_format(data: dict, accept: str) -> Optional[str]:
+    """"sse" / "ndjson" when the body opts into streaming, None for a plain JSON answer.
+
+    ``"stream": true`` picks Server-Sent Events when the Accept header asks
+    for text/event-stream and newline-delimited JSON otherwise.
+    """
+    requested = data.get("stream", False)
+    if requested is False or requested is None:
+        return None
+    if requested is True:
+        return "sse" if STREAM_MEDIA_TYPES["sse"] in (accept or "") else "ndjson"
+    if requested in STREAM_MEDIA_TYPES:
+        return requested
+    raise RequestError(400, {"error": 'stream must be true, false, "sse" or "ndjson"'})
+
+
+async def open_stream(path: str, data: dict, accept: str = "") -> Optional[StreamResponse]:
+    """Start a streamed answer for ``path`` if the body asked for one.
+
+    Waits for the first frame before anything is sent, so a request that
+    fails before its first token still gets an ordinary JSON error status.
+    """
+    if path not in STREAM_ROUTES:
+        return None
+    stream_format = _stream_format(data, accept)
+    if stream_format is None:
+        return None
+
+    frames = STREAM_ROUTES[path](data)
+    first = await next_frame(frames)
+    if first is None or first.get("type") == "error":
+        await frames.aclose()
+        raise RequestError(500, {"error": (first or {}).get("error", "Empty response from LLM")})
+    return StreamResponse(stream_format, first, frames, current_deadline())
+
+
+async def next_frame(frames: AsyncIterator[Dict], deadline: Optional[float] = None) -> Optional[Dict]:
+    """The next frame of a stream, or None once it is exhausted.
+
+    Past ``deadline`` (or when a stage runs out of time) the generation is
+    abandoned and an ``error`` frame ends the stream.
+    """
+    try:
+        if deadline is None:
+            return await anext(frames, None)
+        try:
+            return await asyncio.wait_for(
+                anext(frames, None), timeout=remaining(_get_http_timeout_seconds(), deadline)
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("request")
+    except DeadlineExceeded as e:
+        await frames.aclose()
+        return {"type": "error", "error": str(e)}
+
+
+def encode_stream_frame(frame: Dict, stream_format: str) -> bytes:
+    """Serialize one frame as an SSE event or one NDJSON line."""
+    payload = json.dumps(frame)
+    if stream_format == "sse":
+        return f"event: {frame.get('type', 'message')}\ndata: {payload}\n\n".encode()
+    return (payload + "\n").encode()
+
+
+class _SharedLoop:
+    """One long-lived event loop on a daemon thread for the threaded server.
+
+    Handler threads submit their coroutines here instead of creating and
+    closing a loop per request, so loop-bound resources (pooled clients,
+    in-flight futures) are shared across requests.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="mkm-http-loop", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro, cancel_if: Optional[Callable[[], bool]] = None):
+        """Run ``coro`` on the loop and wait for it.
+
+        With ``cancel_if``, the wait is polled: once it returns True the
+        coroutine is cancelled (which closes any in-flight Ollama request)
+        and ClientDisconnected is raised.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure())
+        if cancel_if is None:
+            return future.result()
+        while True:
+            done, _ = concurrent.futures.wait([future], timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return future.result()
+            if cancel_if():
+                future.cancel()
+                raise ClientDisconnected("Client disconnected")
+
+
+_shared_loop = _SharedLoop()
+
+
 class MKMobileHTTPHandler(BaseHTTPRequestHandler):
     """HTTP request handler for MK Mobile API"""
     
-    def _set_headers(self, status_code: int = 200, content_type: str = "application/json"):
+    def _set_headers(
+        self, status_code: int = 200, content_type: str = "application/json", extra_headers: List[Tuple[str, str]] = ()
+    ):
         self.send_response(status_code)
         self.send_header("Content-Type", content_type)
-
-        origin = self.headers.get("Origin", "")
-        configured_origins = os.getenv("MKM_CORS_ORIGINS", "*").strip()
-        if not configured_origins or configured_origins == "*":
-            allow_origin = "*"
-        else:
-            allowed = [item.strip() for item in configured_origins.split(",") if item.strip()]
-            allow_origin = origin if origin in allowed else (allowed[0] if allowed else "*")
-
-        api_key_header = os.getenv("MKM_API_KEY_HEADER", "X-API-Key")
-
-        self.send_header("Access-Control-Allow-Origin", allow_origin)
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", f"Content-Type, {api_key_header}")
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        for name, value in _cors_headers(self.headers.get("Origin", "")):
+            self.send_header(name, value)
         self.end_headers()
 
     @staticmethod
     def _get_int_env(name: str, default: int) -> int:
-        try:
-            value = int(os.getenv(name, str(default)))
-            return value if value > 0 else default
-        except ValueError:
-            return default
+        return _get_int_env(name, default)
 
     def _client_ip(self) -> str:
         return self.client_address[0] if self.client_address else "unknown"
 
-    def _check_api_auth(self) -> bool:
-        expected_key = os.getenv("MKM_API_KEY", "").strip()
-        if not expected_key:
+    def _client_disconnected(self) -> bool:
+        """True once the peer has closed its end: the socket is readable but has nothing to read."""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b""
+        except (OSError, ValueError):
             return True
 
-        header_name = os.getenv("MKM_API_KEY_HEADER", "X-API-Key")
-        provided_key = self.headers.get(header_name, "")
+    def _write_json(self, status: int, payload: Dict, indent: Optional[int] = None) -> None:
+        self._set_headers(status, extra_headers=_status_headers(payload))
+        self.wfile.write(json.dumps(payload, indent=indent).encode())
 
-        if not provided_key or not hmac.compare_digest(provided_key, expected_key):
-            logger.warning("Unauthorized API request from %s", self._client_ip())
-            self._set_headers(401)
-            self.wfile.write(json.dumps({"error": "Unauthorized"}).encode())
+    def _check_api_auth(self) -> bool:
+        header_name = os.getenv("MKM_API_KEY_HEADER", "X-API-Key")
+        try:
+            _check_api_key(self.headers.get(header_name, ""), self._client_ip())
+        except RequestError as e:
+            self._write_json(e.status, e.payload)
             return False
-
         return True
 
     def _check_rate_limit(self) -> bool:
-        enabled = os.getenv("MKM_RATE_LIMIT_ENABLED", "true").lower() == "true"
-        if not enabled:
-            return True
-
-        per_minute_limit = self._get_int_env("MKM_RATE_LIMIT_PER_MINUTE", 20)
-        burst_limit = self._get_int_env("MKM_RATE_LIMIT_BURST", 5)
-        burst_window = self._get_int_env("MKM_RATE_LIMIT_BURST_WINDOW_SECONDS", 10)
-
-        now = monotonic()
-        ip = self._client_ip()
-
-        minute_queue = _IP_REQUESTS[ip]
-        while minute_queue and now - minute_queue[0] > 60:
-            minute_queue.popleft()
-
-        burst_queue = _IP_BURST_REQUESTS[ip]
-        while burst_queue and now - burst_queue[0] > burst_window:
-            burst_queue.popleft()
-
-        if len(minute_queue) >= per_minute_limit or len(burst_queue) >= burst_limit:
-            logger.warning("Rate limit exceeded for %s", ip)
-            self._set_headers(429)
-            self.wfile.write(json.dumps({"error": "Too many requests"}).encode())
+        try:
+            _check_rate_limit(_rate_limit_key(self._client_ip(), self.headers.get))
+        except RequestError as e:
+            self._write_json(e.status, e.payload)
             return False
-
-        minute_queue.append(now)
-        burst_queue.append(now)
         return True
 
     def _read_json_body(self, expected_payload: dict) -> Optional[dict]:
-        content_length = int(self.headers.get("Content-Length", 0))
-
-        if content_length == 0:
-            self._set_headers(400)
-            self.wfile.write(json.dumps({
-                "error": "Request body required",
-                "expected": expected_payload,
-            }).encode())
-            return None
-
-        max_request_size = self._get_int_env("MKM_MAX_REQUEST_SIZE", 1048576)
-        if content_length > max_request_size:
-            self._set_headers(413)
-            self.wfile.write(json.dumps({"error": "Request body too large"}).encode())
-            return None
-
-        body = self.rfile.read(content_length)
         try:
-            return json.loads(body.decode("utf-8"))
-        except json.JSONDecodeError:
-            self._set_headers(400)
-            self.wfile.write(json.dumps({"error": "Invalid JSON"}).encode())
+            content_length = int(self.headers.get("Content-Length", 0))
+            _check_content_length(content_length, expected_payload)
+            return _parse_json_body(self.rfile.read(content_length))
+        except RequestError as e:
+            self._write_json(e.status, e.payload)
             return None
     
     def do_OPTIONS(self):
@@ -1484,61 +2910,17 @@ class MKMobileHTTPHandler(BaseHTTPRequestHandler):
         
         if parsed_path.path == "/":
             # Health check / info endpoint
-            self._set_headers(200)
-            response = {
-                "service": "MK Mobile Assistant API",
-                "version": "2.3.0",
-                "endpoints": {
-                    "/suggest-team": {
-                        "method": "POST",
-                        "description": "Get AI-powered team suggestions",
-                        "body": {
-                            "strategy": "string (required)",
-                            "owned_characters": "array of strings (optional)",
-                            "model": "string (optional, Ollama model tag e.g. 'llama3.2:3b')"
-                        }
-                    },
-                    "/ask-question": {
-                        "method": "POST",
-                        "description": "Ask any question about MK Mobile, returns Markdown text",
-                        "body": {
-                            "question": "string (required)",
-                            "model": "string (optional, Ollama model tag)"
-                        }
-                    },
-                    "/explain-mechanic": {
-                        "method": "POST",
-                        "description": "Explain a game mechanic using RAG + local LLM",
-                        "body": {
-                            "mechanic": "string (required)",
-                            "model": "string (optional, Ollama model tag)"
-                        }
-                    },
-                    "/chat": {
-                        "method": "POST",
-                        "description": "Persistent chat turn with RAG + compact history context",
-                        "body": {
-                            "message": "string (required)",
-                            "messages": "array of {role, content} (required)",
-                            "summary_text": "string (optional)",
-                            "summary_message_count": "integer (optional)",
-                            "model": "string (optional, Ollama model tag)"
-                        }
-                    },
-                    "/health": {
-                        "method": "GET",
-                        "description": "Detailed health / status of RAG system, LLM, and data cache"
-                    }
-                }
-            }
-            self.wfile.write(json.dumps(response, indent=2).encode())
+            self._write_json(200, _api_info(), indent=2)
         elif parsed_path.path == "/health":
             if not self._check_api_auth():
                 return
             self._handle_health()
+        elif parsed_path.path == "/admin/reindex":
+            if not self._check_api_auth():
+                return
+            self._handle_reindex(start=False)
         else:
-            self._set_headers(404)
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
+            self._write_json(404, {"error": "Not found"})
     
     def do_POST(self):
         """Handle POST requests"""
@@ -1550,17 +2932,12 @@ class MKMobileHTTPHandler(BaseHTTPRequestHandler):
         if not self._check_api_auth():
             return
         
-        if parsed_path.path == "/suggest-team":
-            self._handle_suggest_team()
-        elif parsed_path.path == "/ask-question":
-            self._handle_ask_question()
-        elif parsed_path.path == "/explain-mechanic":
-            self._handle_explain_mechanic()
-        elif parsed_path.path == "/chat":
-            self._handle_chat()
+        if parsed_path.path in POST_ROUTES:
+            self._handle_route(parsed_path.path)
+        elif parsed_path.path == "/admin/reindex":
+            self._handle_reindex(start=True)
         else:
-            self._set_headers(404)
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
+            self._write_json(404, {"error": "Not found"})
 
     # ------------------------------------------------------------------
     # GET /health
@@ -1569,291 +2946,123 @@ class MKMobileHTTPHandler(BaseHTTPRequestHandler):
     def _handle_health(self):
         """Return detailed health / observability information."""
         try:
-            rag = get_rag_system()
-            rag_status = rag.get_status() if rag.enabled else {"enabled": False}
-
-            # Check Ollama reachability (quick connect test)
-            from mkmchat.llm.ollama import get_ollama_assistant
-            assistant = get_ollama_assistant(rag_system=rag)
-            llm_status = {
-                "enabled": assistant.enabled,
-                "model": getattr(assistant, "model_name", None),
-                "base_url": getattr(assistant, "base_url", None),
-            }
-
-            # Document-type breakdown
-            doc_breakdown = {}
-            if rag.enabled:
-                for doc in rag.documents:
-                    doc_breakdown[doc.doc_type] = doc_breakdown.get(doc.doc_type, 0) + 1
-
-            health = {
-                "status": "ok" if rag.enabled and assistant.enabled else "degraded",
-                "rag": {**rag_status, "documents_by_type": doc_breakdown},
-                "llm": llm_status,
-            }
-
-            self._set_headers(200)
-            self.wfile.write(json.dumps(health, indent=2).encode())
+            self._write_json(200, _health_payload(), indent=2)
         except BrokenPipeError:
             logger.warning("Client disconnected before /health response could be written")
         except Exception as e:
             logger.error(f"Error handling /health: {e}")
             try:
-                self._set_headers(500)
-                self.wfile.write(json.dumps({"status": "error", "detail": str(e)}).encode())
+                self._write_json(500, {"status": "error", "detail": str(e)})
             except BrokenPipeError:
                 logger.warning("Client disconnected before /health error response could be written")
-    
-    def _handle_suggest_team(self):
-        """Handle /suggest-team endpoint"""
-        try:
-            data = self._read_json_body({"strategy": "string", "owned_characters": ["optional", "array"]})
-            if data is None:
-                return
-            
-            # Validate required fields
-            strategy = data.get("strategy")
-            if not isinstance(strategy, str) or not strategy.strip():
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": "Missing required field: strategy"
-                }).encode())
-                return
 
-            max_strategy_length = self._get_int_env("MKM_MAX_STRATEGY_LENGTH", 2000)
-            if len(strategy) > max_strategy_length:
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": f"Strategy exceeds {max_strategy_length} characters"
-                }).encode())
-                return
-            
-            owned_characters = data.get("owned_characters")
-            if owned_characters is not None and not isinstance(owned_characters, list):
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": "owned_characters must be an array of strings"
-                }).encode())
-                return
-            model = data.get("model")  # optional model override
-            
-            # Run async function
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            try:
-                result = loop.run_until_complete(
-                    suggest_team_json(strategy, owned_characters, model=model)
-                )
-            finally:
-                loop.close()
-            
-            # Check for errors
-            if "error" in result and "response" not in result:
-                self._set_headers(500)
-            else:
-                self._set_headers(200)
-            
-            self.wfile.write(json.dumps(result, indent=2).encode())
-            
-        except Exception as e:
-            logger.error(f"Error handling suggest-team: {e}")
-            self._set_headers(500)
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
-    
-    def _handle_ask_question(self):
-        """Handle /ask-question endpoint"""
-        try:
-            data = self._read_json_body({"question": "string"})
-            if data is None:
-                return
-
-            question = data.get("question")
-            if not isinstance(question, str) or not question.strip():
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": "Missing required field: question"
-                }).encode())
-                return
-
-            max_question_length = self._get_int_env("MKM_MAX_QUESTION_LENGTH", 2000)
-            if len(question) > max_question_length:
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": f"Question exceeds {max_question_length} characters"
-                }).encode())
-                return
-
-            model = data.get("model")  # optional model override
+    # ------------------------------------------------------------------
+    # GET/POST /admin/reindex
+    # ------------------------------------------------------------------
 
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+    def _handle_reindex(self, start: bool):
+        """Start a background re-index (POST) or report its progress (GET)."""
+        try:
+            status, payload = _reindex_payload(start)
+            self._write_json(status, payload)
+        except RequestError as e:
+            self._write_json(e.status, e.payload)
+        except BrokenPipeError:
+            logger.warning("Client disconnected before /admin/reindex response could be written")
+        except Exception as e:
+            logger.error(f"Error handling /admin/reindex: {e}")
             try:
-                result = loop.run_until_complete(ask_question_json(question, model=model))
-            finally:
-                loop.close()
-
-            if "error" in result and "response" not in result:
-                self._set_headers(500)
-            else:
-                self._set_headers(200)
-
-            self.wfile.write(json.dumps(result, indent=2).encode())
+                self._write_json(500, {"error": str(e)})
+            except BrokenPipeError:
+                logger.warning("Client disconnected before /admin/reindex error response could be written")
 
-        except Exception as e:
-            logger.error(f"Error handling ask-question: {e}")
-            self._set_headers(500)
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
+    # ------------------------------------------------------------------
+    # POST /suggest-team, /ask-question, /explain-mechanic, /chat
+    # ------------------------------------------------------------------
 
-    def _handle_explain_mechanic(self):
-        """Handle /explain-mechanic endpoint"""
+    def _handle_route(self, path: str):
+        """Read the JSON body, run the route coroutine on the shared loop, write the result."""
+        route, expected_payload = POST_ROUTES[path]
         try:
-            data = self._read_json_body({"mechanic": "string"})
+            data = self._read_json_body(expected_payload)
             if data is None:
                 return
-
-            mechanic = data.get("mechanic")
-            if not isinstance(mechanic, str) or not mechanic.strip():
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": "Missing required field: mechanic"
-                }).encode())
-                return
-
-            mechanic = mechanic.strip()
-            max_len = self._get_int_env("MKM_MAX_MECHANIC_LENGTH", self._get_int_env("MKM_MAX_QUESTION_LENGTH", 2000))
-            if len(mechanic) > max_len:
-                self._set_headers(400)
-                self.wfile.write(json.dumps({
-                    "error": f"Mechanic exceeds {max_len} characters"
-                }).encode())
+            client = self._client_ip()
+            timeout_header = self.headers.get(DEADLINE_HEADER)
+            stream = _shared_loop.run(
+                with_client(
+                    client,
+                    run_with_deadline(timeout_header, open_stream(path, data, self.headers.get("Accept", ""))),
+                ),
+                cancel_if=self._client_disconnected,
+            )
+            if stream is not None:
+                self._write_stream(stream)
                 return
-
-            model = data.get("model")
-
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                result = loop.run_until_complete(explain_mechanic_json(mechanic, model=model))
-            finally:
-                loop.close()
-
-            if "error" in result and "response" not in result:
-                self._set_headers(500)
-            else:
-                self._set_headers(200)
-
-            try:
-                self.wfile.write(json.dumps(result, indent=2).encode())
-            except BrokenPipeError:
-                logger.warning("Client disconnected before /explain-mechanic response could be written")
-
+            result = _shared_loop.run(
+                with_client(client, run_with_deadline(timeout_header, route(data))),
+                cancel_if=self._client_disconnected,
+            )
+            self._write_json(_result_status(result), result, indent=2)
+        except RequestError as e:
+            self._write_json(e.status, e.payload)
+        except ClientDisconnected:
+            logger.warning(f"Client disconnected during {path}; cancelled its generation")
         except BrokenPipeError:
-            logger.warning("Client disconnected during /explain-mechanic handling")
-
+            logger.warning(f"Client disconnected before {path} response could be written")
         except Exception as e:
-            logger.error(f"Error handling explain-mechanic: {e}")
+            logger.error(f"Error handling {path}: {e}")
             try:
-                self._set_headers(500)
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
+                self._write_json(500, {"error": str(e)})
             except BrokenPipeError:
-                logger.warning("Client disconnected before /explain-mechanic error response could be written")
+                logger.warning(f"Client disconnected before {path} error response could be written")
 
-    def _handle_chat(self):
-        """Handle /chat endpoint"""
+    def _write_stream(self, stream: StreamResponse) -> None:
+        """Relay stream frames as they arrive; the connection closes at the end of the stream."""
         try:
-            data = self._read_json_body(
-                {
-                    "message": "string",
-                    "messages": "array of {role, content}",
-                    "summary_text": "string (optional)",
-                    "summary_message_count": "integer (optional)",
-                    "model": "string (optional)",
-                }
-            )
-            if data is None:
-                return
-
-            message = data.get("message")
-            if not isinstance(message, str) or not message.strip():
-                self._set_headers(400)
-                self.wfile.write(json.dumps({"error": "Missing required field: message"}).encode())
-                return
-
-            max_question_length = self._get_int_env("MKM_MAX_QUESTION_LENGTH", 2000)
-            if len(message) > max_question_length:
-                self._set_headers(400)
-                self.wfile.write(
-                    json.dumps({"error": f"Message exceeds {max_question_length} characters"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", STREAM_MEDIA_TYPES[stream.format])
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("X-Accel-Buffering", "no")
+            for name, value in _cors_headers(self.headers.get("Origin", "")):
+                self.send_header(name, value)
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            frame = stream.first
+            while frame is not None:
+                self.wfile.write(encode_stream_frame(frame, stream.format))
+                self.wfile.flush()
+                if frame.get("type") == "error":
+                    break  # an error frame always ends the stream
+                frame = _shared_loop.run(
+                    next_frame(stream.frames, stream.deadline), cancel_if=self._client_disconnected
                 )
-                return
-
-            messages = data.get("messages")
-            if not isinstance(messages, list):
-                self._set_headers(400)
-                self.wfile.write(
-                    json.dumps({"error": "messages must be an array of {role, content}"}).encode()
-                )
-                return
-
-            summary_text = data.get("summary_text")
-            if summary_text is not None and not isinstance(summary_text, str):
-                self._set_headers(400)
-                self.wfile.write(json.dumps({"error": "summary_text must be a string"}).encode())
-                return
-
-            raw_summary_count = data.get("summary_message_count", 0)
-            try:
-                summary_message_count = int(raw_summary_count)
-            except (TypeError, ValueError):
-                self._set_headers(400)
-                self.wfile.write(
-                    json.dumps({"error": "summary_message_count must be an integer"}).encode()
-                )
-                return
-
-            model = data.get("model")
-
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                result = loop.run_until_complete(
-                    chat_json(
-                        message=message.strip(),
-                        messages=messages,
-                        summary_text=summary_text,
-                        summary_message_count=summary_message_count,
-                        model=model,
-                    )
-                )
-            finally:
-                loop.close()
-
-            if "error" in result and "response" not in result:
-                self._set_headers(500)
-            else:
-                self._set_headers(200)
-
-            self.wfile.write(json.dumps(result, indent=2).encode())
-
-        except Exception as e:
-            logger.error(f"Error handling chat: {e}")
-            self._set_headers(500)
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
+        finally:
+            # Stops the upstream Ollama request early if the client went away
+            _shared_loop.run(stream.frames.aclose())
 
     def log_message(self, format, *args):
         """Override to use logging module"""
         logger.info(f"{self.address_string()} - {format % args}")
 
 
-def run_server(port: int = DEFAULT_PORT):
-    """Run the HTTP server"""
-    host = os.getenv("MKM_HTTP_HOST", "127.0.0.1")
+def require_api_key() -> None:
+    """Refuse to start a server without a real MKM_API_KEY."""
     api_key = os.getenv("MKM_API_KEY", "").strip()
     if not api_key or api_key in {"change-me-in-production", "replace-with-long-random-secret"}:
         raise RuntimeError("Refusing to start: set MKM_API_KEY to a strong non-placeholder value")
 
+
+def run_server(port: int = DEFAULT_PORT):
+    """Run the HTTP server"""
+    host = os.getenv("MKM_HTTP_HOST", "127.0.0.1")
+    require_api_key()
+
+    # Load the model and the (prebuilt) index before accepting requests
+    get_rag_system()
+
     server_address = (host, port)
     httpd = ThreadingHTTPServer(server_address, MKMobileHTTPHandler)
     httpd.daemon_threads = True
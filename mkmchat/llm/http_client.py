@@ -0,0 +1,147 @@
+"""Shared, pooled httpx.AsyncClient instances for Ollama traffic"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from mkmchat.deadline import DeadlineExceeded
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# event loop -> base URL -> client. A client's connections belong to the loop
+# that opened them, so pools are per loop and vanish with their loop.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        value = int(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        value = float(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+def _use_http2(base_url: str) -> bool:
+    """HTTP/2 needs the h2 package and TLS (ALPN); plain http:// Ollama stays on HTTP/1.1."""
+    setting = os.getenv("MKM_OLLAMA_HTTP2", "auto").strip().lower()
+    if setting in {"false", "0", "off"} or not HTTP2_AVAILABLE:
+        return False
+    return base_url.lower().startswith("https://")
+
+
+def _new_client(base_url: str) -> "httpx.AsyncClient":
+    limits = httpx.Limits(
+        max_connections=_env_int("MKM_OLLAMA_MAX_CONNECTIONS", 32),
+        max_keepalive_connections=_env_int("MKM_OLLAMA_MAX_KEEPALIVE_CONNECTIONS", 16),
+        keepalive_expiry=_env_float("MKM_OLLAMA_KEEPALIVE_EXPIRY_SECONDS", 60.0),
+    )
+    return httpx.AsyncClient(limits=limits, http2=_use_http2(base_url))
+
+
+def get_client(base_url: str) -> "httpx.AsyncClient":
+    """Return the pooled client for ``base_url`` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    key = base_url.rstrip("/")
+    per_loop = _clients.setdefault(loop, {})
+    client = per_loop.get(key)
+    if client is None or getattr(client, "is_closed", False):
+        client = _new_client(key)
+        per_loop[key] = client
+    return client
+
+
+@asynccontextmanager
+async def ollama_client(base_url: str) -> AsyncIterator["httpx.AsyncClient"]:
+    """``async with`` access to the pooled client; leaving the block keeps it open."""
+    yield get_client(base_url)
+
+
+async def aclose_clients() -> None:
+    """Close every pooled client opened on the running loop (call at shutdown)."""
+    per_loop = _clients.pop(asyncio.get_running_loop(), {})
+    for client in per_loop.values():
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled HTTP client: {e}")
+
+
+class OllamaStreamError(Exception):
+    """Ollama rejected a streamed request or reported an error mid-stream."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, detail: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def stream_completion(
+    base_url: str, path: str, request_body: Dict, *, timeout: float
+) -> AsyncIterator[str]:
+    """POST to an Ollama generation endpoint with streaming on and yield text deltas.
+
+    Reads both /api/chat (``message.content``) and /api/generate
+    (``response``) chunks. Closing the generator early closes the
+    connection, which makes Ollama stop generating. ``timeout`` bounds the
+    whole generation, not just each read: once it has passed,
+    DeadlineExceeded is raised and the connection is dropped.
+    """
+    base_url = base_url.rstrip("/")
+    stop_at = time.monotonic() + timeout
+    async with ollama_client(base_url) as client:
+        async with client.stream(
+            "POST", f"{base_url}{path}", json={**request_body, "stream": True}, timeout=timeout
+        ) as response:
+            if response.status_code != 200:
+                detail = ""
+                try:
+                    detail = (await response.aread()).decode("utf-8", "replace").strip()
+                    detail = str(json.loads(detail).get("error", detail))
+                except Exception:
+                    pass
+                raise OllamaStreamError(
+                    f"Ollama API returned status {response.status_code}",
+                    status_code=response.status_code,
+                    detail=detail,
+                )
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                if time.monotonic() > stop_at:
+                    raise DeadlineExceeded("generation")
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise OllamaStreamError(f"Ollama Error: {chunk['error']}", detail=str(chunk["error"]))
+                delta = (chunk.get("message") or {}).get("content") or chunk.get("response") or ""
+                if delta:
+                    yield delta
+                if chunk.get("done"):
+                    return
@@ -0,0 +1,117 @@
+"""Incremental parser for a JSON object that arrives as a token stream"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class IncrementalJSONObject:
+    """Find the first complete top-level JSON object in streamed text.
+
+    Text before the object (``<think>...</think>`` blocks, code fences,
+    chatter) is skipped. Each top-level field is reported by ``feed`` as soon
+    as its value closes, and ``value`` is set once the whole object has
+    arrived and ``accept`` (if given) approves it. A rejected or malformed
+    object is dropped and scanning continues with the next one, so callers
+    can stop the generation as soon as ``done`` is true and fall back to
+    repairing ``text`` otherwise.
+    """
+
+    def __init__(self, accept: Optional[Callable[[Dict], bool]] = None):
+        self.text = ""
+        self.value: Optional[Dict] = None
+        self._accept = accept
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._reported: set = set()
+
+    @property
+    def done(self) -> bool:
+        return self.value is not None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume more text; returns the (key, value) fields completed by it."""
+        self.text += chunk
+        text = self.text
+        fields: List[Tuple[str, Any]] = []
+        i = self._pos
+        while i < len(text) and self.value is None:
+            if self._start is None:
+                i = self._seek_object(i)
+                if self._start is None:
+                    break
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    fields.extend(self._close_object(text[self._start:i + 1]))
+            elif ch == "," and self._depth == 1:
+                fields.extend(self._new_fields(text[self._start:i] + "}"))
+            i += 1
+        self._pos = i
+        return fields
+
+    def _seek_object(self, i: int) -> int:
+        """Skip to the next '{' outside a think block; returns the scan position."""
+        text = self.text
+        while True:
+            brace = text.find("{", i)
+            think = text.find(THINK_OPEN, i)
+            if think != -1 and (brace == -1 or think < brace):
+                close = text.find(THINK_CLOSE, think + len(THINK_OPEN))
+                if close == -1:
+                    return think  # wait for the rest of the block
+                i = close + len(THINK_CLOSE)
+                continue
+            if brace == -1:
+                # Keep a possibly split "<think" tag in view for the next chunk
+                return max(i, len(text) - len(THINK_OPEN) + 1)
+            self._start = brace
+            self._depth = 0
+            self._in_string = False
+            self._escape = False
+            return brace
+
+    @staticmethod
+    def _parse(candidate: str) -> Optional[Dict]:
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            return None
+        return obj if isinstance(obj, dict) else None
+
+    def _report(self, obj: Optional[Dict]) -> List[Tuple[str, Any]]:
+        if obj is None:
+            return []
+        fields = [(key, value) for key, value in obj.items() if key not in self._reported]
+        self._reported.update(key for key, _ in fields)
+        return fields
+
+    def _new_fields(self, candidate: str) -> List[Tuple[str, Any]]:
+        return self._report(self._parse(candidate))
+
+    def _close_object(self, candidate: str) -> List[Tuple[str, Any]]:
+        obj = self._parse(candidate)
+        fields = self._report(obj)
+        if obj is not None and (self._accept is None or self._accept(obj)):
+            self.value = obj
+        else:
+            self._start = None
+            self._reported = set()
+        return fields
@@ -1,10 +1,13 @@
 """Ollama local LLM integration for intelligent game querying"""
 
+import asyncio
 import hashlib
 import os
 import re
 import logging
-from typing import Optional, Dict, Any, List
+import time
+from contextlib import aclosing
+from typing import Optional, Dict, Any, AsyncIterator, List, Tuple
 import json
 
 try:
@@ -15,6 +18,10 @@ except ImportError:
     httpx = None
 
 from mkmchat.data.loader import DataLoader
+from mkmchat.deadline import DeadlineExceeded, remaining, stage_timeout, within
+from mkmchat.llm.http_client import OllamaStreamError, ollama_client, stream_completion
+from mkmchat.llm.json_stream import IncrementalJSONObject
+from mkmchat.llm.scheduler import SchedulerRejected, generation_slot
 from mkmchat.data.rag import RAGSystem
 
 logger = logging.getLogger(__name__)
@@ -42,6 +49,17 @@ def _http_timeout_seconds(default: int = 120) -> int:
         return default
 
 
+# How long a failed /api/tags lookup is remembered before Ollama is asked again
+_MODELS_FAILURE_TTL_SECONDS = 5.0
+
+
+def _models_ttl_seconds(default: float = 30.0) -> float:
+    try:
+        return max(0.0, float(os.getenv("MKM_OLLAMA_MODELS_TTL_SECONDS", str(default))))
+    except ValueError:
+        return default
+
+
 class OllamaAssistant:
     """Ollama-powered assistant for MK Mobile game queries"""
     
@@ -70,6 +88,7 @@ class OllamaAssistant:
         self.model_name = model_name or os.getenv("OLLAMA_MODEL", "llama3.2:3b")
         self.data_loader = data_loader or DataLoader()
         self.rag_system = rag_system
+        self._models_cache: Optional[Tuple[float, List[str]]] = None  # (expires at, model tags)
         
         # Check if Ollama is running
         self.enabled = self._check_ollama()
@@ -146,16 +165,28 @@ class OllamaAssistant:
             logger.error(f"Error checking model availability: {e}")
 
     def _list_available_models(self) -> List[str]:
-        """Return model tags currently available in Ollama."""
+        """Return model tags currently available in Ollama.
+
+        Successful lookups are reused for MKM_OLLAMA_MODELS_TTL_SECONDS
+        (default 30) so resolving a model name per request stays cheap;
+        failed ones for at most _MODELS_FAILURE_TTL_SECONDS.
+        """
+        now = time.monotonic()
+        if self._models_cache is not None and now < self._models_cache[0]:
+            return list(self._models_cache[1])
+        ttl = _models_ttl_seconds()
         try:
             response = httpx.get(f"{self.base_url}/api/tags", timeout=5.0)
-            if response.status_code != 200:
-                return []
-            data = response.json()
-            return [m.get("name", "") for m in data.get("models", []) if m.get("name")]
+            if response.status_code == 200:
+                data = response.json()
+                models = [m.get("name", "") for m in data.get("models", []) if m.get("name")]
+                self._models_cache = (now + ttl, models)
+                return list(models)
         except Exception as e:
             logger.debug(f"Unable to list Ollama models: {e}")
-            return []
+        # Keep a slow or unreachable Ollama from being asked again on every request
+        self._models_cache = (now + min(ttl, _MODELS_FAILURE_TTL_SECONDS), [])
+        return []
 
     def _resolve_model_name(self, requested_model: Optional[str]) -> str:
         """
@@ -316,7 +347,7 @@ Answer in the user's language.
 Answer:"""
             
             # Generate response
-            async with httpx.AsyncClient() as client:
+            async with ollama_client(self.base_url) as client:
                 response = await client.post(
                     f"{self.base_url}/api/generate",
                     json={
@@ -387,7 +418,7 @@ Provide a detailed comparison covering:
 Answer:"""
         
         try:
-            async with httpx.AsyncClient() as client:
+            async with ollama_client(self.base_url) as client:
                 response = await client.post(
                     f"{self.base_url}/api/generate",
                     json={
@@ -455,7 +486,7 @@ IMPORTANT: You MUST suggest specific equipment items from the available equipmen
 Answer:"""
         
         try:
-            async with httpx.AsyncClient() as client:
+            async with ollama_client(self.base_url) as client:
                 response = await client.post(
                     f"{self.base_url}/api/generate",
                     json={
@@ -530,20 +561,40 @@ Answer:"""
             "equipment": 0.20,
         }
 
+        doc_types = ["gameplay", "glossary", "character", "equipment"]
+        queries = dedup_variants or [mechanic]
+        search_many = getattr(self.rag_system, "search_many", None)
+        if search_many is not None:
+            # One batched encode for every variant, one matrix product for every doc type
+            hits_by_type = search_many(
+                queries,
+                doc_types,
+                top_k=per_type_top_k,
+                min_similarity=per_type_min_similarity,
+            )
+        else:
+            hits_by_type = {
+                doc_type: [
+                    hit
+                    for variant in queries
+                    for hit in self.rag_system.search(
+                        variant,
+                        top_k=per_type_top_k[doc_type],
+                        doc_type=doc_type,
+                        min_similarity=per_type_min_similarity[doc_type],
+                    )
+                ]
+                for doc_type in doc_types
+            }
+
         results_pool: Dict[str, Tuple[object, float]] = {}
-        for variant in (dedup_variants or [mechanic]):
-            for doc_type in ["gameplay", "glossary", "character", "equipment"]:
-                for doc, score in self.rag_system.search(
-                    variant,
-                    top_k=per_type_top_k[doc_type],
-                    doc_type=doc_type,
-                    min_similarity=per_type_min_similarity[doc_type],
-                ):
-                    digest = hashlib.sha256(doc.content.strip().encode("utf-8")).hexdigest()
-                    key = f"{doc.doc_type}:{digest}"
-                    existing = results_pool.get(key)
-                    if not existing or score > existing[1]:
-                        results_pool[key] = (doc, score)
+        for doc_type in doc_types:
+            for doc, score in hits_by_type.get(doc_type, []):
+                digest = hashlib.sha256(doc.content.strip().encode("utf-8")).hexdigest()
+                key = f"{doc.doc_type}:{digest}"
+                existing = results_pool.get(key)
+                if not existing or score > existing[1]:
+                    results_pool[key] = (doc, score)
 
         results = sorted(
             results_pool.values(),
@@ -737,11 +788,44 @@ Answer:"""
             On success: {"definition": str, "recommendations": str}
             On failure: {"error": str}
         """
+        result: Dict[str, Any] = {"error": "Empty definition and recommendations from model"}
+        async for frame in self.explain_mechanic_stream(mechanic, model=model):
+            if frame["type"] == "done":
+                result = frame["response"]
+            elif frame["type"] == "error":
+                result = {"error": frame["error"]}
+        return result
+
+    @staticmethod
+    def _mechanic_field_name(key: str) -> Optional[str]:
+        lowered = key.lower()
+        if lowered == "definition":
+            return "definition"
+        if lowered in ("recommendations", "recommendation"):
+            return "recommendations"
+        return None
+
+    async def explain_mechanic_stream(
+        self,
+        mechanic: str,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a mechanic explanation as frames.
+
+        ``field`` frames carry ``definition`` / ``recommendations`` as soon as
+        each JSON value closes; generation stops once a complete object with
+        those keys has arrived. Ends with a ``done`` frame whose ``response``
+        is what explain_mechanic returns, or an ``error`` frame.
+        """
         if not self.enabled:
-            return {"error": "Ollama assistant not available."}
+            yield {"type": "error", "error": "Ollama assistant not available."}
+            return
 
-        use_model = self._resolve_model_name(model)
-        context = self._build_mechanic_rag_context(mechanic)
+        use_model = await asyncio.to_thread(self._resolve_model_name, model)
+        context = await within(
+            "retrieval", asyncio.to_thread(self._build_mechanic_rag_context, mechanic), _http_timeout_seconds()
+        )
 
         system_prompt = f"""{self.system_context}
 
@@ -763,15 +847,18 @@ Respond with ONLY valid JSON (no markdown code fences, no text before or after t
 
 Produce the JSON for this mechanic."""
 
+        parser = IncrementalJSONObject(
+            accept=lambda obj: self._dict_to_definition_recommendations(obj) is not None
+        )
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
+            async with generation_slot(remaining(_http_timeout_seconds())), aclosing(
+                stream_completion(
+                    self.base_url,
+                    "/api/generate",
+                    {
                         "model": use_model,
                         "system": system_prompt,
                         "prompt": user_prompt,
-                        "stream": False,
                         "format": "json",
                         "keep_alive": "10m",
                         "options": {
@@ -779,46 +866,52 @@ Produce the JSON for this mechanic."""
                             "num_predict": int(os.getenv("MKM_MECHANIC_NUM_PREDICT", "1200")),
                         },
                     },
-                    timeout=_http_timeout_seconds(),
+                    timeout=stage_timeout("generation", _http_timeout_seconds()),
                 )
-
-                self._log_debug_interaction("EXPLAIN_MECHANIC", system_prompt, user_prompt, response.text)
-                
-                if response.status_code != 200:
-                    detail = ""
-                    try:
-                        detail = str(response.json().get("error", "")).strip()
-                    except Exception:
-                        detail = (response.text or "").strip()
-                    detail = re.sub(r"\s+", " ", detail)[:300]
-                    if detail:
-                        return {
-                            "error": f"Ollama API returned status {response.status_code}: {detail}"
-                        }
-                    return {"error": f"Ollama API returned status {response.status_code}"}
-
-                result = response.json()
-                raw = (result.get("response") or "").strip()
+            ) as deltas:
+                async for delta in deltas:
+                    for key, value in parser.feed(delta):
+                        name = self._mechanic_field_name(key)
+                        if name:
+                            yield {"type": "field", "name": name, "value": self._coerce_mechanic_value(value)}
+                    if parser.done:
+                        break  # leaving the stream stops the remaining generation
+
+            raw = parser.text.strip()
+            self._log_debug_interaction("EXPLAIN_MECHANIC", system_prompt, user_prompt, raw)
+
+            if parser.done:
+                parsed = self._dict_to_definition_recommendations(parser.value)
+            else:
                 parsed = self._parse_mechanic_json(raw)
-                if parsed is None:
-                    preview = re.sub(r"\s+", " ", raw[:300]) if raw else ""
-                    logger.warning(
-                        "explain_mechanic: parse failed for model=%s, raw_preview=%s",
-                        use_model,
-                        preview,
-                    )
-                    return {
-                        "error": "Model response could not be parsed into mechanic sections.",
-                    }
-
-                parsed["definition"] = parsed["definition"].strip()
-                parsed["recommendations"] = parsed["recommendations"].strip()
-
-                if not parsed["definition"] and not parsed["recommendations"]:
-                    return {"error": "Empty definition and recommendations from model"}
-
-                return parsed
-
+            if parsed is None:
+                preview = re.sub(r"\s+", " ", raw[:300]) if raw else ""
+                logger.warning(
+                    "explain_mechanic: parse failed for model=%s, raw_preview=%s",
+                    use_model,
+                    preview,
+                )
+                yield {"type": "error", "error": "Model response could not be parsed into mechanic sections."}
+                return
+
+            parsed["definition"] = parsed["definition"].strip()
+            parsed["recommendations"] = parsed["recommendations"].strip()
+
+            if not parsed["definition"] and not parsed["recommendations"]:
+                yield {"type": "error", "error": "Empty definition and recommendations from model"}
+                return
+
+            yield {"type": "done", "response": parsed}
+
+        except OllamaStreamError as e:
+            self._log_debug_interaction("EXPLAIN_MECHANIC", system_prompt, user_prompt, str(e))
+            detail = re.sub(r"\s+", " ", e.detail)[:300]
+            if e.status_code is not None and detail:
+                yield {"type": "error", "error": f"{e}: {detail}"}
+            else:
+                yield {"type": "error", "error": str(e)}
+        except (DeadlineExceeded, SchedulerRejected):
+            raise
         except Exception as e:
             if HTTPX_AVAILABLE and isinstance(
                 e,
@@ -830,11 +923,13 @@ Produce the JSON for this mechanic."""
                 ),
             ):
                 logger.error("Error explaining mechanic (transport): %s", e)
-                return {
+                yield {
+                    "type": "error",
                     "error": "Connection to Ollama failed while generating mechanic explanation. Please retry.",
                 }
+                return
             logger.error(f"Error explaining mechanic: {e}")
-            return {"error": str(e)}
+            yield {"type": "error", "error": str(e)}
 
 
 # Singleton instance
@@ -0,0 +1,215 @@
+"""Admission control and fair queuing in front of Ollama generations"""
+
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Awaitable, Deque, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lower runs first: interactive chat ahead of one-shot answers, team building last
+ENDPOINT_PRIORITIES = {
+    "/chat": 0,
+    "/ask-question": 1,
+    "/explain-mechanic": 1,
+    "/suggest-team": 2,
+    "chat-summary": 3,  # background chat compaction, never ahead of a user-facing answer
+}
+
+# Who the current request belongs to; set by the HTTP front ends
+current_client: contextvars.ContextVar[str] = contextvars.ContextVar("mkm_llm_client", default="unknown")
+
+# Scheduler priority of the current request; set by the HTTP front ends from ENDPOINT_PRIORITIES
+current_priority: contextvars.ContextVar[int] = contextvars.ContextVar("mkm_llm_priority", default=1)
+
+# event loop -> scheduler. Waiters are futures of the loop they were created on.
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMScheduler]" = weakref.WeakKeyDictionary()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        value = int(os.getenv(name, str(default)))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+class SchedulerRejected(Exception):
+    """The request cannot get a generation slot in time; answer 503 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """Limit concurrent generations and queue the rest fairly.
+
+    At most ``concurrency`` slots are held at once. Waiters are queued per
+    priority and, within a priority, per client; clients take turns so one
+    caller cannot starve the others. A request is rejected straight away when
+    the queue (or the client's share of it) is full, or when the estimated
+    wait, from the moving average of slot hold times, is longer than its
+    deadline.
+    """
+
+    def __init__(self, concurrency: int = 1, queue_size: int = 32, per_client: int = 4):
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.per_client = max(1, per_client)
+        self._active = 0
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {}
+        self._waiting = 0
+        self._avg_hold: Optional[float] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def stats(self) -> Dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "waiting": self._waiting,
+            "queue_size": self.queue_size,
+            "avg_hold_seconds": round(self._avg_hold, 3) if self._avg_hold is not None else None,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def busy(self) -> bool:
+        """True when a new request would have to wait for a slot."""
+        return self._active >= self.concurrency or self._waiting > 0
+
+    def _estimated_wait(self, priority: int) -> Optional[float]:
+        """Seconds until a new waiter at ``priority`` would start, or None before any slot was timed."""
+        if self._avg_hold is None:
+            return None
+        ahead = sum(
+            len(waiters)
+            for level, clients in self._queues.items()
+            if level <= priority
+            for waiters in clients.values()
+        )
+        return (ahead // self.concurrency + 1) * self._avg_hold
+
+    def _retry_after(self, priority: int) -> int:
+        estimate = self._estimated_wait(priority)
+        return max(1, math.ceil(estimate if estimate is not None else 1))
+
+    def _reject(self, message: str, priority: int) -> SchedulerRejected:
+        self.rejected += 1
+        return SchedulerRejected(message, self._retry_after(priority))
+
+    @asynccontextmanager
+    async def slot(self, client: str, priority: int, deadline: float) -> AsyncIterator[None]:
+        """Hold one generation slot for the ``async with`` body; raises SchedulerRejected."""
+        if self._active < self.concurrency and self._waiting == 0:
+            self._active += 1
+        else:
+            await self._wait_for_slot(client, priority, deadline)
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - started
+            self._avg_hold = held if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held
+            self._active -= 1
+            self._grant_next()
+
+    async def _wait_for_slot(self, client: str, priority: int, deadline: float) -> None:
+        if self._waiting >= self.queue_size:
+            raise self._reject("Server busy: generation queue is full", priority)
+        clients = self._queues.setdefault(priority, OrderedDict())
+        if len(clients.get(client, ())) >= self.per_client:
+            raise self._reject("Too many queued requests for this client", priority)
+        estimate = self._estimated_wait(priority)
+        if estimate is not None and estimate > deadline:
+            raise self._reject(f"Server busy: estimated wait {estimate:.0f}s exceeds the request deadline", priority)
+
+        waiter = asyncio.get_running_loop().create_future()
+        clients.setdefault(client, deque()).append(waiter)
+        self._waiting += 1
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=deadline)
+        except asyncio.TimeoutError:
+            self._forget(waiter, priority, client)
+            self.timed_out += 1
+            raise self._reject("Server busy: no generation slot became free before the deadline", priority)
+        except asyncio.CancelledError:
+            self._forget(waiter, priority, client)
+            raise
+
+    def _forget(self, waiter: asyncio.Future, priority: int, client: str) -> None:
+        """Drop a waiter that gave up; hand its slot on if it had just been granted one."""
+        if waiter.done() and not waiter.cancelled():
+            self._active -= 1
+            self._grant_next()
+            return
+        waiter.cancel()
+        clients = self._queues.get(priority, {})
+        waiters = clients.get(client)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self._waiting -= 1
+            if not waiters:
+                del clients[client]
+
+    def _grant_next(self) -> None:
+        while self._active < self.concurrency and self._waiting:
+            level = min(level for level, clients in self._queues.items() if clients)
+            clients = self._queues[level]
+            client, waiters = next(iter(clients.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                clients.move_to_end(client)  # round-robin between clients
+            else:
+                del clients[client]
+            self._waiting -= 1
+            self._active += 1
+            waiter.set_result(None)
+
+
+def get_scheduler() -> LLMScheduler:
+    """Return the scheduler for the running event loop."""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = LLMScheduler(
+            concurrency=_env_int("MKM_LLM_CONCURRENCY", _env_int("OLLAMA_NUM_PARALLEL", 1)),
+            queue_size=_env_int("MKM_LLM_QUEUE_SIZE", 32),
+            per_client=_env_int("MKM_LLM_QUEUE_PER_CLIENT", 4),
+        )
+        _schedulers[loop] = scheduler
+    return scheduler
+
+
+def generation_slot(deadline: float) -> AsyncContextManager[None]:
+    """A slot of the running loop's scheduler for the current client and priority; raises SchedulerRejected."""
+    return get_scheduler().slot(current_client.get(), current_priority.get(), deadline)
+
+
+def scheduler_stats() -> Optional[Dict]:
+    """Stats of the scheduler(s) in use; callable from any thread."""
+    stats = [scheduler.stats() for scheduler in list(_schedulers.values())]
+    if not stats:
+        return None
+    return stats[0] if len(stats) == 1 else {"loops": stats}
+
+
+async def with_client(client: str, awaitable: Awaitable[T]) -> T:
+    """Await ``awaitable`` with ``client`` as the current client (for work submitted from other threads)."""
+    current_client.set(client)
+    return await awaitable
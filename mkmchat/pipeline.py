@@ -0,0 +1,178 @@
+"""Staged request pipelines: independent stages run concurrently, and every stage is timed"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Span(NamedTuple):
+    name: str
+    start: float
+    end: float
+
+
+_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _stage_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """Threads for blocking stages fanned out from inside another stage (e.g. retrieval per doc type)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                workers = max(1, int(os.getenv("MKM_PIPELINE_WORKERS", "4")))
+            except ValueError:
+                workers = 4
+            _pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mkm-stage")
+        return _pool
+
+
+class Pipeline:
+    """The stages that prepare one request, with their timings.
+
+    ``stage`` awaits one named stage, ``gather`` runs independent ones
+    concurrently (cancelling the others when one fails), and ``timed`` /
+    ``map_threads`` time blocking work from any thread. Every stage keeps its
+    start and end offset, so ``critical_path`` can walk back from the last
+    stage to finish through the stages it had to wait for. ``finish`` adds
+    the run to ``PIPELINE_STATS``.
+    """
+
+    def __init__(self, name: str, clock: Callable[[], float] = time.perf_counter):
+        self.name = name
+        self._clock = clock
+        self._started = clock()
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def _record(self, name: str, start: float, end: float) -> None:
+        with self._lock:
+            self._spans.append(Span(name, start - self._started, end - self._started))
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self._record(name, start, self._clock())
+
+    async def stage(self, name: str, awaitable: Awaitable[T]) -> T:
+        with self.timed(name):
+            return await awaitable
+
+    async def gather(self, *awaitables: Awaitable[Any]) -> List[Any]:
+        """Results of ``awaitables`` run concurrently, in order; the first failure cancels the rest."""
+        tasks = [asyncio.ensure_future(awaitable) for awaitable in awaitables]
+        try:
+            return list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def map_threads(self, stages: Dict[str, Callable[[], T]]) -> Dict[str, T]:
+        """Run blocking callables concurrently on the stage pool, each timed under its key."""
+
+        def _run(name: str, call: Callable[[], T]) -> T:
+            with self.timed(name):
+                return call()
+
+        if len(stages) <= 1:
+            return {name: _run(name, call) for name, call in stages.items()}
+        futures = {name: _stage_pool().submit(_run, name, call) for name, call in stages.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return sorted(self._spans, key=lambda span: span.start)
+
+    def critical_path(self) -> List[str]:
+        """Stage names from the first to the last that finished, each one waiting on the one before.
+
+        Sub-stages are named after their parent (``retrieval.search`` inside
+        ``retrieval``) and only innermost stages are considered, so a stage
+        that fanned out is represented by the sub-stage that held it up.
+        """
+        spans = self.spans()
+        leaves = [span for span in spans if not any(other.name.startswith(span.name + ".") for other in spans)]
+        if not leaves:
+            return []
+        current = max(leaves, key=lambda span: span.end)
+        path = [current]
+        while True:
+            waited_on = [span for span in leaves if span.end <= current.start and span not in path]
+            if not waited_on:
+                break
+            current = max(waited_on, key=lambda span: span.end)
+            path.append(current)
+        return [span.name for span in reversed(path)]
+
+    def finish(self) -> Dict:
+        """Record this run in PIPELINE_STATS; returns its timings in milliseconds."""
+        spans = self.spans()
+        total = self._clock() - self._started
+        path = self.critical_path()
+        PIPELINE_STATS.record(self.name, total, spans, path)
+        timings = {span.name: round((span.end - span.start) * 1000, 2) for span in spans}
+        logger.debug("%s pipeline: %.1f ms, critical path %s, stages %s", self.name, total * 1000, path, timings)
+        return timings
+
+
+class PipelineStats:
+    """Running per-stage timings across requests, by pipeline name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pipelines: Dict[str, Dict] = {}
+
+    def record(self, name: str, total: float, spans: List[Span], critical_path: List[str]) -> None:
+        with self._lock:
+            entry = self._pipelines.setdefault(name, {"runs": 0, "total": 0.0, "stages": {}, "critical": {}})
+            entry["runs"] += 1
+            entry["total"] += total
+            for span in spans:
+                stage = entry["stages"].setdefault(span.name, {"runs": 0, "start": 0.0, "total": 0.0, "max": 0.0})
+                duration = span.end - span.start
+                stage["runs"] += 1
+                stage["start"] += span.start
+                stage["total"] += duration
+                stage["max"] = max(stage["max"], duration)
+            for stage_name in critical_path:
+                entry["critical"][stage_name] = entry["critical"].get(stage_name, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._pipelines.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                name: {
+                    "runs": entry["runs"],
+                    "avg_ms": round(entry["total"] / entry["runs"] * 1000, 2),
+                    "stages": {
+                        stage_name: {
+                            "avg_start_ms": round(stage["start"] / stage["runs"] * 1000, 2),
+                            "avg_ms": round(stage["total"] / stage["runs"] * 1000, 2),
+                            "max_ms": round(stage["max"] * 1000, 2),
+                        }
+                        for stage_name, stage in entry["stages"].items()
+                    },
+                    # How often each stage was on the path that decided the request's latency
+                    "critical_path": dict(sorted(entry["critical"].items(), key=lambda item: -item[1])),
+                }
+                for name, entry in self._pipelines.items()
+            }
+
+
+PIPELINE_STATS = PipelineStats()
@@ -0,0 +1,115 @@
+"""Thread-safe token-bucket rate limiting with bounded per-key state"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from time import monotonic
+from typing import Callable, Dict, Optional
+
+
+class _Bucket:
+    __slots__ = ("minute_tokens", "burst_tokens", "updated")
+
+    def __init__(self, minute_tokens: float, burst_tokens: float, now: float):
+        self.minute_tokens = minute_tokens
+        self.burst_tokens = burst_tokens
+        self.updated = now
+
+
+class _Stripe:
+    __slots__ = ("lock", "buckets")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: a sustained per-minute rate plus a short burst window.
+
+    Each key holds two buckets refilled continuously, so a check is O(1)
+    instead of trimming a timestamp queue. Keys are spread over ``stripes``
+    independently locked shards to keep handler threads from contending on
+    one lock. Every stripe keeps its keys in least-recently-seen order:
+    a key is dropped once both of its buckets would be full again (its state
+    is then indistinguishable from a fresh key), and the oldest keys are
+    dropped when a stripe holds more than its share of ``max_keys``.
+    """
+
+    def __init__(self, stripes: int = 16, max_keys: int = 100_000, clock: Callable[[], float] = monotonic):
+        self._stripes = [_Stripe() for _ in range(max(1, stripes))]
+        self._max_keys_per_stripe = max(1, max_keys // len(self._stripes))
+        self._clock = clock
+        self._counter_lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+
+    def _stripe(self, key: str) -> _Stripe:
+        return self._stripes[zlib.crc32(key.encode()) % len(self._stripes)]
+
+    def check(self, key: str, per_minute: int, burst: int, burst_window: float) -> Optional[float]:
+        """Take one token for ``key``; return None when allowed, else seconds until a retry can pass."""
+        minute_rate = per_minute / 60.0
+        burst_rate = burst / burst_window
+        idle_ttl = max(60.0, burst_window)
+        now = self._clock()
+        stripe = self._stripe(key)
+        with stripe.lock:
+            evicted = self._evict_idle(stripe, now, idle_ttl)
+            bucket = stripe.buckets.get(key)
+            if bucket is None:
+                bucket = stripe.buckets[key] = _Bucket(per_minute, burst, now)
+                if len(stripe.buckets) > self._max_keys_per_stripe:
+                    stripe.buckets.popitem(last=False)
+                    evicted += 1
+            else:
+                elapsed = now - bucket.updated
+                bucket.minute_tokens = min(per_minute, bucket.minute_tokens + elapsed * minute_rate)
+                bucket.burst_tokens = min(burst, bucket.burst_tokens + elapsed * burst_rate)
+                bucket.updated = now
+                stripe.buckets.move_to_end(key)
+
+            if bucket.minute_tokens >= 1 and bucket.burst_tokens >= 1:
+                bucket.minute_tokens -= 1
+                bucket.burst_tokens -= 1
+                retry_after = None
+            else:
+                retry_after = max(
+                    (1 - bucket.minute_tokens) / minute_rate if bucket.minute_tokens < 1 else 0.0,
+                    (1 - bucket.burst_tokens) / burst_rate if bucket.burst_tokens < 1 else 0.0,
+                )
+
+        with self._counter_lock:
+            self.evicted += evicted
+            if retry_after is None:
+                self.allowed += 1
+            else:
+                self.limited += 1
+        return retry_after
+
+    @staticmethod
+    def _evict_idle(stripe: _Stripe, now: float, idle_ttl: float) -> int:
+        evicted = 0
+        buckets = stripe.buckets
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest.updated < idle_ttl:
+                break
+            buckets.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def reset(self) -> None:
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.buckets.clear()
+
+    def stats(self) -> Dict:
+        keys = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                keys += len(stripe.buckets)
+        with self._counter_lock:
+            return {"keys": keys, "allowed": self.allowed, "limited": self.limited, "evicted": self.evicted}
+
@@ -0,0 +1,289 @@
+"""Caches of finished endpoint responses: exact (in-memory LRU over SQLite) and semantic"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    data_hash TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    payload TEXT NOT NULL
+)
+"""
+
+
+def _digest(key: Tuple) -> str:
+    return hashlib.sha256(json.dumps(list(key)).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe response cache keyed by ``(endpoint, input, model, data hash)`` tuples.
+
+    Values are stored as JSON text, so every ``get`` returns a fresh object.
+    The memory tier is a bounded LRU; the optional SQLite tier survives
+    restarts and is shared by worker processes using the same file. When the
+    data hash changes, entries built from older data are dropped from both
+    tiers. A failing disk tier is logged and switched off, leaving the memory
+    tier in place.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max(0, max_entries)
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._data_hash: Optional[str] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.path = Path(path) if path is not None else None
+        self._db: Optional[sqlite3.Connection] = None
+        if self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(_SCHEMA)
+                self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache disk tier disabled ({self.path}): {e}")
+                self._db = None
+
+    def get(self, key: Tuple) -> Optional[Dict]:
+        digest = _digest(key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[0] <= now:
+                self._drop(digest)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.memory_hits += 1
+                return json.loads(entry[1])
+
+            row = self._disk(
+                "SELECT expires_at, payload FROM responses WHERE key = ? AND expires_at > ?", (digest, now)
+            )
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(digest, row[0], row[1])
+            return json.loads(row[1])
+
+    def put(self, key: Tuple, value: Dict, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        endpoint, data_hash = str(key[0]), str(key[-1])
+        digest = _digest(key)
+        payload = json.dumps(value)
+        expires_at = time.time() + ttl
+        with self._lock:
+            if data_hash != self._data_hash:
+                self._invalidate_other_data(data_hash)
+            self._remember(digest, expires_at, payload)
+            self._disk(
+                "INSERT OR REPLACE INTO responses (key, endpoint, data_hash, expires_at, payload) VALUES (?, ?, ?, ?, ?)",
+                (digest, endpoint, data_hash, expires_at, payload),
+                commit=True,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._disk("DELETE FROM responses", commit=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            disk = self._disk("SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM responses")
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "disk": {
+                    "path": str(self.path),
+                    "entries": disk[0],
+                    "bytes": disk[1],
+                } if disk is not None else None,
+            }
+
+    # Helpers below expect self._lock to be held
+
+    def _remember(self, digest: str, expires_at: float, payload: str) -> None:
+        size = len(digest) + len(payload.encode("utf-8"))
+        if self.max_entries == 0 or size > self.max_bytes:
+            return
+        self._drop(digest)
+        self._entries[digest] = (expires_at, payload)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            old_digest = next(iter(self._entries))
+            self._drop(old_digest)
+            self.evictions += 1
+
+    def _drop(self, digest: str) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            self._bytes -= len(digest) + len(entry[1].encode("utf-8"))
+
+    def _invalidate_other_data(self, data_hash: str) -> None:
+        if self._data_hash is not None:
+            logger.info("Data changed; dropping cached responses built from older data")
+            self._entries.clear()
+            self._bytes = 0
+        self._disk(
+            "DELETE FROM responses WHERE data_hash != ? OR expires_at <= ?", (data_hash, time.time()), commit=True
+        )
+        self._data_hash = data_hash
+
+    def _disk(self, sql: str, params: Tuple = (), commit: bool = False) -> Optional[tuple]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(sql, params).fetchone()
+            if commit:
+                self._db.commit()
+            return row
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache disk tier disabled ({self.path}): {e}")
+            self._db = None
+            return None
+
+
+class SemanticAnswerCache:
+    """Fixed-capacity cache reusing answers for near-duplicate queries.
+
+    Each slot holds a unit query embedding plus the answer it produced, tagged
+    with a namespace (endpoint, model, data hash). A lookup is one matrix
+    product over all slots; the best slot in the same namespace is a hit when
+    its cosine similarity reaches ``threshold``. Slots expire ``ttl`` seconds
+    after they were stored. When full, an expired slot or else the least
+    recently used one is overwritten, and slots from an older data hash are
+    dropped as soon as an answer for a newer one is stored.
+    """
+
+    def __init__(self, capacity: int = 256, threshold: float = 0.9):
+        self.capacity = max(0, capacity)
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_namespace = np.full(self.capacity, -1, dtype=np.int64)
+        self._last_used = np.zeros(self.capacity, dtype=np.float64)
+        self._expires_at = np.zeros(self.capacity, dtype=np.float64)
+        self._answers: List[Optional[str]] = [None] * self.capacity
+        self._queries: List[Optional[str]] = [None] * self.capacity
+        self._namespaces: Dict[Tuple[str, str, str], int] = {}
+        self._next_namespace_id = 0
+        self._lock = threading.Lock()
+        self._data_hash: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(vector: np.ndarray) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else None
+
+    def _scores(self, namespace_id: int, vector: np.ndarray) -> Optional[np.ndarray]:
+        if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+            return None
+        scores = self._vectors @ vector
+        scores[(self._slot_namespace != namespace_id) | (self._expires_at <= time.time())] = -np.inf
+        return scores
+
+    def lookup(self, namespace: Tuple[str, str, str], vector: np.ndarray) -> Optional[Tuple[Dict, float, str]]:
+        """Return (answer, similarity, cached query) for the closest stored query, or None."""
+        unit = self._unit(vector)
+        with self._lock:
+            namespace_id = self._namespaces.get(namespace)
+            scores = self._scores(namespace_id, unit) if namespace_id is not None and unit is not None else None
+            if scores is not None:
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._last_used[best] = time.monotonic()
+                    self.hits += 1
+                    return json.loads(self._answers[best]), float(scores[best]), self._queries[best]
+            self.misses += 1
+            return None
+
+    def put(self, namespace: Tuple[str, str, str], vector: np.ndarray, query: str, answer: Dict, ttl: float) -> None:
+        unit = self._unit(vector)
+        if self.capacity == 0 or unit is None or ttl <= 0:
+            return
+        with self._lock:
+            data_hash = namespace[-1]
+            if data_hash != self._data_hash:
+                self._drop_other_data(data_hash)
+            if self._vectors is None or self._vectors.shape[1] != unit.shape[0]:
+                self._vectors = np.zeros((self.capacity, unit.shape[0]), dtype=np.float32)
+                self._slot_namespace[:] = -1
+            namespace_id = self._namespaces.get(namespace)
+            if namespace_id is None:
+                namespace_id = self._namespaces[namespace] = self._next_namespace_id
+                self._next_namespace_id += 1
+
+            scores = self._scores(namespace_id, unit)
+            free = np.flatnonzero((self._slot_namespace < 0) | (self._expires_at <= time.time()))
+            if scores is not None and scores.max() >= 0.999:
+                slot = int(np.argmax(scores))  # same query again: refresh it in place
+            elif free.size:
+                slot = int(free[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            self._vectors[slot] = unit
+            self._slot_namespace[slot] = namespace_id
+            self._last_used[slot] = time.monotonic()
+            self._expires_at[slot] = time.time() + ttl
+            self._answers[slot] = json.dumps(answer)
+            self._queries[slot] = query
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int(np.count_nonzero((self._slot_namespace >= 0) & (self._expires_at > time.time()))),
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _drop_other_data(self, data_hash: str) -> None:
+        stale = [namespace_id for namespace, namespace_id in self._namespaces.items() if namespace[-1] != data_hash]
+        if stale:
+            dropped = np.isin(self._slot_namespace, stale)
+            self._slot_namespace[dropped] = -1
+            for slot in np.flatnonzero(dropped):
+                self._answers[slot] = None
+                self._queries[slot] = None
+            self._namespaces = {ns: ns_id for ns, ns_id in self._namespaces.items() if ns[-1] == data_hash}
+        self._data_hash = data_hash
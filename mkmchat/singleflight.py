@@ -0,0 +1,62 @@
+"""Coalesce identical in-flight requests into one shared execution"""
+
+import asyncio
+import copy
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Run at most one coroutine per key; concurrent callers with the same key share its result.
+
+    The shared work runs as its own task, so one caller going away does not
+    cancel it for the others; it is cancelled only when every caller waiting
+    on it has been cancelled. Followers receive a deep copy of the result so
+    per-caller post-processing cannot leak between responses.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "executed": self.leaders, "coalesced": self.followers}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``factory()``, or the identical call already in flight for ``key``."""
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._calls.get(call_key)
+        leader = call is None
+        if leader:
+            call = _Call(loop.create_task(factory()))
+            self._calls[call_key] = call
+            call.task.add_done_callback(lambda _: self._forget(call_key, call))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logger.debug("Joined in-flight request %r", key)
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+        return result if leader else copy.deepcopy(result)
+
+    def _forget(self, call_key: Tuple[asyncio.AbstractEventLoop, Hashable], call: _Call) -> None:
+        if self._calls.get(call_key) is call:
+            del self._calls[call_key]
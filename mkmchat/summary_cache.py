@@ -0,0 +1,112 @@
+"""Merged chat summaries keyed by the message prefix they cover, computed in the background"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCache:
+    """Bounded LRU of compacted summaries plus the summarizations still running.
+
+    A key is a rolling SHA-256 over (model, summary the client already had,
+    each summarized message in order), so ``prefix_keys`` yields the key of
+    every prefix of a history in one pass. A history that is resubmitted,
+    or that has grown since, finds the longest prefix already summarized
+    instead of summarizing it again. ``schedule`` starts a summarization as
+    a task on the running loop unless that key is cached or in flight.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.failed = 0
+
+    @staticmethod
+    def prefix_keys(model: str, summary: Optional[str], messages: List[Dict[str, str]]) -> List[str]:
+        """``keys[i]`` identifies the summary of ``summary`` + ``messages[: i + 1]``."""
+        digest = hashlib.sha256(json.dumps([model, summary or ""]).encode("utf-8"))
+        keys = []
+        for message in messages:
+            digest.update(json.dumps([message["role"], message["content"]]).encode("utf-8"))
+            keys.append(digest.copy().hexdigest())
+        return keys
+
+    def longest(self, keys: List[str]) -> Tuple[int, Optional[str]]:
+        """(number of messages covered, summary) for the longest cached prefix, or (0, None)."""
+        with self._lock:
+            for index in range(len(keys) - 1, -1, -1):
+                summary = self._entries.get(keys[index])
+                if summary is not None:
+                    self._entries.move_to_end(keys[index])
+                    self.hits += 1
+                    return index + 1, summary
+            if keys:
+                self.misses += 1
+            return 0, None
+
+    def put(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._put_locked(key, summary)
+
+    def _put_locked(self, key: str, summary: str) -> None:
+        if self.max_entries == 0:
+            return
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def schedule(self, key: str, summarize: Callable[[], Awaitable[Optional[str]]]) -> bool:
+        """Run ``summarize()`` in the background and cache its result under ``key``; False if already known."""
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return False
+            self._pending[key] = asyncio.get_running_loop().create_task(self._run(key, summarize))
+            return True
+
+    async def _run(self, key: str, summarize: Callable[[], Awaitable[Optional[str]]]) -> None:
+        summary = None
+        try:
+            summary = await summarize()
+        except Exception as e:
+            logger.warning("Background chat summary failed: %s", e)
+        finally:
+            with self._lock:
+                del self._pending[key]
+                if summary:
+                    self._put_locked(key, summary)
+                    self.computed += 1
+                else:
+                    self.failed += 1
+
+    async def wait_idle(self) -> None:
+        """Wait for the summarizations started on the running loop to finish."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = [task for task in self._pending.values() if task.get_loop() is loop]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "computed": self.computed,
+                "failed": self.failed,
+            }
@@ -20,8 +20,11 @@ def get_rag_system() -> RAGSystem:
         _rag_system = RAGSystem()
         if _rag_system.enabled:
             _rag_system.index_data()
+            # Staleness is tracked by a background watcher; with it disabled
+            # (MKM_RAG_WATCH_INTERVAL_SECONDS=0) data edits need a restart.
+            _rag_system.start_watcher()
     elif _rag_system.enabled:
-        # Check if underlying files changed and re-index if needed
+        # Re-index if the watcher flagged changed data files (attribute read otherwise)
         _rag_system.check_and_reindex()
     return _rag_system
 
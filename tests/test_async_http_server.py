@@ -0,0 +1,185 @@
+import asyncio
+import json
+
+import pytest
+
+from mkmchat import async_http_server, http_server
+from mkmchat.llm.scheduler import get_scheduler
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    headers = {
+        name.strip().lower(): value.strip()
+        for name, _, value in (line.partition(":") for line in lines[1:] if line)
+    }
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers, json.loads(body) if body else None
+
+
+def _request(method, path, body=None, headers=None):
+    payload = json.dumps(body).encode() if body is not None else b""
+    lines = [f"{method} {path} HTTP/1.1", "Host: test"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    if body is not None:
+        lines.append(f"Content-Length: {len(payload)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + payload
+
+
+@pytest.fixture
+async def server(monkeypatch):
+    monkeypatch.setenv("MKM_API_KEY", "secret")
+    monkeypatch.setenv("MKM_RATE_LIMIT_ENABLED", "false")
+    srv = await async_http_server.start_server("127.0.0.1", 0)
+    yield srv.sockets[0].getsockname()[1]
+    srv.close()
+    await srv.wait_closed()
+
+
+async def test_keep_alive_serves_several_requests_on_one_connection(server, monkeypatch):
+    calls = []
+
+    async def _fake_chat_json(**kwargs):
+        calls.append(kwargs)
+        return {"response": {"text": "hi", "summary_text": None, "summary_message_count": 0}}
+
+    monkeypatch.setattr(http_server, "chat_json", _fake_chat_json)
+    reader, writer = await asyncio.open_connection("127.0.0.1", server)
+    body = {"message": "hello", "messages": []}
+
+    writer.write(_request("POST", "/chat", body, {"X-API-Key": "secret"}))
+    first = await _read_response(reader)
+    writer.write(_request("POST", "/chat", body, {"X-API-Key": "secret"}))
+    second = await _read_response(reader)
+    writer.close()
+
+    assert first[0] == second[0] == 200
+    assert first[1]["connection"] == "keep-alive"
+    assert first[2]["response"]["text"] == "hi"
+    assert len(calls) == 2
+    assert calls[0]["message"] == "hello"
+
+
+async def test_same_validation_auth_and_routing_as_threaded_server(server):
+    reader, writer = await asyncio.open_connection("127.0.0.1", server)
+
+    writer.write(_request("POST", "/chat", {"messages": []}, {"X-API-Key": "secret"}))
+    missing = await _read_response(reader)
+    writer.write(_request("GET", "/nope"))
+    not_found = await _read_response(reader)
+    writer.write(_request("GET", "/"))
+    info = await _read_response(reader)
+    writer.write(_request("POST", "/chat", {"message": "x", "messages": []}, {"X-API-Key": "bad"}))
+    unauthorized = await _read_response(reader)
+    writer.close()
+
+    assert missing[0] == 400
+    assert missing[2] == {"error": "Missing required field: message"}
+    assert not_found[0] == 404
+    assert "/chat" in info[2]["endpoints"]
+    assert unauthorized[0] == 401
+    assert unauthorized[1]["connection"] == "close"
+
+
+async def test_slow_handlers_run_concurrently_on_one_loop(server, monkeypatch):
+    release = asyncio.Event()
+    started = []
+
+    async def _slow_ask(question, model=None):
+        started.append(question)
+        await release.wait()
+        return {"response": question}
+
+    monkeypatch.setattr(http_server, "ask_question_json", _slow_ask)
+    monkeypatch.setenv("MKM_LLM_CONCURRENCY", "20")
+
+    async def _ask(question):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server)
+        writer.write(_request("POST", "/ask-question", {"question": question}, {"X-API-Key": "secret"}))
+        response = await _read_response(reader)
+        writer.close()
+        return response
+
+    tasks = [asyncio.create_task(_ask(f"q{i}")) for i in range(20)]
+    while len(started) < 20:
+        await asyncio.sleep(0.01)
+    release.set()
+    responses = await asyncio.gather(*tasks)
+
+    assert sorted(body["response"] for _, _, body in responses) == sorted(f"q{i}" for i in range(20))
+
+
+async def test_full_generation_queue_answers_503_with_retry_after(server, monkeypatch):
+    release = asyncio.Event()
+    started = []
+
+    async def _slow_ask(question, model=None):
+        async with http_server._generation_slot():
+            started.append(question)
+            await release.wait()
+        return {"response": question}
+
+    monkeypatch.setattr(http_server, "ask_question_json", _slow_ask)
+    monkeypatch.setenv("MKM_LLM_CONCURRENCY", "1")
+    monkeypatch.setenv("MKM_LLM_QUEUE_SIZE", "1")
+
+    async def _ask(question):
+        reader, writer = await asyncio.open_connection("127.0.0.1", server)
+        writer.write(_request("POST", "/ask-question", {"question": question}, {"X-API-Key": "secret"}))
+        response = await _read_response(reader)
+        writer.close()
+        return response
+
+    running = asyncio.create_task(_ask("q0"))
+    while not started:
+        await asyncio.sleep(0.01)
+    queued = asyncio.create_task(_ask("q1"))
+    while not get_scheduler().stats()["waiting"]:
+        await asyncio.sleep(0.01)
+    rejected = await _ask("q2")
+    release.set()
+
+    assert rejected[0] == 503
+    assert int(rejected[1]["retry-after"]) >= 1
+    assert [response[2]["response"] for response in await asyncio.gather(running, queued)] == ["q0", "q1"]
+
+
+async def test_client_disconnect_cancels_the_generation(server, monkeypatch):
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def _slow_ask(question, model=None):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(http_server, "ask_question_json", _slow_ask)
+    reader, writer = await asyncio.open_connection("127.0.0.1", server)
+    writer.write(_request("POST", "/ask-question", {"question": "q"}, {"X-API-Key": "secret"}))
+    await asyncio.wait_for(started.wait(), 5)
+    writer.close()
+
+    await asyncio.wait_for(cancelled.wait(), 5)
+    assert get_scheduler().stats()["active"] == 0
+
+
+async def test_request_timeout_header_bounds_the_request(server, monkeypatch):
+    async def _slow_ask(question, model=None):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(http_server, "ask_question_json", _slow_ask)
+    reader, writer = await asyncio.open_connection("127.0.0.1", server)
+    writer.write(
+        _request("POST", "/ask-question", {"question": "q"}, {"X-API-Key": "secret", "X-Request-Timeout": "0.2"})
+    )
+    status, _, body = await asyncio.wait_for(_read_response(reader), 5)
+    writer.close()
+
+    assert status == 504
+    assert body == {"error": "Request deadline exceeded during request"}
@@ -1,6 +1,14 @@
+import zlib
+
+import numpy as np
 import pytest
 
-from mkmchat.http_server import _compact_chat_history, _sanitize_chat_messages
+from mkmchat import http_server
+from mkmchat.data.lexical import normalize_for_match
+from mkmchat.extractive_summary import summarize_extractively
+from mkmchat.http_server import _compact_chat_history, _compact_chat_history_in_background, _sanitize_chat_messages
+from mkmchat.llm.scheduler import get_scheduler
+from mkmchat.summary_cache import SummaryCache
 
 
 class _AssistantStub:
@@ -68,3 +76,107 @@ async def test_compact_chat_history_summarizes_older_messages(monkeypatch):
     assert summary == "Compacted summary"
     assert summary_count == 7
     assert recent == messages[-3:]
+
+
+@pytest.mark.asyncio
+async def test_background_compaction_answers_now_and_hands_the_summary_back_later(monkeypatch):
+    monkeypatch.setenv("MKM_CHAT_KEEP_RECENT_MESSAGES", "3")
+    monkeypatch.setenv("MKM_CHAT_COMPACT_TRIGGER_MESSAGES", "6")
+    cache = SummaryCache()
+    monkeypatch.setattr(http_server, "_summary_cache", cache)
+    calls = []
+
+    async def _fake_summary(assistant, use_model, existing_summary, messages_to_summarize):
+        calls.append((existing_summary, len(messages_to_summarize)))
+        return "Compacted summary"
+
+    monkeypatch.setattr(http_server, "_summarize_messages", _fake_summary)
+    messages = [{"role": "user", "content": f"turn {i}"} for i in range(8)]
+
+    first = await _compact_chat_history_in_background(_AssistantStub(), "m", messages, "existing", 2)
+    again = await _compact_chat_history_in_background(_AssistantStub(), "m", messages, "existing", 2)
+    await cache.wait_idle()
+    grown = messages + [{"role": "assistant", "content": "answer"}, {"role": "user", "content": "next"}]
+    later = await _compact_chat_history_in_background(_AssistantStub(), "m", grown, "existing", 2)
+
+    assert first == again == ("existing", 2, messages[-3:])
+    assert calls == [("existing", 5)]
+    assert later == ("Compacted summary", 7, grown[5:])
+    assert cache.stats()["computed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_background_compaction_keeps_history_when_the_summary_fails(monkeypatch):
+    monkeypatch.setenv("MKM_CHAT_KEEP_RECENT_MESSAGES", "2")
+    monkeypatch.setenv("MKM_CHAT_COMPACT_TRIGGER_MESSAGES", "4")
+    cache = SummaryCache()
+    monkeypatch.setattr(http_server, "_summary_cache", cache)
+
+    async def _failed_summary(assistant, use_model, existing_summary, messages_to_summarize):
+        return existing_summary or None
+
+    monkeypatch.setattr(http_server, "_summarize_messages", _failed_summary)
+    messages = [{"role": "user", "content": f"q{i}"} for i in range(5)]
+
+    await _compact_chat_history_in_background(_AssistantStub(), "m", messages, "", 0)
+    await cache.wait_idle()
+    result = await _compact_chat_history_in_background(_AssistantStub(), "m", messages, "", 0)
+    await cache.wait_idle()
+
+    assert result == (None, 0, messages[-2:])
+    assert cache.stats()["failed"] == 2
+
+
+def _bag_of_words(texts):
+    vectors = np.zeros((len(texts), 256), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in normalize_for_match(text).split():
+            vectors[row, zlib.crc32(word.encode()) % 256] += 1.0
+    return vectors
+
+
+def test_extractive_summary_skips_repeats_keeps_names_and_caps_length():
+    messages = [
+        {"role": "user", "content": "I want a team for **Klassic Scorpion** in faction wars."},
+        {"role": "assistant", "content": "Pair Klassic Scorpion with Spectral Scorpion for fire damage."},
+        {"role": "user", "content": "I want a team for Klassic Scorpion in faction wars!"},
+        {"role": "assistant", "content": "Ok."},
+    ]
+
+    summary = summarize_extractively("User owns Sub-Zero and plays faction wars daily.", messages, _bag_of_words)
+    capped = summarize_extractively("", messages * 20, _bag_of_words, max_words=12)
+
+    assert summary.splitlines()[0] == "User owns Sub-Zero and plays faction wars daily."
+    assert summary.count("I want a team for") == 1
+    assert "Assistant: Pair Klassic Scorpion with Spectral Scorpion for fire damage." in summary
+    assert len(capped.split()) <= 12
+
+
+@pytest.mark.asyncio
+async def test_auto_summary_engine_compacts_extractively_while_the_llm_is_busy(monkeypatch):
+    monkeypatch.setenv("MKM_CHAT_KEEP_RECENT_MESSAGES", "2")
+    monkeypatch.setenv("MKM_CHAT_COMPACT_TRIGGER_MESSAGES", "4")
+    monkeypatch.setenv("MKM_CHAT_SUMMARY_ENGINE", "auto")
+    cache = SummaryCache()
+    monkeypatch.setattr(http_server, "_summary_cache", cache)
+
+    class _Rag:
+        enabled = True
+
+        def embed_texts(self, texts):
+            return _bag_of_words(texts)
+
+    async def _llm_summary(assistant, use_model, existing_summary, messages_to_summarize):
+        raise AssertionError("the LLM is busy")
+
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "_summarize_messages", _llm_summary)
+    messages = [{"role": "user", "content": f"Tell me about fighter number {i} please."} for i in range(5)]
+
+    async with get_scheduler().slot("someone", 0, 5):
+        summary, count, recent = await _compact_chat_history_in_background(_AssistantStub(), "m", messages, "", 0)
+
+    assert "fighter number 0" in summary
+    assert count == 3
+    assert recent == messages[-2:]
+    assert cache.stats()["pending"] == 0
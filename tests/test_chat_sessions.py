@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+from mkmchat import http_server
+from mkmchat.chat_sessions import ChatSessionStore
+
+SESSION = "0f6c1c9e-5b8a-4c39-9a57-3f0f0d7c2a11"
+
+
+def test_disk_tier_resumes_sessions_after_a_restart(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    ChatSessionStore(path).put(SESSION, {"messages": [], "summary_text": "s"})
+
+    store = ChatSessionStore(path)
+    first = store.get(SESSION)
+    first["summary_text"] = "mutated"
+
+    assert store.get(SESSION) == {"messages": [], "summary_text": "s"}
+    assert store.stats()["disk_hits"] == 1
+    assert store.stats()["memory_hits"] == 1
+    assert store.get("unknown-session-0000") is None
+
+
+def test_sessions_expire_and_memory_is_bounded(tmp_path, monkeypatch):
+    store = ChatSessionStore(None, max_sessions=2, ttl=60)
+    for name in ("a", "b", "c"):
+        store.put(name, {"name": name})
+
+    assert store.get("a") is None
+    assert store.stats()["evictions"] == 1
+
+    now = time.time()
+    monkeypatch.setattr("mkmchat.chat_sessions.time.time", lambda: now + 120)
+    assert store.get("b") is None
+    assert store.stats()["expired"] == 1
+
+
+class _Rag:
+    enabled = True
+    _last_data_hash = "abc"
+
+
+class _AssistantStub:
+    enabled = True
+    base_url = "http://ollama:11434"
+
+    def _resolve_model_name(self, model):
+        return model or "llama3.2:3b"
+
+
+@pytest.mark.asyncio
+async def test_chat_turns_only_send_the_new_message(monkeypatch):
+    monkeypatch.setattr(http_server, "_chat_session_store", ChatSessionStore())
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    retrievals = []
+    prompts = []
+
+    def _fake_context(rag, query, pipeline=None):
+        retrievals.append(query)
+        return {"characters": "", "equipment": "", "gameplay": "", "glossary": ""}
+
+    async def _fake_completion(base_url, path, body, timeout=None):
+        prompts.append(body["messages"][0]["content"])
+        yield f"reply {len(prompts)}"
+
+    monkeypatch.setattr(http_server, "build_chat_context", _fake_context)
+    monkeypatch.setattr(http_server, "stream_completion", _fake_completion)
+
+    async def _turn(body):
+        frames = [frame async for frame in http_server.chat_stream(**http_server._chat_args(body))]
+        return frames[-1]["response"]
+
+    first = await _turn({"message": "Who is Scorpion?", "messages": [], "session_id": SESSION})
+    second = await _turn({"message": "And his passive?", "session_id": SESSION})
+    retried = await _turn({"message": "And his passive?", "session_id": SESSION})
+
+    assert first["session_id"] == second["session_id"] == retried["session_id"] == SESSION
+    assert "User: Who is Scorpion?" in prompts[1] and "Assistant: reply 1" in prompts[1]
+    assert "Assistant: reply 2" in prompts[2]
+    assert len(retrievals) == 2  # the repeated question reuses the stored retrieval
+    assert len(http_server.get_chat_session_store().get(SESSION)["messages"]) == 6
+    with pytest.raises(http_server.RequestError):
+        http_server._chat_args({"message": "hi", "session_id": "short"})
+    with pytest.raises(http_server.RequestError):
+        http_server._chat_args({"message": "hi"})
+
+
+@pytest.mark.asyncio
+async def test_overlapping_turns_on_one_session_both_land_in_the_history(monkeypatch):
+    monkeypatch.setattr(http_server, "_chat_session_store", ChatSessionStore())
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(
+        http_server,
+        "build_chat_context",
+        lambda rag, query, pipeline=None: {"characters": "", "equipment": "", "gameplay": "", "glossary": ""},
+    )
+    release = asyncio.Event()
+    prompts = []
+
+    async def _fake_completion(base_url, path, body, timeout=None):
+        prompts.append(body["messages"][0]["content"])
+        await release.wait()
+        yield f"reply {len(prompts)}"
+
+    monkeypatch.setattr(http_server, "stream_completion", _fake_completion)
+
+    async def _turn(message):
+        frames = [frame async for frame in http_server.chat_stream(message, session_id=SESSION)]
+        return frames[-1]["response"]
+
+    first = asyncio.create_task(_turn("Who is Scorpion?"))
+    retry = asyncio.create_task(_turn("Who is Scorpion, again?"))
+    while not prompts:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    assert len(prompts) == 1  # the second turn waits for the first to be saved
+    release.set()
+    await asyncio.gather(first, retry)
+
+    assert "Assistant: reply 1" in prompts[1]
+    assert [m["content"] for m in http_server.get_chat_session_store().get(SESSION)["messages"]] == [
+        "Who is Scorpion?",
+        "reply 1",
+        "Who is Scorpion, again?",
+        "reply 2",
+    ]
+    assert http_server._chat_session_turns == {}
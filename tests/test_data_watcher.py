@@ -0,0 +1,71 @@
+import os
+import threading
+
+import numpy as np
+
+from mkmchat.data.rag import Document, QueryEmbeddingCache, RAGSystem
+from mkmchat.data.watcher import DataWatcher, stat_fingerprint
+
+
+def _make_rag(data_dir):
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.enabled = True
+    rag.data_dir = data_dir
+    rag.model_name = "mini"
+    rag._query_cache = QueryEmbeddingCache(rag.model_name)
+    rag._watcher = None
+    rag._set_index([Document("Bleed", {}, "glossary")], np.ones((1, 2), dtype=np.float32))
+    rag._last_data_hash = rag._get_cache_hash()
+    rag._data_fingerprint = stat_fingerprint(data_dir)
+    rag._stale = False
+    return rag
+
+
+def test_stat_fingerprint_tracks_size_mtime_and_new_files(tmp_path):
+    data = tmp_path / "characters.tsv"
+    data.write_text("name\ttier\n")
+    before = stat_fingerprint(tmp_path)
+
+    data.write_text("name\ttier\nScorpion\tA\n")
+    after_edit = stat_fingerprint(tmp_path)
+    (tmp_path / "glossary.txt").write_text("Bleed\n")
+
+    assert before != after_edit
+    assert len(stat_fingerprint(tmp_path)) == 2
+    assert stat_fingerprint(tmp_path) == stat_fingerprint(tmp_path)
+
+
+def test_refresh_staleness_rehashes_only_when_fingerprint_moves(tmp_path, monkeypatch):
+    data = tmp_path / "characters.tsv"
+    data.write_text("name\ttier\n")
+    rag = _make_rag(tmp_path)
+    hashes = []
+    original = RAGSystem._get_cache_hash
+    monkeypatch.setattr(RAGSystem, "_get_cache_hash", lambda self: hashes.append(1) or original(self))
+
+    assert rag.refresh_staleness() is False
+    assert hashes == []
+
+    # Touching without a content change re-hashes once, but stays fresh
+    stat = data.stat()
+    os.utime(data, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert rag.refresh_staleness() is False
+    assert len(hashes) == 1
+
+    data.write_text("name\ttier\nScorpion\tA\n")
+    assert rag.refresh_staleness() is True
+    assert rag.is_stale()
+    assert len(hashes) == 2
+
+
+def test_data_watcher_runs_checks_in_background(tmp_path):
+    called = threading.Event()
+    watcher = DataWatcher(tmp_path, called.set, interval=0.01)
+
+    watcher.start()
+    try:
+        assert called.wait(2)
+        assert watcher.running
+    finally:
+        watcher.stop(timeout=2)
+    assert not watcher.running
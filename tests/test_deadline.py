@@ -0,0 +1,116 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from mkmchat import deadline, http_server
+from mkmchat.http_server import _compact_chat_history
+
+
+def test_request_timeout_takes_the_sooner_of_header_and_server_limit():
+    assert deadline.request_timeout("30", 600) == 30
+    assert deadline.request_timeout("9000", 600) == 600
+    assert deadline.request_timeout("soon", 600) == 600
+    assert deadline.request_timeout(None, 600) == 600
+
+
+async def test_stages_are_cut_short_by_the_request_deadline(monkeypatch):
+    monkeypatch.setenv("MKM_RETRIEVAL_TIMEOUT_SECONDS", "0.1")
+
+    async def _stages():
+        assert deadline.stage_timeout("retrieval", 600) == pytest.approx(0.1)
+        assert 0 < deadline.stage_timeout("generation", 600) <= 1
+        with pytest.raises(deadline.DeadlineExceeded, match="retrieval"):
+            await deadline.within("retrieval", asyncio.sleep(1), 600)
+        return "ok"
+
+    assert await deadline.with_deadline(1, _stages()) == "ok"
+    assert deadline.current_deadline() is None
+    assert deadline.stage_timeout("generation", 600) == 600
+    with pytest.raises(deadline.DeadlineExceeded, match="request"):
+        await deadline.with_deadline(0.05, asyncio.sleep(1))
+
+
+async def test_summary_timeout_skips_compaction(monkeypatch):
+    monkeypatch.setenv("MKM_CHAT_KEEP_RECENT_MESSAGES", "2")
+    monkeypatch.setenv("MKM_CHAT_COMPACT_TRIGGER_MESSAGES", "4")
+
+    async def _slow_summary(**kwargs):
+        raise deadline.DeadlineExceeded("summary")
+
+    monkeypatch.setattr(http_server, "_summarize_messages", _slow_summary)
+    messages = [{"role": "user", "content": f"m{i}"} for i in range(6)]
+
+    result = await _compact_chat_history(
+        assistant=None, use_model="m", messages=messages, existing_summary="old", existing_summary_count=3
+    )
+
+    assert result == ("old", 3, messages)
+
+
+async def test_route_past_its_deadline_answers_504(monkeypatch):
+    async def _slow_route():
+        await asyncio.sleep(1)
+
+    with pytest.raises(http_server.RequestError) as error:
+        await http_server.run_with_deadline("0.05", _slow_route())
+
+    assert error.value.status == 504
+    assert "deadline" in error.value.payload["error"]
+
+
+async def test_stream_past_its_deadline_ends_with_an_error_frame():
+    closed = asyncio.Event()
+
+    async def _frames():
+        try:
+            yield {"type": "delta", "text": "a"}
+            await asyncio.sleep(1)
+            yield {"type": "delta", "text": "b"}
+        finally:
+            closed.set()
+
+    frames = _frames()
+    stop_at = time.monotonic() + 0.1
+    assert (await http_server.next_frame(frames, stop_at))["text"] == "a"
+    frame = await http_server.next_frame(frames, stop_at)
+
+    assert frame["type"] == "error"
+    assert closed.is_set()
+
+
+def test_threaded_server_cancels_the_route_when_the_client_hangs_up(monkeypatch):
+    monkeypatch.setenv("MKM_API_KEY", "secret")
+    monkeypatch.setenv("MKM_RATE_LIMIT_ENABLED", "false")
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    async def _slow_ask(question, model=None):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(http_server, "ask_question_json", _slow_ask)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), http_server.MKMobileHTTPHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        body = b'{"question": "q"}'
+        client = socket.create_connection(httpd.server_address)
+        client.sendall(
+            b"POST /ask-question HTTP/1.1\r\nHost: test\r\nX-API-Key: secret\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        assert started.wait(5)
+        client.close()
+
+        assert cancelled.wait(5)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -48,6 +48,9 @@ class _FakeResponse:
 class _FakeAsyncClient:
     payload = {"response": "{}"}
 
+    def __init__(self, *args, **kwargs):
+        pass
+
     async def __aenter__(self):
         return self
 
@@ -57,6 +60,26 @@ class _FakeAsyncClient:
     async def post(self, url, json=None, timeout=None):
         return _FakeResponse(200, self.payload)
 
+    def stream(self, method, url, json=None, timeout=None):
+        _FakeAsyncClient.last_request = json
+        return _FakeStreamResponse(self.payload)
+
+
+class _FakeStreamResponse:
+    status_code = 200
+
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    async def aiter_lines(self):
+        yield json.dumps({**self._payload, "done": True})
+
 
 def _build_rag_fixture():
     char_doc = _FakeDoc(
@@ -162,3 +185,30 @@ async def test_suggest_team_json_accepts_required_schema(monkeypatch):
     assert result["response"]["char1"]["name"] == "Klassic Scorpion"
     assert result["response"]["char1"]["equipment"][0]["slot"] == "weapon"
     assert result["response"]["strategy"]
+
+
+@pytest.mark.asyncio
+async def test_suggest_team_json_hydrates_catalog_ids(monkeypatch):
+    rag = _build_rag_fixture()
+
+    monkeypatch.setattr("mkmchat.http_server.get_rag_system", lambda: rag)
+    monkeypatch.setattr("mkmchat.http_server.get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr("httpx.AsyncClient", _FakeAsyncClient)
+
+    member = {"id": "C1", "equipment": ["W1", "X9"]}
+    payload = {"char1": member, "char2": member, "char3": member, "strategy": "Burn them down."}
+    _FakeAsyncClient.payload = {"response": json.dumps(payload)}
+    result = await suggest_team_json("aggressive", model="llama3.2:3b")
+
+    system_prompt = _FakeAsyncClient.last_request["messages"][0]["content"]
+    user_prompt = _FakeAsyncClient.last_request["messages"][1]["content"]
+    assert '"id": "<C id>"' in system_prompt
+    assert "- C1 [S] Rarity: Diamond | Name: Klassic Scorpion" in user_prompt
+    assert "- W1 [A] Wrath Hammer (Start with power)" in user_prompt
+
+    char1 = result["response"]["char1"]
+    assert char1["name"] == "Klassic Scorpion"
+    assert char1["rarity"] == "Diamond"
+    assert char1["passive"] == "Applies fire damage over time."
+    assert char1["equipment"] == [{"name": "Wrath Hammer", "slot": "weapon", "effect": "Start with power"}]
+    assert result["response"]["strategy"] == "Burn them down."
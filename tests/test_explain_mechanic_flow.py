@@ -168,3 +168,21 @@ async def test_explain_mechanic_json_error_is_sanitized(monkeypatch):
 
     assert "error" in result
     assert "raw_response" not in result
+
+
+def test_failed_model_list_lookups_are_not_repeated_per_request(monkeypatch):
+    calls = []
+
+    def _unreachable(url, timeout=None):
+        calls.append(url)
+        raise ConnectionError("ollama is down")
+
+    monkeypatch.setattr("httpx.get", _unreachable)
+    assistant = _new_assistant_for_unit_tests()
+    assistant.base_url = "http://fake-ollama"
+    assistant.model_name = "llama3.2"
+    assistant._models_cache = None
+
+    assert assistant._resolve_model_name(None) == "llama3.2"
+    assert assistant._resolve_model_name("mistral") == "mistral"
+    assert len(calls) == 1
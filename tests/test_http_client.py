@@ -0,0 +1,38 @@
+import asyncio
+
+from mkmchat.llm import http_client
+
+
+async def test_client_is_shared_per_base_url_and_left_open():
+    async with http_client.ollama_client("http://ollama:11434/") as first:
+        pass
+    async with http_client.ollama_client("http://ollama:11434") as second:
+        pass
+    other = http_client.get_client("http://other:11434")
+
+    assert first is second
+    assert other is not first
+    assert not first.is_closed
+
+    await http_client.aclose_clients()
+    assert first.is_closed and other.is_closed
+    assert http_client.get_client("http://ollama:11434") is not first
+    await http_client.aclose_clients()
+
+
+def test_each_event_loop_gets_its_own_client():
+    async def grab():
+        client = http_client.get_client("http://ollama:11434")
+        await http_client.aclose_clients()
+        return client
+
+    assert asyncio.run(grab()) is not asyncio.run(grab())
+
+
+def test_http2_only_for_tls_with_h2(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP2_AVAILABLE", True)
+    assert http_client._use_http2("https://ollama.example")
+    assert not http_client._use_http2("http://ollama:11434")
+
+    monkeypatch.setenv("MKM_OLLAMA_HTTP2", "false")
+    assert not http_client._use_http2("https://ollama.example")
@@ -0,0 +1,170 @@
+import json
+import threading
+
+import numpy as np
+
+from mkmchat.data import index_store
+from mkmchat.data.rag import Document, QueryEmbeddingCache, RAGSystem
+
+
+def _rows():
+    return [
+        ("Character: Scorpion\nPassive: fire", {"name": "Scorpion", "tier": "A"}, "character"),
+        ("Glossary: Bleed — damage over time", {"term": "bleed"}, "glossary"),
+    ]
+
+
+def test_save_and_load_round_trip_uses_memory_map(tmp_path):
+    embeddings = np.arange(6, dtype=np.float32).reshape(2, 3)
+
+    manifest = index_store.save_index(
+        tmp_path, _rows(), embeddings, model_name="mini", data_hash="abc"
+    )
+    rows, loaded, loaded_manifest = index_store.load_index(
+        tmp_path, model_name="mini", data_hash="abc"
+    )
+
+    assert rows == _rows()
+    assert isinstance(loaded, np.memmap)
+    assert not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, embeddings)
+    assert loaded_manifest == manifest
+    assert manifest["dimension"] == 3
+    assert manifest["document_count"] == 2
+    assert not list(tmp_path.rglob("*.pkl"))
+
+
+def test_load_rejects_mismatched_model_hash_or_version(tmp_path):
+    index_store.save_index(
+        tmp_path, _rows(), np.ones((2, 3), dtype=np.float32), model_name="mini", data_hash="abc"
+    )
+
+    assert index_store.load_index(tmp_path, model_name="other", data_hash="abc") is None
+    assert index_store.load_index(tmp_path, model_name="mini", data_hash="changed") is None
+
+    manifest_path = tmp_path / index_store.MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    manifest["format_version"] = 0
+    manifest_path.write_text(json.dumps(manifest))
+    assert index_store.load_index(tmp_path, model_name="mini") is None
+
+
+def test_save_replaces_previous_generation_and_legacy_pickle(tmp_path):
+    (tmp_path / "embeddings.pkl").write_bytes(b"legacy")
+    first = index_store.save_index(
+        tmp_path, _rows(), np.ones((2, 3), dtype=np.float32), model_name="mini", data_hash="a"
+    )
+    second = index_store.save_index(
+        tmp_path, _rows()[:1], np.ones((1, 3), dtype=np.float32), model_name="mini", data_hash="b"
+    )
+
+    assert not (tmp_path / first["generation"]).exists()
+    assert (tmp_path / second["generation"]).is_dir()
+    assert not (tmp_path / "embeddings.pkl").exists()
+    rows, _, _ = index_store.load_index(tmp_path, model_name="mini", data_hash="b")
+    assert len(rows) == 1
+
+
+def test_rag_system_cache_round_trip(tmp_path):
+    (tmp_path / "glossary.txt").write_text("Bleed: damage over time\n")
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.enabled = True
+    rag.data_dir = tmp_path
+    rag.cache_dir = tmp_path / ".rag_cache"
+    rag.model_name = "mini"
+    rag._query_cache = QueryEmbeddingCache(rag.model_name)
+    rag._manifest = None
+    rag._set_index(
+        [Document(content, metadata, doc_type) for content, metadata, doc_type in _rows()],
+        np.eye(2, 3, dtype=np.float32),
+    )
+    rag._save_cache()
+
+    reloaded = RAGSystem.__new__(RAGSystem)
+    reloaded.__dict__.update(
+        {
+            key: rag.__dict__[key]
+            for key in ("enabled", "data_dir", "cache_dir", "model_name", "_query_cache")
+        }
+    )
+    reloaded._stale = False
+    reloaded._watcher = None
+    reloaded._reindex_lock = threading.Lock()
+    reloaded._reindex_progress = {"state": "idle"}
+    reloaded._reindex_again = False
+    assert reloaded._load_cache()
+    assert [doc.metadata for doc in reloaded.documents] == [row[1] for row in _rows()]
+    assert reloaded.lexical_index.doc_count == 2
+    status = reloaded.get_status()
+    assert status["cache_format_version"] == index_store.FORMAT_VERSION
+    assert status["data_stale"] is False
+
+    (tmp_path / "glossary.txt").write_text("Bleed: changed\n")
+    assert not reloaded._load_cache()
+
+
+class _CountingEncoder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.encoded.extend(texts)
+        return np.array([[len(text), 1.0, 0.0] for text in texts], dtype=np.float32)
+
+
+def test_rebuild_only_embeds_new_or_changed_documents(tmp_path):
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.enabled = True
+    rag.data_dir = tmp_path
+    rag.cache_dir = tmp_path / ".rag_cache"
+    rag.model_name = "mini"
+    rag.model = _CountingEncoder()
+    rag._query_cache = QueryEmbeddingCache(rag.model_name)
+
+    contents = ["Scorpion tier A", "Sub-Zero tier S", "Bleed glossary"]
+    documents = [Document(content, {}, "character") for content in contents]
+    rag._set_index(documents, rag._embed_documents(contents))
+    rag._save_cache()
+    assert rag.model.encoded == contents
+
+    rag.model.encoded.clear()
+    edited = ["Scorpion tier S", "Sub-Zero tier S", "Bleed glossary", "New entry"]
+    embeddings = rag._embed_documents(edited)
+
+    assert rag.model.encoded == ["Scorpion tier S", "New entry"]
+    np.testing.assert_array_equal(embeddings[1], rag.embeddings[1])
+    np.testing.assert_array_equal(embeddings[3], [len("New entry"), 1.0, 0.0])
+
+    rag.model_name = "other"
+    rag.model.encoded.clear()
+    rag._embed_documents(edited)
+    assert rag.model.encoded == edited
+
+
+def test_same_inputs_produce_the_same_generation(tmp_path):
+    embeddings = np.ones((2, 3), dtype=np.float32)
+
+    first = index_store.save_index(tmp_path, _rows(), embeddings, model_name="mini", data_hash="a")
+    second = index_store.save_index(tmp_path, _rows(), embeddings, model_name="mini", data_hash="a")
+
+    assert first == second
+    assert (tmp_path / first["generation"]).is_dir()
+    assert len(list(tmp_path.glob("gen-*"))) == 1
+
+
+def test_build_lock_serializes_builders(tmp_path):
+    order = []
+    entered = threading.Event()
+
+    def builder():
+        with index_store.build_lock(tmp_path):
+            order.append("second")
+
+    with index_store.build_lock(tmp_path):
+        thread = threading.Thread(target=builder)
+        thread.start()
+        entered.wait(0.1)
+        order.append("first")
+    thread.join(5)
+
+    assert order == ["first", "second"]
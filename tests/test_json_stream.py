@@ -0,0 +1,95 @@
+import json
+
+from mkmchat.llm.json_stream import IncrementalJSONObject
+from mkmchat.llm.ollama import OllamaAssistant
+
+
+def _feed_all(parser, chunks):
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return fields
+
+
+def test_fields_are_reported_as_each_value_closes():
+    parser = IncrementalJSONObject()
+    text = '<think>maybe {"not": "this"}</think>```json\n{"definition": "A, {b}", "recommendations": ["x", "y"]}\n``` more'
+
+    seen = []
+    for char in text:
+        for key, _ in parser.feed(char):
+            seen.append((key, parser.done))
+
+    assert seen == [("definition", False), ("recommendations", True)]
+    assert parser.value == {"definition": "A, {b}", "recommendations": ["x", "y"]}
+
+
+def test_rejected_object_is_skipped_for_the_next_one():
+    parser = IncrementalJSONObject(accept=lambda obj: "char3" in obj)
+
+    _feed_all(parser, ['{"char1": {"name": "A"}}', ' {"char1": {"name": "B"}, ', '"char3": {"name": "C"}}'])
+
+    assert parser.value == {"char1": {"name": "B"}, "char3": {"name": "C"}}
+
+
+def test_malformed_object_leaves_value_unset():
+    parser = IncrementalJSONObject()
+
+    _feed_all(parser, ["{'definition': 'single quotes'}"])
+
+    assert not parser.done
+    assert parser.text == "{'definition': 'single quotes'}"
+
+
+class _CountingStream:
+    def __init__(self, lines):
+        self.status_code = 200
+        self.lines = lines
+        self.sent = 0
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.closed = True
+        return False
+
+    async def aiter_lines(self):
+        for line in self.lines:
+            self.sent += 1
+            yield line
+
+
+async def test_explain_mechanic_stops_generation_after_a_complete_object(monkeypatch):
+    tokens = ['{"definition": "Drains', ' power.", ', '"recommendations": "Gain it back."}']
+    tokens += [" and then the model keeps rambling"] * 50
+    stream = _CountingStream([json.dumps({"response": token, "done": False}) for token in tokens])
+
+    class _Client:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def stream(self, method, url, json=None, timeout=None):
+            return stream
+
+    monkeypatch.setattr("httpx.AsyncClient", _Client)
+    assistant = OllamaAssistant.__new__(OllamaAssistant)
+    assistant.enabled = True
+    assistant.rag_system = None
+    assistant.system_context = ""
+    assistant.base_url = "http://fake-ollama"
+    assistant.model_name = "llama3.2:3b"
+    monkeypatch.setattr(assistant, "_resolve_model_name", lambda model: "llama3.2:3b")
+    monkeypatch.setattr(assistant, "_build_mechanic_rag_context", lambda mechanic: "")
+
+    frames = [frame async for frame in assistant.explain_mechanic_stream("power drain")]
+
+    assert [(frame["type"], frame.get("name")) for frame in frames] == [
+        ("field", "definition"),
+        ("field", "recommendations"),
+        ("done", None),
+    ]
+    assert frames[-1]["response"] == {"definition": "Drains power.", "recommendations": "Gain it back."}
+    assert stream.sent == 3
+    assert stream.closed
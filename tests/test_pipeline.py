@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from mkmchat import http_server
+from mkmchat.pipeline import PIPELINE_STATS, Pipeline
+
+
+@pytest.mark.asyncio
+async def test_independent_stages_overlap_and_the_critical_path_is_the_slow_chain():
+    pipeline = Pipeline("test")
+
+    async def _model_then_compaction():
+        await pipeline.stage("model", asyncio.sleep(0.01))
+        await pipeline.stage("compaction", asyncio.sleep(0.01))
+        return "done"
+
+    def _blocking_search():
+        with pipeline.timed("retrieval.search"):
+            time.sleep(0.03)
+        return pipeline.map_threads({"retrieval.a": lambda: time.sleep(0.02) or "a", "retrieval.b": lambda: "b"})
+
+    started = time.perf_counter()
+    chain, sections = await pipeline.gather(
+        _model_then_compaction(), pipeline.stage("retrieval", asyncio.to_thread(_blocking_search))
+    )
+    elapsed = time.perf_counter() - started
+
+    assert (chain, sections) == ("done", {"retrieval.a": "a", "retrieval.b": "b"})
+    assert elapsed < 0.075
+    assert pipeline.critical_path() == ["retrieval.search", "retrieval.a"]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_stage_cancels_the_others():
+    pipeline = Pipeline("test")
+    cancelled = asyncio.Event()
+
+    async def _slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def _fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await pipeline.gather(_slow(), _fail())
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
+
+
+class _Rag:
+    enabled = True
+    _last_data_hash = None
+
+
+class _AssistantStub:
+    enabled = True
+    base_url = "http://ollama:11434"
+
+    def _resolve_model_name(self, model):
+        return model or "llama3.2:3b"
+
+
+@pytest.mark.asyncio
+async def test_chat_request_records_its_stages(monkeypatch):
+    PIPELINE_STATS.reset()
+    monkeypatch.setattr(
+        http_server,
+        "build_chat_context",
+        lambda rag, query, pipeline=None: {"characters": "", "equipment": "", "gameplay": "", "glossary": ""},
+    )
+
+    await http_server._chat_request(_Rag(), _AssistantStub(), "hi", [], None, 0, None)
+
+    stats = PIPELINE_STATS.stats()["/chat"]
+    assert stats["runs"] == 1
+    assert set(stats["stages"]) == {"model", "compaction", "retrieval"}
@@ -0,0 +1,256 @@
+import numpy as np
+import pytest
+
+from mkmchat.data.rag import Document, QueryEmbeddingCache, RAGSystem
+from mkmchat.data.lexical import InvertedIndex
+from mkmchat.http_server import (
+    _retrieve_character_items,
+    _retrieve_equipment_items,
+    _search_with_variants,
+)
+
+
+_AXES = ["fire", "freeze", "power", "bleed", "klassic", "classic"]
+
+
+class _KeywordEncoder:
+    """Deterministic stand-in for SentenceTransformer: one axis per keyword."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.calls.append(list(texts))
+        rows = []
+        for text in texts:
+            lowered = text.lower()
+            vec = np.array([lowered.count(word) for word in _AXES], dtype=np.float32) + 0.01
+            rows.append(vec / np.linalg.norm(vec))
+        return np.vstack(rows)
+
+
+def _make_rag(documents):
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.enabled = True
+    rag.model_name = "keyword-encoder"
+    rag.model = _KeywordEncoder()
+    rag._query_cache = QueryEmbeddingCache(rag.model_name)
+    rag._set_index(documents, rag.model.encode([doc.content for doc in documents]))
+    rag.model.calls.clear()
+    return rag
+
+
+def _corpus():
+    return [
+        Document(
+            "Character: Klassic Scorpion\nPassive: fire fire",
+            {"name": "Klassic Scorpion", "class": "Netherrealm", "rarity": "Gold", "tier": "A"},
+            "character",
+        ),
+        Document(
+            "Character: Sub-Zero\nPassive: freeze",
+            {"name": "Sub-Zero", "class": "Martial Artist", "rarity": "Diamond", "tier": "S"},
+            "character",
+        ),
+        Document(
+            "Character: Blaze\nPassive: fire power",
+            {"name": "Blaze", "class": "Elder God", "rarity": "Diamond", "tier": "C"},
+            "character",
+        ),
+        Document(
+            "Equipment: Torch\nEffect: fire damage",
+            {"name": "Torch", "type": "Weapon", "rarity": "Epic", "tier": "B"},
+            "equipment",
+        ),
+        Document(
+            "Equipment: Ember Cloak\nEffect: fire resist",
+            {"name": "Ember Cloak", "type": "Armor", "rarity": "Epic", "tier": "S+"},
+            "equipment",
+        ),
+        Document("Power drain removes enemy power bars.", {"term": "power drain"}, "glossary"),
+        Document("Bleed deals damage over time.", {"term": "bleed"}, "glossary"),
+    ]
+
+
+def test_search_filters_by_doc_type_and_similarity():
+    rag = _make_rag(_corpus())
+
+    results = rag.search("fire", top_k=5, doc_type="character", min_similarity=0.5)
+
+    assert [doc.metadata["name"] for doc, _ in results] == ["Klassic Scorpion", "Blaze"]
+    assert all(doc.doc_type == "character" for doc, _ in results)
+
+
+def test_search_applies_metadata_predicates_as_masks():
+    rag = _make_rag(_corpus())
+
+    by_tier = rag.search("fire", top_k=5, doc_type="character", min_similarity=0.0, min_tier="A")
+    by_rarity = rag.search(
+        "fire", top_k=5, doc_type="character", min_similarity=0.0, rarities=["diamond"]
+    )
+    by_class = rag.search(
+        "fire", top_k=5, doc_type="character", min_similarity=0.0, char_class="Elder God"
+    )
+    by_type = rag.search("fire", top_k=5, doc_type="equipment", min_similarity=0.0, equip_type="Armor")
+
+    assert {doc.metadata["name"] for doc, _ in by_tier} == {"Klassic Scorpion", "Sub-Zero"}
+    assert {doc.metadata["name"] for doc, _ in by_rarity} == {"Sub-Zero", "Blaze"}
+    assert [doc.metadata["name"] for doc, _ in by_class] == ["Blaze"]
+    assert [doc.metadata["name"] for doc, _ in by_type] == ["Ember Cloak"]
+    assert rag.search("fire", doc_type="equipment", equip_type="Boots") == []
+
+
+def test_top_k_selection_matches_full_sort():
+    rag = _make_rag(_corpus())
+
+    results = rag.search("fire power", top_k=3, doc_type=None, min_similarity=-1.0)
+    scores = [score for _, score in results]
+
+    assert len(results) == 3
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_search_many_encodes_all_queries_in_one_batch():
+    rag = _make_rag(_corpus())
+
+    hits = rag.search_many(
+        ["classic fire", "klassic fire", "classic fire"],
+        ["character", "equipment", "glossary"],
+        top_k={"character": 2, "equipment": 2, "glossary": 1},
+        min_similarity=0.1,
+    )
+
+    assert rag.model.calls == [["classic fire", "klassic fire"]]
+    assert set(hits) == {"character", "equipment", "glossary"}
+    assert hits["character"][0][0].metadata["name"] == "Klassic Scorpion"
+    assert len(hits["glossary"]) <= 1
+
+
+def test_search_many_pools_best_score_per_document():
+    rag = _make_rag(_corpus())
+
+    hits = rag.search_many(["fire", "klassic fire"], ["character"], top_k=1, min_similarity=0.0)
+
+    names = [doc.metadata["name"] for doc, _ in hits["character"]]
+    assert names == ["Klassic Scorpion"]
+    single = rag.search("klassic fire", top_k=1, doc_type="character", min_similarity=0.0)
+    assert hits["character"][0][1] == pytest.approx(single[0][1], abs=1e-6)
+
+
+def test_search_with_variants_uses_batched_search():
+    rag = _make_rag(_corpus())
+
+    results = _search_with_variants(
+        rag,
+        "Classic Scorpion fire",
+        doc_type="character",
+        top_k_per_variant=2,
+        min_similarity=0.1,
+    )
+
+    assert len(rag.model.calls) == 1
+    assert len(rag.model.calls[0]) == 2
+    assert results[0][0].metadata["name"] == "Klassic Scorpion"
+
+
+def test_query_embedding_cache_serves_repeats_without_encoding():
+    rag = _make_rag(_corpus())
+
+    rag.search("what is bleed", doc_type="glossary", min_similarity=0.0)
+    rag.search("  what is bleed  ", doc_type="glossary", min_similarity=0.0)
+    rag.search_many(["what is bleed", "fire"], ["glossary"], min_similarity=0.0)
+
+    assert rag.model.calls == [["what is bleed"], ["fire"]]
+    stats = rag._query_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_query_embedding_cache_invalidates_on_model_change():
+    rag = _make_rag(_corpus())
+
+    rag.search("fire", doc_type="character")
+    rag.model_name = "another-encoder"
+    rag.search("fire", doc_type="character")
+
+    assert rag.model.calls == [["fire"], ["fire"]]
+    assert rag._query_cache.model_name == "another-encoder"
+
+
+def test_query_embedding_cache_respects_entry_and_byte_limits():
+    vector = np.ones(4, dtype=np.float32)
+    cache = QueryEmbeddingCache("m", max_entries=2, max_bytes=1024)
+
+    for key in ["a", "b", "c"]:
+        cache.put(key, vector)
+
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+    tiny = QueryEmbeddingCache("m", max_entries=10, max_bytes=30)
+    tiny.put("x", vector)
+    tiny.put("y", vector)
+    assert tiny.stats()["entries"] == 1
+
+
+def test_tier_boost_is_fused_before_top_k_selection():
+    rag = _make_rag(_corpus())
+
+    plain = rag.search("fire power", top_k=1, doc_type="character", min_similarity=0.0)
+    boosted = rag.search(
+        "fire power", top_k=1, doc_type="character", min_similarity=0.0, tier_boost=0.2
+    )
+
+    assert plain[0][0].metadata["name"] == "Blaze"
+    assert boosted[0][0].metadata["name"] == "Klassic Scorpion"
+    assert boosted[0][1] > plain[0][1]
+
+
+def test_search_characters_keeps_high_tier_hits_without_over_fetch():
+    rag = _make_rag(_corpus())
+
+    results = rag.search_characters("fire power", top_k=1, tier_boost=0.3)
+
+    assert len(results) == 1
+    assert results[0][0].metadata["name"] == "Klassic Scorpion"
+    assert len(rag.model.calls) == 1
+
+
+def test_inverted_index_bm25_prefers_rare_terms_and_names():
+    index = InvertedIndex(_corpus())
+
+    rows, scores = index.bm25({"resist", "fire"}, doc_type="equipment")
+    ranked = [index.documents[row].metadata["name"] for row in rows[np.argsort(-scores)]]
+
+    assert ranked == ["Ember Cloak", "Torch"]
+    assert index.term_overlap({"scorpion", "blaze"}, "name", "character") == {0: 1, 2: 1}
+    assert index.name_phrase_rows("is sub zero good", "character") == [1]
+    assert index.bm25({"nothing"})[0].size == 0
+
+
+def test_lexical_weight_fuses_bm25_into_vector_ranking():
+    rag = _make_rag(_corpus())
+
+    plain = rag.search("ember", top_k=2, doc_type="equipment", min_similarity=0.99)
+    hybrid = rag.search(
+        "ember", top_k=2, doc_type="equipment", min_similarity=0.99, lexical_weight=0.5
+    )
+
+    assert plain == []
+    assert [doc.metadata["name"] for doc, _ in hybrid] == ["Ember Cloak"]
+
+
+def test_lexical_retrieval_uses_index_candidates():
+    rag = _make_rag(_corpus())
+
+    characters = _retrieve_character_items(
+        rag, "is Sub-Zero good", top_k_semantic=2, top_k_final=3, min_similarity=0.99
+    )
+    equipment = _retrieve_equipment_items(
+        rag, "ember cloak", top_k_per_variant=2, top_k_final=3, min_similarity=0.99, tier_boost=0.0
+    )
+
+    assert [doc.metadata["name"] for doc, _ in characters] == ["Sub-Zero"]
+    assert characters[0][1] == pytest.approx(0.995)
+    assert [doc.metadata["name"] for doc, _ in equipment] == ["Ember Cloak"]
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from mkmchat import http_server
+from mkmchat.rate_limit import TokenBucketLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_sustained_rate_with_retry_hint():
+    clock = _Clock()
+    limiter = TokenBucketLimiter(clock=clock)
+
+    assert [limiter.check("a", 20, 5, 10) for _ in range(5)] == [None] * 5
+    wait = limiter.check("a", 20, 5, 10)
+    assert wait == pytest.approx(2.0)
+    assert limiter.check("b", 20, 5, 10) is None
+
+    clock.now += 2
+    assert limiter.check("a", 20, 5, 10) is None
+    assert limiter.stats() == {"keys": 2, "allowed": 7, "limited": 1, "evicted": 0}
+
+
+def test_idle_keys_are_evicted_and_key_count_is_bounded():
+    clock = _Clock()
+    limiter = TokenBucketLimiter(stripes=1, max_keys=3, clock=clock)
+
+    for ip in ("a", "b", "c", "d"):
+        limiter.check(ip, 20, 5, 10)
+    assert limiter.stats()["keys"] == 3
+
+    clock.now += 61
+    limiter.check("e", 20, 5, 10)
+    assert limiter.stats() == {"keys": 1, "allowed": 5, "limited": 0, "evicted": 4}
+
+
+def test_concurrent_checks_never_overspend_a_bucket():
+    limiter = TokenBucketLimiter(clock=_Clock())
+    results = []
+
+    def _hammer():
+        for _ in range(50):
+            results.append(limiter.check("shared", 100, 100, 60))
+
+    threads = [threading.Thread(target=_hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(result is None for result in results) == 100
+
+
+def test_rate_limit_key_strategies_and_retry_after_payload(monkeypatch):
+    headers = {"X-Forwarded-For": "203.0.113.7, 10.0.0.1", "X-API-Key": "secret"}
+    monkeypatch.setattr(http_server, "_rate_limiter", TokenBucketLimiter())
+    monkeypatch.setenv("MKM_RATE_LIMIT_BURST", "1")
+
+    assert http_server._rate_limit_key("10.0.0.2", headers.get) == "ip:10.0.0.2"
+    monkeypatch.setenv("MKM_RATE_LIMIT_KEY", "forwarded-for")
+    assert http_server._rate_limit_key("10.0.0.2", headers.get) == "ip:203.0.113.7"
+    assert http_server._rate_limit_key("10.0.0.2", {}.get) == "ip:10.0.0.2"
+    monkeypatch.setenv("MKM_RATE_LIMIT_KEY", "api-key")
+    key = http_server._rate_limit_key("10.0.0.2", headers.get)
+    assert key.startswith("key:") and "secret" not in key
+
+    http_server._check_rate_limit(key)
+    with pytest.raises(http_server.RequestError) as error:
+        http_server._check_rate_limit(key)
+    assert error.value.status == 429
+    assert error.value.payload == {"error": "Too many requests", "retry_after": 10}
+    assert http_server._status_headers(error.value.payload) == [("Retry-After", "10")]
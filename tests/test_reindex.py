@@ -0,0 +1,140 @@
+import threading
+
+import numpy as np
+
+from mkmchat.data import rag as rag_module
+from mkmchat.data.rag import Document, RAGSystem
+
+
+class _GatedEncoder:
+    """Encoder whose batches can be held open to observe a rebuild in flight."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def encode(self, texts, show_progress_bar=False):
+        self.entered.set()
+        assert self.gate.wait(5)
+        return np.array(
+            [[1.0, float("fire" in text.lower())] for text in texts], dtype=np.float32
+        )
+
+
+def _make_rag(tmp_path, monkeypatch, documents, gated=False):
+    encoder = _GatedEncoder()
+    if gated:
+        encoder.gate.clear()
+    monkeypatch.setattr(rag_module, "EMBEDDINGS_AVAILABLE", True)
+    monkeypatch.setattr(rag_module, "SentenceTransformer", lambda name: encoder)
+    rag = RAGSystem(data_dir=tmp_path, model_name="gated")
+    corpus = {"documents": documents}
+    monkeypatch.setattr(rag, "_build_documents", lambda: list(corpus["documents"]))
+    rag.index_data()
+    return rag, encoder, corpus
+
+
+def _wait_for_reindex(rag):
+    for _ in range(500):
+        if not rag.reindex_running:
+            return
+        threading.Event().wait(0.01)
+
+
+def test_background_reindex_swaps_snapshot_atomically(tmp_path, monkeypatch):
+    rag, encoder, corpus = _make_rag(
+        tmp_path, monkeypatch, [Document("Scorpion fire", {"name": "Scorpion"}, "character")]
+    )
+    before = rag.snapshot
+    rag.search("anything", doc_type="character", min_similarity=0.0)  # warm the query cache
+
+    encoder.gate.clear()
+    encoder.entered.clear()
+    corpus["documents"] = [
+        Document("Scorpion fire", {"name": "Scorpion"}, "character"),
+        Document("Sub-Zero ice", {"name": "Sub-Zero"}, "character"),
+    ]
+    (tmp_path / "characters.tsv").write_text("edited\n")
+    progress = rag.request_reindex()
+    assert progress["state"] == "running"
+    assert encoder.entered.wait(5)
+
+    # In flight: searches still see the old, complete snapshot
+    assert rag.snapshot is before
+    assert rag.reindex_progress()["phase"] == "embedding"
+    assert len(rag.search("anything", doc_type="character", min_similarity=0.0)) == 1
+
+    encoder.gate.set()
+    _wait_for_reindex(rag)
+
+    progress = rag.reindex_progress()
+    assert progress["state"] == "done"
+    assert progress["document_count"] == 2
+    assert progress["embedded"] == progress["to_embed"] == 1
+    assert len(before.documents) == 1
+    assert len(rag.documents) == 2
+
+
+def test_reindex_requests_while_running_are_queued_once(tmp_path, monkeypatch):
+    rag, encoder, corpus = _make_rag(
+        tmp_path, monkeypatch, [Document("Scorpion fire", {"name": "Scorpion"}, "character")]
+    )
+    encoder.gate.clear()
+    encoder.entered.clear()
+    corpus["documents"] = [Document("Blaze fire", {"name": "Blaze"}, "character")]
+    (tmp_path / "characters.tsv").write_text("edited\n")
+
+    rag.request_reindex()
+    assert encoder.entered.wait(5)
+    assert rag.request_reindex()["queued"] is True
+    assert rag.request_reindex()["queued"] is True
+
+    encoder.gate.set()
+    _wait_for_reindex(rag)
+
+    assert not rag.reindex_running
+    assert rag.reindex_progress() == {**rag.reindex_progress(), "state": "done", "queued": False}
+    assert [doc.metadata["name"] for doc in rag.documents] == ["Blaze"]
+
+
+def test_stale_prebuilt_artifact_is_served_while_reindexing(tmp_path, monkeypatch):
+    _make_rag(tmp_path, monkeypatch, [Document("Scorpion fire", {"name": "Scorpion"}, "character")])
+    (tmp_path / "characters.tsv").write_text("edited\n")
+
+    # A restarted process must not embed before serving: it loads the old artifact
+    edited = [
+        Document("Scorpion fire", {"name": "Scorpion"}, "character"),
+        Document("Blaze fire", {"name": "Blaze"}, "character"),
+    ]
+    restarted, encoder, _ = _make_rag(tmp_path, monkeypatch, edited, gated=True)
+
+    assert [doc.metadata["name"] for doc in restarted.documents] == ["Scorpion"]
+    assert restarted.is_stale()
+    assert encoder.entered.wait(5)  # only the background rebuild embeds
+
+    encoder.gate.set()
+    _wait_for_reindex(restarted)
+    assert [doc.metadata["name"] for doc in restarted.documents] == ["Scorpion", "Blaze"]
+    assert not restarted.is_stale()
+
+
+def test_build_index_command_writes_artifact(tmp_path, monkeypatch, capsys):
+    from mkmchat.__main__ import build_index
+
+    monkeypatch.setattr(rag_module, "EMBEDDINGS_AVAILABLE", True)
+    monkeypatch.setattr(rag_module, "SentenceTransformer", lambda name: _GatedEncoder())
+    monkeypatch.setattr(
+        RAGSystem,
+        "_build_documents",
+        lambda self: [Document("Bleed: damage over time", {"term": "bleed"}, "glossary")],
+    )
+    out = tmp_path / "artifact"
+
+    assert build_index(["--data-dir", str(tmp_path), "--out", str(out)]) == 0
+    first = capsys.readouterr().out
+    assert build_index(["--data-dir", str(tmp_path), "--out", str(out), "--force"]) == 0
+
+    assert '"document_count": 1' in first
+    assert first == capsys.readouterr().out
+    assert (out / "manifest.json").exists()
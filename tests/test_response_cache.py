@@ -0,0 +1,188 @@
+import time
+
+import numpy as np
+import pytest
+
+from mkmchat import http_server
+from mkmchat.response_cache import ResponseCache, SemanticAnswerCache
+
+
+def _key(text, data_hash="h1"):
+    return ("/explain-mechanic", text, "llama3.2:3b", data_hash)
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = tmp_path / "responses.sqlite3"
+    ResponseCache(path).put(_key("snare"), {"response": {"definition": "d"}}, ttl=60)
+
+    cache = ResponseCache(path)
+    first = cache.get(_key("snare"))
+    first["response"]["definition"] = "mutated"
+
+    assert cache.get(_key("snare")) == {"response": {"definition": "d"}}
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.get(_key("bleed")) is None
+    assert cache.stats()["hit_ratio"] == pytest.approx(2 / 3, abs=1e-3)
+
+
+def test_expired_entries_and_older_data_are_dropped(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+    cache.put(_key("snare"), {"response": "old data"}, ttl=60)
+    cache.put(_key("bleed"), {"response": "short lived"}, ttl=60)
+
+    now = time.time()
+    monkeypatch.setattr("mkmchat.response_cache.time.time", lambda: now + 120)
+    assert cache.get(_key("bleed")) is None
+
+    cache.put(_key("snare", "h2"), {"response": "new data"}, ttl=600)
+    assert cache.get(_key("snare")) is None
+    assert cache.get(_key("snare", "h2")) == {"response": "new data"}
+    assert cache.stats()["disk"]["entries"] == 1
+
+
+def test_memory_tier_is_bounded():
+    cache = ResponseCache(None, max_entries=2)
+    for name in ("a", "b", "c"):
+        cache.put(_key(name), {"response": name}, ttl=60)
+
+    assert cache.get(_key("a")) is None
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["disk"] is None
+
+
+class _AssistantStub:
+    enabled = True
+
+    def _resolve_model_name(self, model):
+        return model or "llama3.2:3b"
+
+
+async def test_route_serves_repeats_from_cache_unless_bypassed(monkeypatch):
+    class _Rag:
+        _last_data_hash = "abc"
+
+    monkeypatch.setenv("MKM_RESPONSE_CACHE_PATH", "memory")
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(http_server, "_response_cache", None)
+    calls = []
+
+    async def _fake_explain(mechanic, model=None):
+        calls.append(mechanic)
+        return {"response": {"definition": f"answer {len(calls)}", "recommendations": ""}}
+
+    monkeypatch.setattr(http_server, "explain_mechanic_json", _fake_explain)
+
+    first = await http_server.route_explain_mechanic({"mechanic": "Snare"})
+    repeat = await http_server.route_explain_mechanic({"mechanic": "  snare "})
+    fresh = await http_server.route_explain_mechanic({"mechanic": "snare", "cache": False})
+    after = await http_server.route_explain_mechanic({"mechanic": "snare"})
+
+    assert len(calls) == 2
+    assert repeat == {**first, "cached": True}
+    assert fresh == {"response": {"definition": "answer 2", "recommendations": ""}}
+    assert after == {**fresh, "cached": True}
+    with pytest.raises(http_server.RequestError):
+        await http_server.route_explain_mechanic({"mechanic": "snare", "cache": "no"})
+
+
+def test_semantic_cache_matches_near_duplicates_within_a_namespace():
+    cache = SemanticAnswerCache(capacity=2, threshold=0.9)
+    snare = ("/ask-question", "llama3.2:3b", "h1")
+    cache.put(snare, np.array([1.0, 0.0, 0.0]), "what does snare do", {"response": "Snare answer"}, 60)
+    cache.put(snare, np.array([0.0, 1.0, 0.0]), "what does bleed do", {"response": "Bleed answer"}, 60)
+
+    answer, similarity, matched = cache.lookup(snare, np.array([0.95, 0.1, 0.0]))
+    assert answer == {"response": "Snare answer"}
+    assert matched == "what does snare do"
+    assert similarity > 0.99
+    assert cache.lookup(snare, np.array([0.6, 0.6, 0.5])) is None
+    assert cache.lookup(("/ask-question", "other-model", "h1"), np.array([1.0, 0.0, 0.0])) is None
+
+    # Full: the least recently used slot (bleed) makes room
+    cache.put(snare, np.array([0.0, 0.0, 1.0]), "what does stun do", {"response": "Stun answer"}, 60)
+    assert cache.lookup(snare, np.array([0.0, 1.0, 0.0])) is None
+    assert cache.stats()["evictions"] == 1
+
+    # A newer data hash drops answers built from the old one
+    cache.put(("/ask-question", "llama3.2:3b", "h2"), np.array([0.0, 0.0, 1.0]), "stun", {"response": "new"}, 60)
+    assert cache.lookup(snare, np.array([1.0, 0.0, 0.0])) is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_semantic_cache_skips_expired_answers(monkeypatch):
+    cache = SemanticAnswerCache(capacity=1, threshold=0.9)
+    snare = ("/explain-mechanic", "llama3.2:3b", "h1")
+    cache.put(snare, np.array([1.0, 0.0]), "snare", {"response": "Snare answer"}, 60)
+    cache.put(snare, np.array([0.0, 1.0]), "bleed", {"response": "Bleed answer"}, 0)
+    assert cache.lookup(snare, np.array([1.0, 0.0])) is not None
+
+    now = time.time()
+    monkeypatch.setattr("mkmchat.response_cache.time.time", lambda: now + 120)
+    assert cache.lookup(snare, np.array([1.0, 0.0])) is None
+    assert cache.stats()["entries"] == 0
+
+    cache.put(snare, np.array([0.0, 1.0]), "bleed", {"response": "Bleed answer"}, 60)
+    assert cache.stats()["evictions"] == 0  # the expired slot was reused
+
+
+async def test_ask_question_skips_the_semantic_cache_by_default(monkeypatch):
+    class _Rag:
+        _last_data_hash = "abc"
+
+        def embed_query(self, text):
+            return np.array([1.0, 0.0])
+
+    monkeypatch.delenv("MKM_RESPONSE_CACHE_TTL_ASK_QUESTION_SECONDS", raising=False)
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(http_server, "_semantic_cache", SemanticAnswerCache(capacity=8, threshold=0.9))
+    calls = []
+
+    async def _fake_ask(question, model=None):
+        calls.append(question)
+        return {"response": f"answer {len(calls)}"}
+
+    monkeypatch.setattr(http_server, "ask_question_json", _fake_ask)
+
+    first = await http_server.route_ask_question({"question": "what does snare do?"})
+    second = await http_server.route_ask_question({"question": "explain snare"})
+
+    assert len(calls) == 2
+    assert "cached" not in first and "cached" not in second
+    assert http_server.get_semantic_cache().stats()["entries"] == 0
+
+
+async def test_route_flags_semantic_hits(monkeypatch):
+    vectors = {"what does snare do?": [1.0, 0.0], "explain snare": [0.97, 0.1], "explain bleed": [0.1, 1.0]}
+
+    class _Rag:
+        _last_data_hash = "abc"
+
+        def embed_query(self, text):
+            return np.array(vectors[text])
+
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(http_server, "_semantic_cache", SemanticAnswerCache(capacity=8, threshold=0.9))
+    monkeypatch.setenv("MKM_RESPONSE_CACHE_TTL_ASK_QUESTION_SECONDS", "3600")
+    monkeypatch.setenv("MKM_RESPONSE_CACHE_PATH", "memory")
+    monkeypatch.setattr(http_server, "_response_cache", None)
+    calls = []
+
+    async def _fake_ask(question, model=None):
+        calls.append(question)
+        return {"response": f"answer to {question}"}
+
+    monkeypatch.setattr(http_server, "ask_question_json", _fake_ask)
+
+    first = await http_server.route_ask_question({"question": "what does snare do?"})
+    similar = await http_server.route_ask_question({"question": "explain snare"})
+    other = await http_server.route_ask_question({"question": "explain bleed"})
+
+    assert calls == ["what does snare do?", "explain bleed"]
+    assert similar["response"] == first["response"]
+    assert similar["cached"] is True and similar["cache_similarity"] >= 0.9
+    assert "cached" not in other
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from mkmchat.llm.scheduler import LLMScheduler, SchedulerRejected
+
+
+async def _hold(scheduler, order, client, priority, release, deadline=5):
+    async with scheduler.slot(client, priority, deadline):
+        order.append(client)
+        await release.wait()
+
+
+async def test_waiters_run_by_priority_then_round_robin_between_clients():
+    scheduler = LLMScheduler(concurrency=1, queue_size=10, per_client=5)
+    order = []
+    release = asyncio.Event()
+    release.set()
+    gate = asyncio.Event()
+
+    blocker = asyncio.create_task(_hold(scheduler, order, "blocker", 0, gate))
+    await asyncio.sleep(0)
+    waiters = [
+        asyncio.create_task(_hold(scheduler, order, client, priority, release))
+        for client, priority in [("a", 2), ("a", 1), ("a", 1), ("b", 1), ("c", 0)]
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["waiting"] == 5
+
+    gate.set()
+    await asyncio.gather(blocker, *waiters)
+
+    assert order == ["blocker", "c", "a", "b", "a", "a"]
+    assert scheduler.stats()["active"] == 0
+    assert scheduler.stats()["admitted"] == 6
+
+
+async def test_full_queue_and_per_client_share_are_rejected_immediately():
+    scheduler = LLMScheduler(concurrency=1, queue_size=2, per_client=1)
+    gate = asyncio.Event()
+    order = []
+
+    running = asyncio.create_task(_hold(scheduler, order, "a", 1, gate))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(_hold(scheduler, order, "a", 1, gate))
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerRejected, match="this client") as per_client:
+        async with scheduler.slot("a", 1, 5):
+            pass
+    other = asyncio.create_task(_hold(scheduler, order, "b", 1, gate))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerRejected, match="queue is full"):
+        async with scheduler.slot("c", 1, 5):
+            pass
+
+    assert per_client.value.retry_after >= 1
+    gate.set()
+    await asyncio.gather(running, queued, other)
+    assert scheduler.stats()["rejected"] == 2
+
+
+async def test_estimated_wait_beyond_deadline_is_rejected_and_timeouts_free_the_queue():
+    scheduler = LLMScheduler(concurrency=1, queue_size=10, per_client=5)
+    scheduler._avg_hold = 30.0
+    gate = asyncio.Event()
+
+    running = asyncio.create_task(_hold(scheduler, [], "a", 1, gate))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerRejected, match="estimated wait") as rejected:
+        async with scheduler.slot("b", 1, 10):
+            pass
+    assert rejected.value.retry_after == 30
+
+    scheduler._avg_hold = 0.01
+    with pytest.raises(SchedulerRejected, match="before the deadline"):
+        async with scheduler.slot("b", 1, 0.05):
+            pass
+    assert scheduler.stats()["waiting"] == 0
+    assert scheduler.stats()["timed_out"] == 1
+
+    gate.set()
+    await running
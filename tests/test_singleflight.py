@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from mkmchat import http_server
+from mkmchat.deadline import within
+from mkmchat.singleflight import SingleFlight
+
+
+async def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await release.wait()
+        return {"response": {"items": [1]}}
+
+    tasks = [asyncio.create_task(flight.do("key", work)) for _ in range(5)]
+    other = asyncio.create_task(flight.do("other", work))
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+    await other
+
+    assert len(calls) == 2
+    assert all(result == {"response": {"items": [1]}} for result in results)
+    results[1]["response"]["items"].append(2)
+    assert results[0]["response"]["items"] == [1]
+    assert flight.stats() == {"in_flight": 0, "executed": 2, "coalesced": 4}
+
+
+async def test_errors_reach_every_caller_and_the_key_is_released():
+    flight = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise RuntimeError("ollama down")
+
+    results = await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+
+    assert [str(result) for result in results] == ["ollama down", "ollama down"]
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_work_is_cancelled_only_when_every_caller_is_gone():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = asyncio.create_task(flight.do("k", work))
+    second = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled.is_set()
+
+    second.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    with pytest.raises(asyncio.CancelledError):
+        await second
+
+
+class _AssistantStub:
+    enabled = True
+
+    def _resolve_model_name(self, model):
+        return {"llama3.2": "llama3.2:3b"}.get(model, model or "llama3.2:3b")
+
+
+async def test_route_coalesces_equivalent_questions(monkeypatch):
+    class _Rag:
+        _last_data_hash = "abc"
+
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(http_server, "_single_flight", SingleFlight())
+    release = asyncio.Event()
+    calls = []
+
+    async def _fake_ask(question, model=None):
+        calls.append((question, model))
+        await release.wait()
+        return {"response": "Snare stops tagging."}
+
+    monkeypatch.setattr(http_server, "ask_question_json", _fake_ask)
+
+    tasks = [
+        asyncio.create_task(http_server.route_ask_question({"question": "What does  snare do?"})),
+        asyncio.create_task(http_server.route_ask_question({"question": "what does snare do?", "model": "llama3.2"})),
+        asyncio.create_task(http_server.route_ask_question({"question": "what does bleed do?"})),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert len(calls) == 2
+    assert results[0] == results[1] == {"response": "Snare stops tagging."}
+
+
+async def test_a_follower_outlives_a_leader_with_a_shorter_deadline(monkeypatch):
+    class _Rag:
+        _last_data_hash = "abc"
+
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: _Rag())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(http_server, "_single_flight", SingleFlight())
+
+    async def _slow_ask(question, model=None):
+        await within("generation", asyncio.sleep(0.3), 120)
+        return {"response": "Snare stops tagging."}
+
+    monkeypatch.setattr(http_server, "ask_question_json", _slow_ask)
+
+    def _ask(timeout):
+        return http_server.run_with_deadline(timeout, http_server.route_ask_question({"question": "snare?"}))
+
+    leader = asyncio.create_task(_ask("0.1"))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(_ask("30"))
+
+    with pytest.raises(http_server.RequestError) as timed_out:
+        await leader
+    assert timed_out.value.status == 504
+    assert await follower == {"response": "Snare stops tagging."}
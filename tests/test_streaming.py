@@ -0,0 +1,191 @@
+import asyncio
+import json
+
+import pytest
+
+from mkmchat import async_http_server, http_server
+from mkmchat.llm.scheduler import get_scheduler
+
+
+class _AssistantStub:
+    enabled = True
+    base_url = "http://fake-ollama"
+
+    def _resolve_model_name(self, model):
+        return model or "llama3.2:3b"
+
+
+class _FakeStreamResponse:
+    def __init__(self, lines):
+        self.status_code = 200
+        self._lines = lines
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.closed = True
+        return False
+
+    async def aiter_lines(self):
+        for line in self._lines:
+            yield line
+
+
+class _FakeStreamingClient:
+    lines = []
+    requests = []
+    responses = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def stream(self, method, url, json=None, timeout=None):
+        self.requests.append(json)
+        response = _FakeStreamResponse(self.lines)
+        self.responses.append(response)
+        return response
+
+
+def _ollama_lines(*deltas):
+    lines = [json.dumps({"message": {"content": delta}, "done": False}) for delta in deltas]
+    lines.append(json.dumps({"message": {"content": ""}, "done": True}))
+    return lines
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: object())
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _AssistantStub())
+    monkeypatch.setattr(
+        http_server,
+        "build_chat_context",
+        lambda rag, query, pipeline=None: {"characters": "", "equipment": "", "gameplay": "", "glossary": ""},
+    )
+    monkeypatch.setattr("httpx.AsyncClient", _FakeStreamingClient)
+    _FakeStreamingClient.requests = []
+    _FakeStreamingClient.responses = []
+    return _FakeStreamingClient
+
+
+async def test_chat_stream_relays_deltas_and_ends_with_summary_fields(fake_ollama):
+    fake_ollama.lines = _ollama_lines("**Scorpion** ", "hits ", "hard.")
+
+    frames = [
+        frame
+        async for frame in http_server.chat_stream(
+            "who hits hard?", messages=[], summary_text="earlier turns", summary_message_count=4
+        )
+    ]
+
+    assert [frame["text"] for frame in frames[:-1]] == ["**Scorpion** ", "hits ", "hard."]
+    assert frames[-1] == {
+        "type": "done",
+        "response": {
+            "text": "**Scorpion** hits hard.",
+            "summary_text": "earlier turns",
+            "summary_message_count": 4,
+        },
+    }
+    assert fake_ollama.requests[0]["stream"] is True
+
+
+async def test_closing_the_stream_early_closes_the_ollama_response(fake_ollama):
+    fake_ollama.lines = _ollama_lines("one ", "two ", "three")
+
+    frames = http_server.chat_stream("hi", messages=[])
+    first = await frames.__anext__()
+    await frames.aclose()
+
+    assert first == {"type": "delta", "text": "one "}
+    assert fake_ollama.responses[0].closed
+
+
+async def test_only_the_ollama_call_holds_a_generation_slot(fake_ollama, monkeypatch):
+    fake_ollama.lines = _ollama_lines("one ", "two")
+    scheduler = get_scheduler()
+    active = {}
+
+    def _context(rag, query, pipeline=None):
+        active["retrieval"] = scheduler.stats()["active"]
+        return {"characters": "", "equipment": "", "gameplay": "", "glossary": ""}
+
+    monkeypatch.setattr(http_server, "build_chat_context", _context)
+
+    frames = http_server.STREAM_ROUTES["/chat"]({"message": "hi", "messages": []})
+    await frames.__anext__()
+    active["generation"] = scheduler.stats()["active"]
+    await frames.aclose()
+
+    assert active == {"retrieval": 0, "generation": 1}
+    assert scheduler.stats()["active"] == 0
+
+
+async def test_open_stream_turns_an_early_failure_into_a_json_error(monkeypatch):
+    monkeypatch.setattr(http_server, "get_rag_system", lambda: object())
+
+    class _Disabled(_AssistantStub):
+        enabled = False
+
+    monkeypatch.setattr(http_server, "get_ollama_assistant", lambda rag_system=None: _Disabled())
+
+    with pytest.raises(http_server.RequestError) as excinfo:
+        await http_server.open_stream("/ask-question", {"question": "q", "stream": True})
+
+    assert excinfo.value.status == 500
+    assert "Ollama assistant not available" in excinfo.value.payload["error"]
+
+
+def test_stream_format_follows_body_and_accept_header():
+    assert http_server._stream_format({}, "text/event-stream") is None
+    assert http_server._stream_format({"stream": True}, "text/event-stream") == "sse"
+    assert http_server._stream_format({"stream": True}, "*/*") == "ndjson"
+    assert http_server._stream_format({"stream": "sse"}, "") == "sse"
+    with pytest.raises(http_server.RequestError):
+        http_server._stream_format({"stream": "xml"}, "")
+
+    frame = {"type": "delta", "text": "hi"}
+    assert http_server.encode_stream_frame(frame, "sse") == b'event: delta\ndata: {"type": "delta", "text": "hi"}\n\n'
+    assert http_server.encode_stream_frame(frame, "ndjson") == b'{"type": "delta", "text": "hi"}\n'
+
+
+async def test_async_server_streams_chunked_sse_and_keeps_the_connection(monkeypatch):
+    monkeypatch.setenv("MKM_API_KEY", "secret")
+    monkeypatch.setenv("MKM_RATE_LIMIT_ENABLED", "false")
+
+    async def _fake_chat_stream(**kwargs):
+        yield {"type": "delta", "text": "Hello"}
+        yield {"type": "done", "response": {"text": "Hello", "summary_text": "", "summary_message_count": 0}}
+
+    monkeypatch.setattr(http_server, "chat_stream", _fake_chat_stream)
+    srv = await async_http_server.start_server("127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    payload = json.dumps({"message": "hi", "messages": [], "stream": True}).encode()
+    writer.write(
+        b"POST /chat HTTP/1.1\r\nHost: test\r\nX-API-Key: secret\r\nAccept: text/event-stream\r\n"
+        + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+        + payload
+    )
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    body = b""
+    while True:
+        size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+        chunk = await reader.readexactly(size + 2)
+        if size == 0:
+            break
+        body += chunk[:-2]
+    writer.close()
+    srv.close()
+    await srv.wait_closed()
+
+    assert "Content-Type: text/event-stream" in head
+    assert "Transfer-Encoding: chunked" in head
+    assert "Connection: keep-alive" in head
+    events = [block for block in body.decode().split("\n\n") if block]
+    assert events[0].startswith("event: delta\n")
+    done = json.loads(events[-1].split("data: ", 1)[1])
+    assert done["type"] == "done"
+    assert done["response"]["summary_message_count"] == 0
@@ -353,7 +353,10 @@ private function normalizeTextResponse(mixed $response): string
 
     private function httpRequest(): PendingRequest
     {
-        $request = Http::acceptJson();
+        // Let the API give up (and stop generating) when we would stop waiting anyway.
+        $request = Http::acceptJson()->withHeaders([
+            'X-Request-Timeout' => (string) $this->httpTimeoutSeconds(),
+        ]);
 
         if ($this->apiKey !== null) {
             $request = $request->withHeaders([